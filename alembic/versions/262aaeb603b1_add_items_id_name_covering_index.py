@@ -0,0 +1,32 @@
+"""Add covering index for id+name item listings
+
+Revision ID: 262aaeb603b1
+Revises: d062883d8194
+Create Date: 2026-10-19 11:02:17.530214
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "262aaeb603b1"
+down_revision: Union[str, None] = "d062883d8194"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Index-only scans also need an up-to-date visibility map, i.e. a regular (auto)vacuum.
+    op.create_index(
+        "ix_items_id_name",
+        "items",
+        ["id", "name"],
+        unique=False,
+        postgresql_include=["version"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_items_id_name", table_name="items")
@@ -0,0 +1,43 @@
+"""Add full-text and trigram search indexes on items
+
+Revision ID: 428eef347d6c
+Revises: 262aaeb603b1
+Create Date: 2026-10-19 13:40:51.902647
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "428eef347d6c"
+down_revision: Union[str, None] = "262aaeb603b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # PostgreSQL only: other databases use the in-memory index in app/services/search.py.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # The 'simple' configuration lower-cases without stemming, so prefix queries match
+    # what the user typed. Name matches weigh more than description matches.
+    op.execute("""
+        ALTER TABLE items ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+        ) STORED
+        """)
+    op.execute("CREATE INDEX ix_items_search_vector ON items USING gin (search_vector)")
+    op.execute("CREATE INDEX ix_items_name_trgm ON items USING gin (name gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX IF EXISTS ix_items_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_items_search_vector")
+    op.execute("ALTER TABLE items DROP COLUMN IF EXISTS search_vector")
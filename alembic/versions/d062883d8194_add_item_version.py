@@ -0,0 +1,31 @@
+"""Add item version column
+
+Revision ID: d062883d8194
+Revises: 78594ac01b8d
+Create Date: 2026-10-19 09:12:40.118305
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d062883d8194"
+down_revision: Union[str, None] = "78594ac01b8d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows start at version 1; the server default fills them in.
+    op.add_column(
+        "items",
+        sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("items", "version")
@@ -1,8 +1,11 @@
 # app/authz.py
+import hashlib
+import itertools
 import json
 import logging
 import os
 import re
+import threading
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, Request, status
@@ -11,6 +14,24 @@ from fastapi import HTTPException, Request, status
 log = logging.getLogger(__name__)
 IS_AUTH_DEBUG = os.getenv("SUPERVITY_AUTH_DEBUG", "false").lower() == "true"
 
+# The operators understood by _evaluate_rule. A rule using none of them
+# (e.g. one with only a "description") only requires authentication.
+RULE_OPERATORS = (
+    "ANY",
+    "ALL",
+    "NOT",
+    "claims",
+    "claims_lte",
+    "claims_gte",
+    "claims_contains",
+    "claims_timediff_lte",
+)
+
+# The permission matrix is precomputed for every role combination when the
+# policies reference at most this many roles. Above that, combinations are
+# computed on first use and memoized.
+PERMISSION_MATRIX_MAX_ROLES = int(os.getenv("AUTHZ_MATRIX_MAX_ROLES", "10"))
+
 
 class AuthzEngine:
     """
@@ -20,16 +41,31 @@ class AuthzEngine:
     """
 
     def __init__(
-        self, public_map_path="app/public.map.json", authz_map_path="app/authz.map.json"
+        self,
+        public_map_path="app/public.map.json",
+        authz_map_path="app/authz.map.json",
+        lazy=False,
     ):
         self.public_map_path = public_map_path
         self.authz_map_path = authz_map_path
-        self.load_policies()
+        self.policy_version = None
+        self._load_lock = threading.Lock()
+        # With lazy=True, nothing is read from disk until the first check
+        # (or until load_policies() is called explicitly, e.g. at startup).
+        if not lazy:
+            self.load_policies()
+
+    def ensure_loaded(self):
+        """Loads the policies on first use if the engine was created lazily."""
+        if self.policy_version is None:
+            with self._load_lock:
+                if self.policy_version is None:
+                    self.load_policies()
 
     def load_policies(self):
         """
-        Loads the authorization policies from JSON files into memory.
-        This method is called once on startup.
+        Loads the authorization policies from JSON files into memory and compiles
+        their path patterns. This method is called once on startup.
         """
         log.info("Loading authorization policies from disk...")
         try:
@@ -50,8 +86,208 @@ class AuthzEngine:
                 f"Authz map not found or invalid at {self.authz_map_path}. All non-public paths will be denied."
             )
 
+        # Compile every path pattern once, with the base_path prepended, instead of
+        # formatting and matching the raw strings on each request.
+        base_path = os.getenv("BASE_PATH", "")
+        self._compiled_public = [
+            re.compile(f"{base_path}{p}") for p in self._public_paths
+        ]
+        self._compiled_rules = [
+            (
+                re.compile(f"{base_path}{rule_path}"),
+                rule_path,
+                rule,
+                self._requires_context(rule),
+            )
+            for rule_path, rule in self._authz_rules.items()
+        ]
+
+        # Only rebuild the permission matrix if the policy content actually changed.
+        policy_version = self._compute_policy_version()
+        if policy_version != self.policy_version:
+            self._build_permission_matrix(policy_version)
+            self.policy_version = policy_version
+
         log.info("Policies loaded successfully.")
 
+    @staticmethod
+    def _requires_context(rule: dict) -> bool:
+        """
+        A rule containing "{context...}" or "{path...}" placeholders depends on
+        runtime data and can only be checked by the endpoint itself.
+        """
+        rule_str = json.dumps(rule)
+        return "{context" in rule_str or "{path" in rule_str
+
+    def is_public(self, request_path: str) -> bool:
+        """Returns True if the path is whitelisted in the public map."""
+        self.ensure_loaded()
+        return any(pattern.fullmatch(request_path) for pattern in self._compiled_public)
+
+    def match_rule(self, request_path: str) -> tuple[str, dict, bool] | None:
+        """
+        Returns (rule_path, rule, requires_context) for the first rule matching the
+        path, or None if no rule is configured for it.
+        """
+        self.ensure_loaded()
+        for pattern, rule_path, rule, requires_context in self._compiled_rules:
+            if pattern.fullmatch(request_path):
+                return rule_path, rule, requires_context
+        return None
+
+    def _compute_policy_version(self) -> str:
+        """
+        Returns a short, stable hash of the loaded policies. It changes only when
+        the content of the public or authz map changes.
+        """
+        canonical = json.dumps(
+            {"public": self._public_paths, "rules": self._authz_rules}, sort_keys=True
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _is_authenticated_only(rule: dict) -> bool:
+        """
+        Returns True for rules that only require a valid token
+        (e.g. {}, {"ALL": []} or a rule with only a "description").
+        """
+        if not rule or (isinstance(rule.get("ALL"), list) and not rule.get("ALL")):
+            return True
+        return not any(op in rule for op in RULE_OPERATORS)
+
+    def _get_user_roles(self, user: dict) -> set:
+        """
+        Collects the user's realm roles and the client roles for our Keycloak client.
+        """
+        realm_roles = user.get("realm_access", {}).get("roles", [])
+        client_id = os.getenv("KEYCLOAK_CLIENT_ID")
+        client_roles = (
+            user.get("resource_access", {}).get(client_id, {}).get("roles", [])
+        )
+        return set(realm_roles + client_roles)
+
+    def _collect_roles(self, rule) -> set:
+        """
+        Recursively collects every role name referenced by a rule.
+        """
+        if isinstance(rule, str):
+            return {rule}
+        roles = set()
+        if isinstance(rule, dict):
+            for op in ("ALL", "ANY"):
+                if isinstance(rule.get(op), list):
+                    for sub in rule[op]:
+                        roles |= self._collect_roles(sub)
+            if "NOT" in rule:
+                roles |= self._collect_roles(rule["NOT"])
+        return roles
+
+    def _evaluate_roles_only(self, rule, user_roles: frozenset) -> bool | None:
+        """
+        Evaluates a rule using only the user's roles.
+        Returns True or False when roles alone decide the outcome, and None when the
+        outcome depends on claims or runtime context (e.g. an ownership check).
+        """
+        if isinstance(rule, str):
+            return rule in user_roles
+        if not isinstance(rule, dict):
+            return False
+
+        if "NOT" in rule:
+            result = self._evaluate_roles_only(rule["NOT"], user_roles)
+            return None if result is None else not result
+
+        if "ALL" in rule:
+            results = [
+                self._evaluate_roles_only(sub, user_roles) for sub in rule["ALL"]
+            ]
+            if False in results:
+                return False
+            return None if None in results else True
+        if "ANY" in rule:
+            results = [
+                self._evaluate_roles_only(sub, user_roles) for sub in rule["ANY"]
+            ]
+            if True in results:
+                return True
+            return None if None in results else False
+
+        # Any remaining operator compares claims or context values.
+        if any(op in rule for op in RULE_OPERATORS):
+            return None
+        return False
+
+    def _compute_permissions(
+        self, user_roles: frozenset, policy_version: str | None = None
+    ) -> dict:
+        """
+        Computes the permission entry for a single role combination.
+        'allowed' routes are granted by roles alone, 'conditional' routes may be granted
+        depending on claims or runtime context, and all other routes are denied.
+        """
+        allowed, conditional = [], []
+        for rule_path, rule in self._authz_rules.items():
+            if self._is_authenticated_only(rule):
+                decision = True
+            else:
+                decision = self._evaluate_roles_only(rule, user_roles)
+            if decision:
+                allowed.append(rule_path)
+            elif decision is None:
+                conditional.append(rule_path)
+
+        roles = sorted(user_roles)
+        version = hashlib.sha256(
+            f"{policy_version or self.policy_version}:{','.join(roles)}".encode()
+        ).hexdigest()[:16]
+        return {
+            "version": version,
+            "base_path": os.getenv("BASE_PATH", ""),
+            "roles": roles,
+            "public": list(self._public_paths),
+            "allowed": allowed,
+            "conditional": conditional,
+        }
+
+    def _build_permission_matrix(self, policy_version: str):
+        """
+        Precomputes the accessible routes for every combination of the roles
+        referenced in the authz map. Called whenever the policy changes.
+        """
+        policy_roles = set()
+        for rule in self._authz_rules.values():
+            policy_roles |= self._collect_roles(rule)
+
+        matrix = {}
+        if len(policy_roles) <= PERMISSION_MATRIX_MAX_ROLES:
+            ordered_roles = sorted(policy_roles)
+            for size in range(len(ordered_roles) + 1):
+                for combo in itertools.combinations(ordered_roles, size):
+                    matrix[frozenset(combo)] = self._compute_permissions(
+                        frozenset(combo), policy_version
+                    )
+        else:
+            log.info(
+                f"Policies reference {len(policy_roles)} roles; permission matrix entries will be computed on demand."
+            )
+
+        # Swap in the new matrix in one step so concurrent readers never see a partial build.
+        self._policy_roles = frozenset(policy_roles)
+        self._permission_matrix = matrix
+
+    def get_permissions(self, user: dict) -> dict:
+        """
+        Returns the precomputed permission entry for the user's role combination.
+        Roles that no rule references are ignored, so they do not split the cache.
+        """
+        self.ensure_loaded()
+        roles = frozenset(self._get_user_roles(user) & self._policy_roles)
+        entry = self._permission_matrix.get(roles)
+        if entry is None:
+            entry = self._compute_permissions(roles)
+            self._permission_matrix[roles] = entry
+        return entry
+
     def _resolve_value(
         self, placeholder: str, user: dict, request: Request, context: dict
     ):
@@ -212,14 +448,9 @@ class AuthzEngine:
         context = context or {}
         request_path = request.url.path
 
-        # Dynamically get the base_path from the environment.
-        base_path = os.getenv("BASE_PATH", "")
-
         # 1. Check if the path is whitelisted as public.
-        # We prepend the base_path to the public path rules for matching.
-        if any(
-            re.fullmatch(f"{base_path}{p}", request_path) for p in self._public_paths
-        ):
+        # The base_path is prepended to the patterns when the policies are compiled.
+        if self.is_public(request_path):
             if IS_AUTH_DEBUG:
                 log.debug(f"Decision: ALLOW. Reason: Path '{request_path}' is public.")
             return True
@@ -235,29 +466,10 @@ class AuthzEngine:
             )
 
         # 3. Find a matching rule in the policy map.
-        for rule_path, rule in self._authz_rules.items():
-            # CRITICAL CHANGE: Construct the full, expected path from the base_path and the rule key.
-            full_rule_path = f"{base_path}{rule_path}"
-
-            if re.fullmatch(full_rule_path, request_path):
+        for pattern, _, rule, _ in self._compiled_rules:
+            if pattern.fullmatch(request_path):
                 # 3a. Handle simple "authenticated-only" rule (e.g., "ALL": [] or {}).
-                rule_is_simple_auth = not rule or (
-                    isinstance(rule.get("ALL"), list) and not rule.get("ALL")
-                )
-
-                if rule_is_simple_auth or not any(
-                    op in rule
-                    for op in [
-                        "ANY",
-                        "ALL",
-                        "NOT",
-                        "claims",
-                        "claims_lte",
-                        "claims_gte",
-                        "claims_contains",
-                        "claims_timediff_lte",
-                    ]
-                ):
+                if self._is_authenticated_only(rule):
                     if IS_AUTH_DEBUG:
                         log.debug(
                             f"Decision: ALLOW. Reason: Path '{request_path}' requires basic authentication."
@@ -265,12 +477,7 @@ class AuthzEngine:
                     return True
 
                 # 3b. Extract user roles for evaluation.
-                realm_roles = user.get("realm_access", {}).get("roles", [])
-                client_id = os.getenv("KEYCLOAK_CLIENT_ID")
-                client_roles = (
-                    user.get("resource_access", {}).get(client_id, {}).get("roles", [])
-                )
-                user_roles = set(realm_roles + client_roles)
+                user_roles = self._get_user_roles(user)
 
                 # 3c. Evaluate the complex rule.
                 if self._evaluate_rule(rule, user, user_roles, request, context):
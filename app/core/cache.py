@@ -0,0 +1,413 @@
+# app/core/cache.py
+import json
+import logging
+import os
+import select as io_select
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.orm import Session
+
+from .database import get_engine, id_in
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Maximum number of entries per model; 0 disables caching.
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "1000"))
+# Seconds a cached row stays valid, and how long a "not found" result is remembered.
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "30"))
+ENTITY_CACHE_NEGATIVE_TTL = float(os.getenv("ENTITY_CACHE_NEGATIVE_TTL", "5"))
+# "local" (per-process only) or "postgres" (LISTEN/NOTIFY to invalidate other workers)
+ENTITY_CACHE_BACKEND = os.getenv("ENTITY_CACHE_BACKEND", "local").lower()
+ENTITY_CACHE_CHANNEL = os.getenv("ENTITY_CACHE_CHANNEL", "entity_cache")
+# Number of web worker processes (gunicorn/prod.py exports the count it starts).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Stored for keys that are known not to exist.
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A thread-safe LRU cache whose entries expire after a per-entry TTL.
+    Counts hits, misses, evictions and invalidations for monitoring.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a value loaded before one is not stored after it.
+        self.generation = 0
+        self.stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self.stats["negative_hits" if value is _MISSING else "hits"] += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None, generation: int | None = None):
+        """Stores a value. If `generation` is given and an invalidation happened since, it is dropped."""
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            if self._entries.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# --- Invalidation Backends ---
+
+
+class InvalidationBackend:
+    """
+    Propagates invalidations between workers. The base class is process-local:
+    publishing does nothing, so each worker relies on its own invalidations and the TTL.
+    """
+
+    # Whether invalidations reach every worker process.
+    shared = False
+
+    def start(self, callback):
+        """Starts delivering invalidations from other processes to callback(namespace, key)."""
+
+    def publish(self, namespace: str, keys: list, connection=None):
+        """
+        Announces that the given keys of a namespace changed. With a `connection`, the
+        announcement is part of its transaction and only delivered if that commits.
+        """
+
+
+class PostgresNotifyBackend(InvalidationBackend):
+    """
+    Cross-worker invalidation over PostgreSQL LISTEN/NOTIFY. Each process listens on
+    one channel from a background thread with its own connection, and ignores the
+    notifications it sent itself.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        channel: str = ENTITY_CACHE_CHANNEL,
+        reconnect_delay: float = 5.0,
+        name: str = "entity-cache",
+    ):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        # Names the listener thread and its log messages (the change feed reuses this class).
+        self.name = name
+        self.origin = uuid.uuid4().hex
+
+    def start(self, callback):
+        thread = threading.Thread(
+            target=self._listen,
+            args=(callback,),
+            name=f"{self.name}-listener",
+            daemon=True,
+        )
+        thread.start()
+
+    def publish(self, namespace: str, keys: list, connection=None):
+        statement = text("SELECT pg_notify(:channel, :payload)")
+        params = {
+            "channel": self.channel,
+            "payload": json.dumps([self.origin, namespace, keys]),
+        }
+        if connection is not None:
+            # Failing here fails the caller's transaction, as it should.
+            connection.execute(statement, params)
+            return
+        try:
+            with get_engine().begin() as conn:
+                conn.execute(statement, params)
+        except Exception as e:
+            log.warning(
+                f"Could not publish {self.name} notification for {namespace}: {e}"
+            )
+
+    def _listen(self, callback):
+        while True:
+            try:
+                # A dedicated connection outside the pool, held for the life of the process.
+                engine = get_engine()
+                cargs, cparams = engine.dialect.create_connect_args(engine.url)
+                conn = engine.dialect.connect(*cargs, **cparams)
+                try:
+                    conn.autocommit = True
+                    conn.cursor().execute(f'LISTEN "{self.channel}"')
+                    log.info(
+                        f"Listening for {self.name} notifications on '{self.channel}'."
+                    )
+                    self._drain(conn, callback)
+                finally:
+                    conn.close()
+            except Exception as e:
+                log.warning(
+                    f"The {self.name} listener failed ({e}); "
+                    f"reconnecting in {self.reconnect_delay}s."
+                )
+            # Notifications may have been missed while disconnected.
+            callback(None, None)
+            time.sleep(self.reconnect_delay)
+
+    def _drain(self, conn, callback):
+        while True:
+            if io_select.select([conn], [], [], 60) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                origin, namespace, keys = json.loads(notify.payload)
+                if origin == self.origin:
+                    continue
+                for key in keys:
+                    callback(namespace, key)
+
+
+BACKENDS = {"local": InvalidationBackend, "postgres": PostgresNotifyBackend}
+
+
+# --- Entity Cache ---
+
+
+class EntityCache:
+    """
+    A read-through cache of single rows of one model, keyed by primary key.
+    Rows are cached as plain dicts of their column values (never as ORM instances,
+    which belong to a session), and "not found" results are cached for a shorter TTL.
+    Entries are invalidated automatically when a session commits a change to the model;
+    bulk UPDATE/DELETE statements bypass this and are only covered by the TTL.
+    Sessions on a read replica (get_read_db) are served from the cache, but their misses
+    are not stored: a lagging replica would re-cache rows the primary already changed.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_size: int = ENTITY_CACHE_SIZE,
+        ttl: float = ENTITY_CACHE_TTL,
+        negative_ttl: float = ENTITY_CACHE_NEGATIVE_TTL,
+    ):
+        self.model = model
+        self.namespace = model.__tablename__
+        self.negative_ttl = negative_ttl
+        mapper = inspect(model)
+        self.columns = [column.key for column in mapper.column_attrs]
+        self.primary_key = mapper.primary_key[0]
+        self._key_index = self.columns.index(
+            mapper.get_property_by_column(self.primary_key).key
+        )
+        self._cache = TTLCache(max_size, ttl)
+
+    def get(self, db: Session, key) -> dict | None:
+        """Returns the row's column values (shared; do not modify), or None if it does not exist."""
+        value = self._cache.get(key)
+        if value is _MISSING:
+            return None
+        if value is not None:
+            return value
+
+        generation = self._cache.generation
+        obj = db.get(self.model, key)
+        value = (
+            None
+            if obj is None
+            else {column: getattr(obj, column) for column in self.columns}
+        )
+        if not db.info.get("replica"):
+            self._store(key, value, generation)
+        return value
+
+    def get_many(self, db: Session, keys) -> dict:
+        """
+        Looks up many rows at once: cached keys are served from the cache and all others
+        are loaded with a single query. Returns {key: column values or None}.
+        """
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            value = self._cache.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = None if value is _MISSING else value
+        if not missing:
+            return found
+
+        generation = self._cache.generation
+        columns = [getattr(self.model, column) for column in self.columns]
+        rows = db.execute(select(*columns).where(id_in(db, self.primary_key, missing)))
+        loaded = {row[self._key_index]: dict(zip(self.columns, row)) for row in rows}
+        store = not db.info.get("replica")
+        for key in missing:
+            value = loaded.get(key)
+            if store:
+                self._store(key, value, generation)
+            found[key] = value
+        return found
+
+    def _store(self, key, value, generation: int):
+        if value is None:
+            self._cache.set(key, _MISSING, self.negative_ttl, generation)
+        else:
+            self._cache.set(key, value, generation=generation)
+
+    def refresh(self, db: Session, key) -> dict | None:
+        """Drops the cached row and loads it again from the database."""
+        self._cache.invalidate(key)
+        return self.get(db, key)
+
+    def invalidate(self, key):
+        self._cache.invalidate(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = dict(self._cache.stats)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        hits = lookups - stats["misses"]
+        return {
+            **stats,
+            "size": len(self._cache),
+            "max_size": self._cache.max_size,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None,
+        }
+
+
+class EntityCacheRegistry:
+    """
+    Holds one EntityCache per model and invalidates them from SQLAlchemy session events,
+    so any model registered here is covered without changes to its write paths.
+    """
+
+    def __init__(
+        self, backend: InvalidationBackend | None = None, workers: int = WEB_CONCURRENCY
+    ):
+        self.backend = backend or InvalidationBackend()
+        # False when other workers can change rows without invalidating this process's
+        # copies; callers should then not trust a cached version on its own.
+        self.coherent = self.backend.shared or workers <= 1
+        self.workers = workers
+        self._caches = {}
+        self._started_pid = None
+        self._lock = threading.Lock()
+        self._listeners = [
+            ("after_flush", lambda session, flush_context: self.collect(session)),
+            ("after_commit", self.invalidate_committed),
+            ("after_rollback", self.discard_pending),
+        ]
+        for name, listener in self._listeners:
+            event.listen(Session, name, listener)
+
+    def close(self):
+        """Stops listening to session events."""
+        for name, listener in self._listeners:
+            event.remove(Session, name, listener)
+
+    def register(self, model, **options) -> EntityCache:
+        cache = EntityCache(model, **options)
+        self._caches[cache.namespace] = cache
+        return cache
+
+    def ensure_started(self):
+        # The listener thread does not survive a fork, so it is started once per worker.
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid != os.getpid():
+                if not self.coherent and self._caches:
+                    log.warning(
+                        f"ENTITY_CACHE_BACKEND=local with {self.workers} workers: a row changed by "
+                        f"another worker stays cached here for up to {ENTITY_CACHE_TTL:g}s, and "
+                        "conditional GETs are checked against the database. "
+                        "Set ENTITY_CACHE_BACKEND=postgres to share invalidations."
+                    )
+                self.backend.start(self._on_remote_invalidation)
+                self._started_pid = os.getpid()
+
+    def _on_remote_invalidation(self, namespace: str | None, key):
+        if namespace is None:
+            self.clear()
+        elif namespace in self._caches:
+            self._caches[namespace].invalidate(key)
+
+    def collect(self, session: Session):
+        """Records the cached rows changed by a flush, to invalidate them on commit."""
+        # Keyed by the registry itself, so several registries never share pending keys.
+        pending = session.info.setdefault(self, set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            namespace = getattr(obj, "__tablename__", None)
+            if namespace in self._caches:
+                state = inspect(obj)
+                key = state.mapper.primary_key_from_instance(obj)[0]
+                if key is not None:
+                    pending.add((namespace, key))
+
+    def discard_pending(self, session: Session):
+        session.info.pop(self, None)
+
+    def invalidate_committed(self, session: Session):
+        pending = session.info.pop(self, None)
+        if not pending:
+            return
+        by_namespace = {}
+        for namespace, key in pending:
+            self._caches[namespace].invalidate(key)
+            by_namespace.setdefault(namespace, []).append(key)
+        for namespace, keys in by_namespace.items():
+            self.backend.publish(namespace, keys)
+
+    def clear(self):
+        for cache in self._caches.values():
+            cache.clear()
+
+    def stats(self) -> dict:
+        return {namespace: cache.stats() for namespace, cache in self._caches.items()}
+
+
+# --- Singleton Registry ---
+entity_caches = EntityCacheRegistry(BACKENDS[ENTITY_CACHE_BACKEND]())
@@ -0,0 +1,317 @@
+# app/core/change_feed.py
+import asyncio
+import json
+import logging
+import os
+import threading
+from functools import partial
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from .cache import InvalidationBackend, PostgresNotifyBackend
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# "local" (changes reach the subscribers of the worker that made them) or "postgres"
+# (LISTEN/NOTIFY, so every worker's subscribers see every change).
+CHANGE_FEED_BACKEND = os.getenv("CHANGE_FEED_BACKEND", "local").lower()
+CHANGE_FEED_CHANNEL = os.getenv("CHANGE_FEED_CHANNEL", "change_feed")
+# Changes buffered per subscriber (before its filter); one that falls further behind is
+# disconnected.
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "100"))
+# Open streams per worker; more are refused with a 503.
+CHANGE_FEED_MAX_SUBSCRIBERS = int(os.getenv("CHANGE_FEED_MAX_SUBSCRIBERS", "1000"))
+# Seconds between keep-alive comments on an idle stream.
+CHANGE_FEED_HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))
+
+# NOTIFY payloads are limited to 8000 bytes; a change whose row data would not fit
+# is sent without it, and subscribers fetch the row themselves.
+MAX_NOTIFY_BYTES = 7500
+# JSON-safe column values are sent as is, anything else as its string form.
+_JSON_TYPES = (str, int, float, bool, type(None))
+
+BACKENDS = {
+    "local": InvalidationBackend,
+    "postgres": partial(PostgresNotifyBackend, CHANGE_FEED_CHANNEL, name="change-feed"),
+}
+
+
+# --- Subscribers ---
+
+
+class Subscriber:
+    """
+    One open stream. Changes are delivered from any thread onto the subscriber's event
+    loop into a bounded queue; when it is full the subscriber is evicted, its buffered
+    changes are dropped and the stream ends, instead of memory growing without bound.
+    The `allow` filter runs when a change is taken from the queue, on the subscriber's
+    loop, so the committing thread only enqueues.
+    """
+
+    def __init__(self, allow=None, queue_size: int = CHANGE_FEED_QUEUE_SIZE):
+        self.allow = allow
+        self.queue = asyncio.Queue(queue_size)
+        self.loop = asyncio.get_running_loop()
+        self.evicted = False
+
+    def offer(self, change: dict):
+        self.loop.call_soon_threadsafe(self._put, change)
+
+    async def get(self) -> dict | None:
+        """Waits for the next change this subscriber may see; None once it is evicted."""
+        while True:
+            change = await self.queue.get()
+            if change is None or self._allows(change):
+                return change
+
+    def _allows(self, change: dict) -> bool:
+        if self.allow is None or change.get("table") is None:
+            return True
+        try:
+            return self.allow(change)
+        except Exception as e:
+            log.warning(f"Change feed filter failed, skipping the change: {e}")
+            return False
+
+    def _put(self, change: dict):
+        if self.evicted:
+            return
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.evicted = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            # Wakes the stream so it can tell the client before closing.
+            self.queue.put_nowait(None)
+
+
+# --- Change Feed ---
+
+
+class ChangeFeed:
+    """
+    Publishes committed inserts, updates and deletes of registered models to subscribers.
+    Changes are collected from SQLAlchemy session events, like the entity cache
+    invalidations, so no write path needs to announce them. On commit they are fanned
+    out to this worker's subscribers. With "postgres", each flush also sends its changes
+    with NOTIFY in the writing transaction, so other workers get them exactly when it
+    commits; each worker holds one LISTEN connection and fans them out the same way.
+    """
+
+    def __init__(self, backend: InvalidationBackend | None = None):
+        self.backend = backend or InvalidationBackend()
+        self.max_subscribers = CHANGE_FEED_MAX_SUBSCRIBERS
+        self.evictions = 0
+        self._paths = {}
+        self._subscribers = set()
+        self._started_pid = None
+        self._lock = threading.Lock()
+        self._listeners = [
+            ("after_flush", lambda session, flush_context: self.collect(session)),
+            ("after_commit", self.publish_committed),
+            ("after_rollback", self.discard_pending),
+        ]
+        for name, listener in self._listeners:
+            event.listen(Session, name, listener)
+
+    def close(self):
+        """Stops listening to session events."""
+        for name, listener in self._listeners:
+            event.remove(Session, name, listener)
+
+    def register(self, model, path: str):
+        """
+        Publishes the changes of a model. `path` is the URL of one row, with an {id}
+        placeholder; subscribers only see the rows they are allowed to GET there.
+        """
+        self._paths[model.__tablename__] = path
+
+    def ensure_started(self):
+        # The listener thread does not survive a fork, so it is started once per worker.
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid != os.getpid():
+                self.backend.start(self._on_remote_change)
+                self._started_pid = os.getpid()
+
+    def _on_remote_change(self, table: str | None, change):
+        if table is None:
+            # Changes may have been missed while the listener was reconnecting.
+            self.dispatch({"table": None, "op": "reset", "id": None, "data": None})
+        else:
+            self.dispatch(change)
+
+    def collect(self, session: Session):
+        """Records the changes of registered models made by a flush, to publish on commit."""
+        pending = session.info.setdefault(self, [])
+        flushed = len(pending)
+        for op, objs in (
+            ("insert", session.new),
+            ("update", session.dirty),
+            ("delete", session.deleted),
+        ):
+            for obj in objs:
+                table = getattr(obj, "__tablename__", None)
+                if table not in self._paths:
+                    continue
+                if op == "update" and not session.is_modified(obj):
+                    continue
+                state = inspect(obj)
+                data = None
+                if op != "delete":
+                    data = {}
+                    # Only loaded values, so nothing is fetched from within the flush.
+                    for attr in state.mapper.column_attrs:
+                        if attr.key in state.dict:
+                            value = state.dict[attr.key]
+                            if not isinstance(value, _JSON_TYPES):
+                                value = str(value)
+                            data[attr.key] = value
+                key = state.mapper.primary_key_from_instance(obj)[0]
+                pending.append({"table": table, "op": op, "id": key, "data": data})
+        if self.backend.shared and len(pending) > flushed:
+            self._notify(session, pending[flushed:])
+
+    def _notify(self, session: Session, changes: list):
+        """Publishes changes within the session's transaction (delivered if it commits)."""
+        connection = session.connection()
+        by_table = {}
+        for change in changes:
+            by_table.setdefault(change["table"], []).append(change)
+        for table, table_changes in by_table.items():
+            for batch in self._batches(table_changes):
+                self.backend.publish(table, batch, connection)
+
+    def discard_pending(self, session: Session):
+        session.info.pop(self, None)
+
+    def publish_committed(self, session: Session):
+        for change in session.info.pop(self, None) or []:
+            self.dispatch(change)
+
+    @staticmethod
+    def _batches(changes: list):
+        """Splits changes into NOTIFY payloads of at most MAX_NOTIFY_BYTES."""
+        batch, size = [], 0
+        for change in changes:
+            length = len(json.dumps(change))
+            if length > MAX_NOTIFY_BYTES:
+                change = {**change, "data": None}
+                length = len(json.dumps(change))
+            if batch and size + length > MAX_NOTIFY_BYTES:
+                yield batch
+                batch, size = [], 0
+            batch.append(change)
+            size += length + 2
+        if batch:
+            yield batch
+
+    def dispatch(self, change: dict):
+        """Offers a change to every subscriber of this worker (from any thread)."""
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.offer(change)
+            except RuntimeError:
+                # Its event loop is closed.
+                self._subscribers.discard(subscriber)
+
+    def subscribe(
+        self, allow=None, queue_size: int = CHANGE_FEED_QUEUE_SIZE
+    ) -> Subscriber:
+        """Opens a subscription on the running event loop. `allow(change)` filters changes."""
+        if len(self._subscribers) >= self.max_subscribers:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many open change streams, please retry later",
+                headers={"Retry-After": "5"},
+            )
+        self.ensure_started()
+        subscriber = Subscriber(allow, queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        if subscriber.evicted:
+            self.evictions += 1
+
+    def authz_filter(self, engine, user: dict):
+        """
+        Returns a predicate telling whether `user` may see a change: the authz rule of
+        the row's path is checked, with the changed row as context.resource. Rules that
+        do not depend on the row are decided once per stream and reused.
+        """
+        decisions = {}
+
+        def allow(change: dict) -> bool:
+            path = self._paths[change["table"]].format(id=change["id"])
+            if engine.is_public(path):
+                return True
+            matched = engine.match_rule(path)
+            if matched is None:
+                return False
+            rule_path, _, requires_context = matched
+            if not requires_context and rule_path in decisions:
+                return decisions[rule_path]
+            request = Request(
+                {
+                    "type": "http",
+                    "method": "GET",
+                    "path": path,
+                    "path_params": {"id": change["id"]},
+                    "headers": [],
+                    "query_string": b"",
+                }
+            )
+            try:
+                allowed = engine.check(
+                    request, user, context={"resource": change["data"] or {}}
+                )
+            except HTTPException:
+                allowed = False
+            if not requires_context:
+                decisions[rule_path] = allowed
+            return allowed
+
+        return allow
+
+    async def stream(
+        self, subscriber: Subscriber, heartbeat: float = CHANGE_FEED_HEARTBEAT
+    ):
+        """
+        Yields the subscriber's changes as server-sent events ("insert", "update",
+        "delete", or "reset" when changes may have been missed), with keep-alive
+        comments while idle. Ends with an "evicted" event if the client fell behind.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    change = await asyncio.wait_for(subscriber.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if change is None:
+                    yield 'event: evicted\ndata: {"reason": "slow consumer"}\n\n'
+                    return
+                yield f"event: {change['op']}\ndata: {json.dumps(change)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "evictions": self.evictions,
+            "backend": type(self.backend).__name__,
+        }
+
+
+# --- Singleton Feed ---
+change_feed = ChangeFeed(BACKENDS[CHANGE_FEED_BACKEND]())
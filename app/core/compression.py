@@ -0,0 +1,318 @@
+# app/core/compression.py
+import logging
+import os
+import zlib
+
+from .responses import coded_etag, matching_etag
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Optional Encoders ---
+# brotli and zstandard are optional; their encodings are only offered when installed.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- Configuration ---
+# Responses smaller than this (in bytes) are sent uncompressed.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Encodings in order of preference when the client accepts several with equal weight.
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# Content types that are already compressed; compressing them again only costs CPU.
+INCOMPRESSIBLE_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-7z-compressed",
+    "application/vnd.rar",
+    "application/octet-stream",
+)
+# ...except for these text-based image formats.
+COMPRESSIBLE_EXCEPTIONS = ("image/svg+xml",)
+
+
+class GzipEncoder:
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # A sync flush emits everything compressed so far, so streamed chunks reach the client.
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int = COMPRESSION_ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def available_encoders() -> dict:
+    """Returns the encoder class for each content-coding supported by this installation."""
+    encoders = {"gzip": GzipEncoder}
+    if brotli is not None:
+        encoders["br"] = BrotliEncoder
+    if zstandard is not None:
+        encoders["zstd"] = ZstdEncoder
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: str, preference: list[str]) -> str | None:
+    """
+    Picks the content-coding to use from an Accept-Encoding header: the highest
+    q-value wins and ties go to the earliest encoding in `preference`.
+    Returns None if the client accepts none of them.
+    """
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+
+    best, best_q = None, 0.0
+    for coding in preference:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _is_compressible(headers: list) -> bool:
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value.decode("latin-1").lower()
+            if content_type.startswith(COMPRESSIBLE_EXCEPTIONS):
+                return True
+            if content_type.startswith(INCOMPRESSIBLE_TYPES):
+                return False
+    return True
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses responses with the best encoding the client accepts
+    (zstd, brotli or gzip, depending on what is installed).
+    Complete bodies under `minimum_size` are sent as is. Streaming bodies are compressed
+    chunk by chunk and flushed after each one, so nothing is buffered and streams stay live.
+    Responses that already have a Content-Encoding or an already-compressed content
+    type are passed through untouched.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        encodings: str = COMPRESSION_ENCODINGS,
+        levels: dict | None = None,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = available_encoders()
+        self.preference = [
+            coding.strip()
+            for coding in encodings.split(",")
+            if coding.strip() in self.encoders
+        ]
+        self.levels = levels or {}
+        log.debug(f"Response compression enabled for: {', '.join(self.preference)}")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = if_none_match = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+            elif name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+        coding = negotiate_encoding(accept_encoding, self.preference)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        sender = _CompressingSender(self, coding, send, if_none_match)
+        await self.app(scope, receive, sender)
+
+    def create_encoder(self, coding: str):
+        encoder_class = self.encoders[coding]
+        if coding in self.levels:
+            return encoder_class(self.levels[coding])
+        return encoder_class()
+
+
+class _CompressingSender:
+    """Wraps the ASGI `send` callable of one response and compresses its body."""
+
+    def __init__(
+        self,
+        middleware: CompressionMiddleware,
+        coding: str,
+        send,
+        if_none_match: str = "",
+    ):
+        self.middleware = middleware
+        self.coding = coding
+        self.send = send
+        self.if_none_match = if_none_match
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            if message["status"] == 304:
+                self.passthrough = True
+                self._set_not_modified_headers(message)
+                await self.send(message)
+                return
+            # Hold the headers back until the first body chunk shows whether to compress.
+            self.start_message = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if not self._should_compress(start, body, more_body):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.encoder = self.middleware.create_encoder(self.coding)
+            if not more_body:
+                body = self.encoder.finish(body)
+                self._set_headers(start, len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            # Streaming: the length is unknown, so Content-Length is dropped.
+            self._set_headers(start, None)
+            await self.send(start)
+
+        if more_body:
+            chunk = self.encoder.compress(body) if body else b""
+        else:
+            chunk = self.encoder.finish(body)
+        if chunk or not more_body:
+            await self.send(
+                {"type": "http.response.body", "body": chunk, "more_body": more_body}
+            )
+
+    def _should_compress(self, start: dict, body: bytes, more_body: bool) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304):
+            return False
+        headers = start.get("headers", [])
+        if not _is_compressible(headers):
+            return False
+        if not more_body:
+            return len(body) >= self.middleware.minimum_size
+        # A streamed body may still declare its full size up front.
+        for name, value in headers:
+            if name == b"content-length":
+                return int(value) >= self.middleware.minimum_size
+        return True
+
+    def _set_headers(self, start: dict, content_length: int | None):
+        headers = [
+            (name, value)
+            for name, value in start.get("headers", [])
+            if name != b"content-length"
+        ]
+        # The compressed body is a different representation, so it needs its own ETag.
+        headers = [
+            (
+                (
+                    name,
+                    coded_etag(value.decode("latin-1"), self.coding).encode("latin-1"),
+                )
+                if name == b"etag"
+                else (name, value)
+            )
+            for name, value in headers
+        ]
+        headers = _vary_on_encoding(headers)
+        headers.append((b"content-encoding", self.coding.encode("latin-1")))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        start["headers"] = headers
+
+    def _set_not_modified_headers(self, start: dict):
+        """
+        A 304 has no body to compress, but it must repeat the validator the client
+        holds: the coded ETag when its cached copy was compressed, as the 200 sent it.
+        """
+        headers = []
+        for name, value in start.get("headers", []):
+            if name == b"etag":
+                etag = value.decode("latin-1")
+                value = (matching_etag(self.if_none_match, etag) or etag).encode(
+                    "latin-1"
+                )
+            headers.append((name, value))
+        start["headers"] = _vary_on_encoding(headers)
+
+
+def _vary_on_encoding(headers: list) -> list:
+    """Merges the Vary headers into one that includes Accept-Encoding."""
+    vary = [value for name, value in headers if name == b"vary"]
+    headers = [(name, value) for name, value in headers if name != b"vary"]
+    vary_values = b", ".join(vary)
+    if b"accept-encoding" not in vary_values.lower():
+        vary_values = (vary_values + b", " if vary_values else b"") + b"Accept-Encoding"
+    headers.append((b"vary", vary_values))
+    return headers
@@ -1,24 +1,355 @@
 # app/core/database.py
+import hashlib
+import itertools
+import logging
+import math
 import os
+import threading
+import time
 
-from sqlalchemy import create_engine
+from fastapi import Depends, Request, Response
+from sqlalchemy import any_, bindparam, create_engine, event, make_url, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
+from .query_stats import check_session_queries, instrument_engine
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Comma-separated URLs of read replicas, used by endpoints that depend on get_read_db.
+DATABASE_REPLICA_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+    if url.strip()
+]
+# "round_robin", or "least_connections" (the replica with the fewest connections in use).
+DB_REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin").lower()
+# Seconds between background health checks, and how long a failing replica is skipped.
+DB_REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "10"))
+DB_REPLICA_EJECT_SECONDS = float(os.getenv("DB_REPLICA_EJECT_SECONDS", "30"))
+# PostgreSQL replicas replaying more than this many seconds behind are ejected (0 disables).
+# The lag reads high while the primary has no writes at all, so keep it generous.
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "0"))
+# After a request that wrote, reads from the same client go to the primary for this many
+# seconds, so the client sees its own writes despite replication lag (0 disables).
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+# The engine is created on first use rather than at import time, so importing the
+# models (e.g. in tests or tooling) does not require a configured database.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 Base = declarative_base()
 
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Returns the application's engine, creating it (and binding SessionLocal to it)
+    on the first call.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                database_url = os.getenv("DATABASE_URL")
+                if not database_url:
+                    raise ValueError("DATABASE_URL environment variable is not set")
+                _engine = create_engine(database_url)
+                # Query timing, slow query logging and per-session query counts
+                instrument_engine(_engine)
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def dispose_engine(close: bool = True):
+    """
+    Discards all pooled connections (of the replicas too); the engines stay usable.
+    In a freshly forked worker, call it with close=False: the inherited connections
+    belong to the parent process and must be dropped without being closed.
+    """
+    if _engine is not None:
+        _engine.dispose(close=close)
+    replica_router.dispose(close=close)
+
+
+def __getattr__(name):
+    # Keeps `from app.core.database import engine` working for scripts.
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def id_in(db, column, ids):
+    """
+    A `column IN ids` condition. On PostgreSQL it is rendered as `column = ANY(:ids)`
+    with a single array parameter, so the statement text (and its cached plan) does
+    not depend on how many ids are passed.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return column == any_(bindparam("ids", list(ids), type_=ARRAY(column.type)))
+    return column.in_(list(ids))
+
+
+# --- Read Replicas ---
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = None
+        self.ejected_until = 0.0
+        self.last_error = None
+
+    def get_engine(self):
+        if self.engine is None:
+            # Pre-ping replaces connections broken by a replica restart or failover.
+            self.engine = create_engine(self.url, pool_pre_ping=True)
+            instrument_engine(self.engine)
+        return self.engine
+
+    def in_use(self) -> int:
+        checkedout = (
+            getattr(self.engine.pool, "checkedout", None) if self.engine else None
+        )
+        return checkedout() if checkedout else 0
+
+
+class ReplicaRouter:
+    """
+    Picks a read replica for each read-only session, round-robin or by fewest
+    connections in use. Replicas failing a background health check (or a query) are
+    ejected for `eject_seconds` and readmitted once a check passes again; with no
+    healthy replica, reads fall back to the primary.
+    """
+
+    def __init__(
+        self,
+        urls: list[str] = DATABASE_REPLICA_URLS,
+        strategy: str = DB_REPLICA_STRATEGY,
+        health_interval: float = DB_REPLICA_HEALTH_INTERVAL,
+        eject_seconds: float = DB_REPLICA_EJECT_SECONDS,
+        max_lag: float = DB_REPLICA_MAX_LAG,
+    ):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica strategy '{strategy}'")
+        self.replicas = [Replica(url) for url in urls]
+        self.strategy = strategy
+        self.health_interval = health_interval
+        self.eject_seconds = eject_seconds
+        self.max_lag = max_lag
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._checker = None
+
+    def choose(self) -> Replica | None:
+        if not self.replicas:
+            return None
+        self._ensure_checker()
+        now = time.monotonic()
+        healthy = [replica for replica in self.replicas if replica.ejected_until <= now]
+        if not healthy:
+            return None
+        if self.strategy == "least_connections":
+            # Rotating the candidates first spreads ties evenly.
+            offset = next(self._counter) % len(healthy)
+            return min(healthy[offset:] + healthy[:offset], key=Replica.in_use)
+        return healthy[next(self._counter) % len(healthy)]
+
+    def eject(self, replica: Replica, error):
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+        replica.last_error = str(error)
+        log.warning(
+            f"Ejecting read replica {self._display(replica)} for {self.eject_seconds}s: {error}"
+        )
+        if replica.engine is not None:
+            # Its pooled connections are likely broken as well.
+            replica.engine.dispose()
+
+    def check(self, replica: Replica) -> bool:
+        """Probes a replica: ejects it on failure or excessive lag, readmits it on success."""
+        try:
+            with replica.get_engine().connect() as conn:
+                conn.execute(text("SELECT 1"))
+                if self.max_lag and conn.dialect.name == "postgresql":
+                    lag = conn.execute(
+                        text(
+                            "SELECT COALESCE(EXTRACT(EPOCH FROM "
+                            "now() - pg_last_xact_replay_timestamp()), 0)"
+                        )
+                    ).scalar()
+                    if lag > self.max_lag:
+                        raise RuntimeError(f"replication lag of {lag:.1f}s")
+        except Exception as e:
+            self.eject(replica, e)
+            return False
+        if replica.ejected_until:
+            log.info(f"Read replica {self._display(replica)} is healthy again.")
+            replica.ejected_until = 0.0
+        return True
+
+    def check_all(self):
+        for replica in self.replicas:
+            self.check(replica)
+
+    def _ensure_checker(self):
+        if self._checker is None and self.health_interval > 0:
+            with self._lock:
+                if self._checker is None:
+                    self._checker = threading.Thread(
+                        target=self._check_periodically,
+                        name="db-replica-health",
+                        daemon=True,
+                    )
+                    self._checker.start()
+
+    def _check_periodically(self):
+        while True:
+            time.sleep(self.health_interval)
+            self.check_all()
+
+    @staticmethod
+    def _display(replica: Replica) -> str:
+        return make_url(replica.url).render_as_string(hide_password=True)
+
+    def dispose(self, close: bool = True):
+        for replica in self.replicas:
+            if replica.engine is not None:
+                replica.engine.dispose(close=close)
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": self._display(replica),
+                "healthy": replica.ejected_until <= now,
+                "connections_in_use": replica.in_use(),
+                "last_error": replica.last_error,
+            }
+            for replica in self.replicas
+        ]
+
+
+class ReadYourWrites:
+    """
+    Pins a client's reads to the primary for `window` seconds after it wrote. The client
+    is recognised by a cookie set on the response that committed the write (which works
+    across workers) and, in this process, by its Authorization header or address.
+    """
+
+    COOKIE = "db_primary_until"
+
+    def __init__(
+        self, window: float = DB_READ_YOUR_WRITES_SECONDS, max_clients: int = 10000
+    ):
+        self.window = window
+        self.max_clients = max_clients
+        self._until = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def client_key(request: Request) -> str | None:
+        authorization = request.headers.get("authorization")
+        if authorization:
+            return hashlib.sha256(authorization.encode()).hexdigest()
+        return request.client.host if request.client else None
+
+    def record(self, request: Request, response: Response | None = None):
+        if self.window <= 0:
+            return
+        until = time.time() + self.window
+        key = self.client_key(request)
+        with self._lock:
+            if len(self._until) >= self.max_clients:
+                now = time.time()
+                self._until = {k: v for k, v in self._until.items() if v > now}
+            if key is not None and len(self._until) < self.max_clients:
+                self._until[key] = until
+        if response is not None:
+            response.set_cookie(
+                self.COOKIE,
+                f"{until:.3f}",
+                max_age=math.ceil(self.window),
+                httponly=True,
+                samesite="lax",
+            )
+
+    def is_pinned(self, request: Request) -> bool:
+        if self.window <= 0:
+            return False
+        now = time.time()
+        try:
+            if float(request.cookies.get(self.COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        return self._until.get(self.client_key(request), 0) > now
+
+
+# --- Singleton Instances ---
+replica_router = ReplicaRouter()
+read_your_writes = ReadYourWrites()
+
+
+def _flag_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+def _after_commit(session):
+    if session.info.pop("wrote", False):
+        callback = session.info.get("after_write")
+        if callback is not None:
+            callback()
+
+
+def _after_rollback(session):
+    session.info.pop("wrote", None)
+
+
+event.listen(Session, "after_flush", _flag_write)
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_rollback", _after_rollback)
+
 
 # Dependency to get a DB session
-def get_db():
+def get_db(request: Request, response: Response):
+    get_engine()
     db = SessionLocal()
+    if replica_router.replicas:
+        # A commit that wrote pins this client's reads to the primary for a while.
+        db.info["after_write"] = lambda: read_your_writes.record(request, response)
     try:
         yield db
     finally:
+        # Flags requests that issue too many queries (a likely N+1 pattern).
+        check_session_queries(db)
         db.close()
+
+
+def get_read_db(request: Request, db: Session = Depends(get_db)):
+    """
+    Dependency for read-only endpoints: a session on a healthy read replica when
+    replicas are configured, otherwise (or within the client's read-your-writes window)
+    the primary session from get_db.
+    """
+    replica = None if read_your_writes.is_pinned(request) else replica_router.choose()
+    if replica is None:
+        yield db
+        return
+    # Marked so that caches are never filled with rows that may lag behind the primary.
+    replica_db = SessionLocal(bind=replica.get_engine(), info={"replica": True})
+    try:
+        yield replica_db
+    except DBAPIError as e:
+        # Connection-level failures take the replica out of rotation until it recovers.
+        if e.connection_invalidated or isinstance(e, OperationalError):
+            replica_router.eject(replica, e.orig)
+        raise
+    finally:
+        check_session_queries(replica_db)
+        replica_db.close()
@@ -0,0 +1,262 @@
+# app/core/geoip.py
+import bisect
+import logging
+import os
+import socket
+import threading
+from array import array
+from functools import lru_cache
+from typing import Iterable
+
+from fastapi import Header
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# To use Geofencing, you must download the free GeoLite2-Country.mmdb database from MaxMind's website
+# and point GEOIP_DB_PATH at it. The file is opened lazily on the first geofenced request.
+GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH", "/app/app/GeoLite2-Country.mmdb")
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "10000"))
+# Load the whole database into an in-memory range table instead of querying the mmdb tree.
+GEOIP_RANGE_TABLE = os.getenv("GEOIP_RANGE_TABLE", "false").lower() == "true"
+# Country used when geolocation is unavailable (no database or no client address).
+GEOIP_DEFAULT_COUNTRY = os.getenv("GEOIP_DEFAULT_COUNTRY", "US")
+
+
+def _open_reader(path: str):
+    """Opens the MaxMind database memory-mapped, using the C extension when it is installed."""
+    import maxminddb
+
+    try:
+        return maxminddb.open_database(path, maxminddb.MODE_MMAP_EXT)
+    except ValueError:
+        # The C extension is not available; fall back to the pure-Python mmap reader.
+        return maxminddb.open_database(path, maxminddb.MODE_MMAP)
+
+
+_IPV4_MAPPED_PREFIX = 0xFFFF << 32
+
+
+def _parse_ip(ip: str) -> tuple[int, int] | None:
+    """
+    Parses an address into (version, integer value), or None if it is invalid.
+    IPv4-mapped IPv6 addresses (::ffff:a.b.c.d) are treated as IPv4.
+    """
+    ip = ip.strip()
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except OSError:
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    except OSError:
+        return None
+    if value >> 32 == 0xFFFF:
+        return 4, value - _IPV4_MAPPED_PREFIX
+    return 6, value
+
+
+def _country_of(record) -> str | None:
+    """Extracts the ISO country code from a raw database record."""
+    if not isinstance(record, dict):
+        return None
+    return (record.get("country") or {}).get("iso_code")
+
+
+class CountryRangeTable:
+    """
+    A compact, array-backed copy of a country database.
+    Each IP version is stored as sorted, non-overlapping [start, end] address ranges
+    plus an index into a small table of country codes, so a lookup is one binary search.
+    """
+
+    def __init__(self, networks: Iterable):
+        self._codes = []
+        code_indexes = {}
+        ranges = {4: [], 6: []}
+        for network, record in networks:
+            code = _country_of(record)
+            if code is None:
+                continue
+            if code not in code_indexes:
+                code_indexes[code] = len(self._codes)
+                self._codes.append(code)
+            ranges[network.version].append(
+                (
+                    int(network.network_address),
+                    int(network.broadcast_address),
+                    code_indexes[code],
+                )
+            )
+
+        # IPv4 bounds fit in fixed-width arrays; IPv6 bounds need Python ints.
+        self._tables = {
+            4: (array("L"), array("L"), array("H")),
+            6: ([], [], array("H")),
+        }
+        for version, version_ranges in ranges.items():
+            starts, ends, indexes = self._tables[version]
+            for start, end, code_index in sorted(version_ranges):
+                # Merge adjacent ranges that map to the same country.
+                if indexes and indexes[-1] == code_index and ends[-1] + 1 == start:
+                    ends[-1] = end
+                else:
+                    starts.append(start)
+                    ends.append(end)
+                    indexes.append(code_index)
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts, _, _ in self._tables.values())
+
+    def _find(self, version: int, value: int, lo: int = 0) -> tuple[int, str | None]:
+        starts, ends, indexes = self._tables[version]
+        i = bisect.bisect_right(starts, value, lo) - 1
+        if i >= 0 and value <= ends[i]:
+            return i, self._codes[indexes[i]]
+        return max(i, 0), None
+
+    def lookup(self, ip: str) -> str | None:
+        """Returns the country code for an IP address, or None if it is invalid or not mapped."""
+        parsed = _parse_ip(ip)
+        if parsed is None:
+            return None
+        return self._find(*parsed)[1]
+
+    def lookup_many(self, ips: list[str]) -> list[str | None]:
+        """
+        Resolves many addresses in one pass. The addresses are visited in sorted order,
+        so each binary search only covers the part of the table after the previous hit.
+        """
+        results = [None] * len(ips)
+        parsed = sorted(
+            (address, i)
+            for i, address in enumerate(map(_parse_ip, ips))
+            if address is not None
+        )
+        lo, current_version = 0, None
+        for (version, value), i in parsed:
+            if version != current_version:
+                lo, current_version = 0, version
+            lo, results[i] = self._find(version, value, lo)
+        return results
+
+
+class GeoIPResolver:
+    """
+    Resolves client IP addresses to ISO country codes for geofenced routes.
+    The database is opened lazily on first use with a memory-mapped reader, only the
+    country code is extracted from each record, and results are kept in an LRU cache.
+    """
+
+    def __init__(
+        self,
+        db_path: str = GEOIP_DB_PATH,
+        cache_size: int = GEOIP_CACHE_SIZE,
+        use_range_table: bool = GEOIP_RANGE_TABLE,
+    ):
+        self.db_path = db_path
+        self.use_range_table = use_range_table
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._reader = None
+        self._range_table = None
+        self._lookup_cached = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                reader = _open_reader(self.db_path)
+                if self.use_range_table:
+                    try:
+                        self._range_table = CountryRangeTable(reader)
+                    finally:
+                        reader.close()
+                    log.info(
+                        f"Loaded GeoIP range table with {len(self._range_table)} ranges from {self.db_path}."
+                    )
+                else:
+                    self._reader = reader
+            except (FileNotFoundError, ImportError):
+                log.warning(
+                    f"GeoIP database not available at {self.db_path}. Geofencing will default to '{GEOIP_DEFAULT_COUNTRY}'."
+                )
+            except (OSError, RuntimeError, ValueError) as e:
+                # A corrupt or truncated file (maxminddb.InvalidDatabaseError is a RuntimeError).
+                # Logged once: the resolver stays loaded without a database until close().
+                log.error(
+                    f"GeoIP database at {self.db_path} could not be read ({e}). "
+                    f"Geofencing will default to '{GEOIP_DEFAULT_COUNTRY}'."
+                )
+            self._loaded = True
+
+    @property
+    def available(self) -> bool:
+        """True if a GeoIP database could be loaded."""
+        self._ensure_loaded()
+        return self._reader is not None or self._range_table is not None
+
+    def _lookup(self, ip: str) -> str | None:
+        if self._range_table is not None:
+            return self._range_table.lookup(ip)
+        try:
+            return _country_of(self._reader.get(ip.strip()))
+        except ValueError:
+            # An invalid address, or an IPv6 address against an IPv4-only database
+            return None
+
+    def country_code(self, ip: str) -> str | None:
+        """
+        Returns the ISO country code for an IP address, or None if the address is
+        invalid, not in the database, or no database is available.
+        """
+        if not self.available:
+            return None
+        return self._lookup_cached(ip)
+
+    def country_codes(self, ips: Iterable[str]) -> list[str | None]:
+        """Resolves many IP addresses at once, looking up each distinct address only once."""
+        ips = list(ips)
+        if not self.available:
+            return [None] * len(ips)
+        distinct = list(set(ips))
+        if self._range_table is None:
+            codes = [self._lookup_cached(ip) for ip in distinct]
+        else:
+            codes = self._range_table.lookup_many(distinct)
+        resolved = dict(zip(distinct, codes))
+        return [resolved[ip] for ip in ips]
+
+    def cache_info(self):
+        """Returns the LRU cache statistics (hits, misses, maxsize, currsize)."""
+        return self._lookup_cached.cache_info()
+
+    def close(self):
+        """Releases the database and clears the cache. It is reopened on next use."""
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = None
+            self._range_table = None
+            self._loaded = False
+            self._lookup_cached.cache_clear()
+
+
+# --- Singleton Resolver Instance ---
+# Shared by every geofenced route. Nothing is read from disk until the first lookup.
+geoip_resolver = GeoIPResolver()
+
+
+def get_source_country(x_forwarded_for: str | None = Header(None)) -> str:
+    """
+    Dependency for geofenced routes. Resolves the originating client IP (the first
+    X-Forwarded-For entry) to a country code. Returns GEOIP_DEFAULT_COUNTRY when
+    geolocation is unavailable and "UNKNOWN" for addresses not in the database.
+    """
+    if not x_forwarded_for or not geoip_resolver.available:
+        return GEOIP_DEFAULT_COUNTRY
+    return geoip_resolver.country_code(x_forwarded_for.split(",")[0]) or "UNKNOWN"
@@ -0,0 +1,469 @@
+# app/core/idempotency.py
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from ..models.idempotency import IdempotencyKey
+from .database import SessionLocal, get_engine
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# "memory" (per worker process) or "database" (the idempotency_keys table, shared by all
+# workers, so a retry is recognised whichever worker it reaches).
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+# Number of web worker processes (gunicorn/prod.py exports the count it starts).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# How long (seconds) a completed response is replayed for its key.
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Lease of a request still being handled; after it, a key left behind by a crashed
+# worker can be used again.
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# How long a duplicate waits for the first request with its key to finish before
+# getting a 409.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# Interval (seconds) of the background purge of expired keys (0 disables).
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "300"))
+# Keys kept by the memory backend; the oldest are dropped beyond this.
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+
+# Response headers stored with the body and sent again on replay.
+STORED_HEADERS = ("content-type", "etag", "location")
+# Responses worth retrying are not stored: the key is released for the next attempt.
+RETRYABLE_STATUSES = {408, 409, 425, 429}
+# Neither are authentication or authorization failures: the request was refused before
+# the endpoint changed anything (some, like a failed token introspection, are temporary),
+# and a retry with valid credentials must run it.
+REFUSED_STATUSES = {401, 403}
+# How often a duplicate re-checks a key being handled by another worker process.
+POLL_INTERVAL = 0.1
+
+
+# --- Stores ---
+
+
+class IdempotencyStore(ABC):
+    """
+    Maps a key to (request fingerprint, status code, headers, body). `begin` claims a
+    key for the calling request, or returns the record already stored for it; the
+    claim ends with `complete` (the response is stored) or `release` (it is not).
+    """
+
+    def __init__(
+        self,
+        ttl: float = IDEMPOTENCY_TTL,
+        lock_timeout: float = IDEMPOTENCY_LOCK_SECONDS,
+        purge_interval: float = IDEMPOTENCY_PURGE_INTERVAL,
+    ):
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.purge_interval = purge_interval
+        self._purger = None
+        self._purger_lock = threading.Lock()
+
+    @abstractmethod
+    def begin(self, key: str, fingerprint: str) -> dict | None:
+        """Claims `key` and returns None, or returns the record stored for it."""
+
+    @abstractmethod
+    def complete(self, key: str, status_code: int, headers: list, body: bytes):
+        """Stores the response of the request that claimed `key`."""
+
+    @abstractmethod
+    def release(self, key: str):
+        """Gives up the claim on `key` without storing a response."""
+
+    @abstractmethod
+    def purge(self) -> int:
+        """Deletes expired keys and returns how many there were."""
+
+    def ensure_purger(self):
+        if self._purger is None and self.purge_interval > 0:
+            with self._purger_lock:
+                if self._purger is None:
+                    self._purger = threading.Thread(
+                        target=self._purge_periodically,
+                        name="idempotency-purge",
+                        daemon=True,
+                    )
+                    self._purger.start()
+
+    def _purge_periodically(self):
+        while True:
+            time.sleep(self.purge_interval)
+            try:
+                purged = self.purge()
+                if purged:
+                    log.debug(f"Purged {purged} expired idempotency keys.")
+            except Exception as e:
+                log.warning(f"Purging idempotency keys failed: {e}")
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Keys in this process; a retry that reaches another worker is handled again."""
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS, **options):
+        super().__init__(**options)
+        self.max_keys = max_keys
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record["expires_at"] > now:
+                return dict(record)
+            self._records.pop(key, None)
+            self._records[key] = {
+                "fingerprint": fingerprint,
+                "status_code": None,
+                "headers": None,
+                "body": None,
+                "expires_at": now + self.lock_timeout,
+            }
+            while len(self._records) > self.max_keys:
+                self._records.popitem(last=False)
+        return None
+
+    def complete(self, key: str, status_code: int, headers: list, body: bytes):
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                record.update(
+                    status_code=status_code,
+                    headers=headers,
+                    body=body,
+                    expires_at=time.time() + self.ttl,
+                )
+
+    def release(self, key: str):
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record["status_code"] is None:
+                del self._records[key]
+
+    def purge(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [
+                key
+                for key, record in self._records.items()
+                if record["expires_at"] <= now
+            ]
+            for key in expired:
+                del self._records[key]
+        return len(expired)
+
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+    """
+    Keys in the idempotency_keys table. The primary key makes `begin` atomic across
+    workers: only one INSERT of a key succeeds, and an expired key is taken over with
+    a conditional UPDATE.
+    """
+
+    def __init__(self, session_factory=SessionLocal, **options):
+        super().__init__(**options)
+        self.session_factory = session_factory
+
+    def _session(self):
+        if self.session_factory is SessionLocal:
+            get_engine()
+        return self.session_factory()
+
+    def begin(self, key: str, fingerprint: str) -> dict | None:
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.lock_timeout)
+        with self._session() as db:
+            db.add(
+                IdempotencyKey(key=key, fingerprint=fingerprint, expires_at=expires_at)
+            )
+            try:
+                db.commit()
+                return None
+            except IntegrityError:
+                db.rollback()
+            taken_over = db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key, IdempotencyKey.expires_at <= now)
+                .values(
+                    fingerprint=fingerprint,
+                    status_code=None,
+                    headers=None,
+                    body=None,
+                    expires_at=expires_at,
+                )
+            )
+            db.commit()
+            if taken_over.rowcount == 1:
+                return None
+            row = db.execute(
+                select(
+                    IdempotencyKey.fingerprint,
+                    IdempotencyKey.status_code,
+                    IdempotencyKey.headers,
+                    IdempotencyKey.body,
+                ).where(IdempotencyKey.key == key)
+            ).first()
+        if row is None:
+            # Purged in the meantime; the caller asks again.
+            return {"fingerprint": fingerprint, "status_code": None}
+        return row._asdict()
+
+    def complete(self, key: str, status_code: int, headers: list, body: bytes):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        with self._session() as db:
+            db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key)
+                .values(
+                    status_code=status_code,
+                    headers=headers,
+                    body=body,
+                    expires_at=expires_at,
+                )
+            )
+            db.commit()
+
+    def release(self, key: str):
+        with self._session() as db:
+            db.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+                )
+            )
+            db.commit()
+
+    def purge(self) -> int:
+        with self._session() as db:
+            result = db.execute(
+                delete(IdempotencyKey).where(
+                    IdempotencyKey.expires_at <= datetime.now(timezone.utc)
+                )
+            )
+            db.commit()
+        return result.rowcount
+
+
+BACKENDS = {"memory": MemoryIdempotencyStore, "database": DatabaseIdempotencyStore}
+
+
+# --- Middleware ---
+
+
+def _sha256(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """
+    Makes POST requests carrying an Idempotency-Key header safe to retry. The first
+    request with a key runs normally and its response is stored; a retry with the same
+    key and body gets that response again (with "Idempotent-Replayed: true") without the
+    endpoint running, and one arriving while the first is still in progress waits for
+    it. Reusing a key for a different request is rejected with a 422.
+
+    Keys are scoped to the client's Authorization header (or its address when it has
+    none), so a stored response is only ever replayed to the credentials that caused it.
+    Server errors, retryable statuses (RETRYABLE_STATUSES) and refused credentials
+    (REFUSED_STATUSES) are not stored.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: IdempotencyStore | None = None,
+        wait_timeout: float = IDEMPOTENCY_WAIT_SECONDS,
+        methods: frozenset[str] = frozenset({"POST"}),
+    ):
+        self.app = app
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self.methods = methods
+        self.replayed = 0
+        # Requests in progress in this process, so duplicates are woken as soon as they end.
+        self._in_flight: dict[str, asyncio.Event] = {}
+
+    def _get_store(self) -> IdempotencyStore:
+        if self.store is None:
+            self.store = BACKENDS[IDEMPOTENCY_BACKEND]()
+            if isinstance(self.store, MemoryIdempotencyStore) and WEB_CONCURRENCY > 1:
+                log.warning(
+                    f"IDEMPOTENCY_BACKEND=memory with {WEB_CONCURRENCY} workers: a retry that "
+                    "reaches another worker runs again. Set IDEMPOTENCY_BACKEND=database."
+                )
+        self.store.ensure_purger()
+        return self.store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(idempotency_key) <= 255:
+            await self._error(
+                scope, receive, send, 400, "Idempotency-Key must be 1-255 characters"
+            )
+            return
+
+        body = await self._read_body(receive)
+        client = headers.get("authorization") or (scope.get("client") or ("",))[0]
+        key = _sha256(client.encode(), idempotency_key.encode())
+        fingerprint = _sha256(
+            scope["method"].encode(),
+            scope["path"].encode(),
+            scope["query_string"],
+            body,
+        )
+        store = self._get_store()
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            record = await run_in_threadpool(store.begin, key, fingerprint)
+            if record is None:
+                await self._run(scope, receive, send, body, store, key)
+                return
+            if record["fingerprint"] != fingerprint:
+                await self._error(
+                    scope,
+                    receive,
+                    send,
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    "Idempotency-Key was already used for a different request",
+                )
+                return
+            if record["status_code"] is not None:
+                self.replayed += 1
+                await self._replay(send, record)
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                await self._error(
+                    scope,
+                    receive,
+                    send,
+                    status.HTTP_409_CONFLICT,
+                    "A request with this Idempotency-Key is still in progress",
+                    {"Retry-After": "1"},
+                )
+                return
+            event = self._in_flight.get(key)
+            if event is None:
+                await asyncio.sleep(min(POLL_INTERVAL, remaining))
+            else:
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run(
+        self, scope, receive, send, body: bytes, store: IdempotencyStore, key: str
+    ):
+        """Runs the request and stores its response under the key."""
+        self._in_flight[key] = event = asyncio.Event()
+        body_sent = False
+        response_start = None
+        chunks = []
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def send_and_capture(message):
+            nonlocal response_start
+            if message["type"] == "http.response.start":
+                response_start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_capture)
+        finally:
+            try:
+                status_code = response_start["status"] if response_start else None
+                if (
+                    status_code
+                    and status_code < 500
+                    and status_code not in RETRYABLE_STATUSES
+                    and status_code not in REFUSED_STATUSES
+                ):
+                    stored_headers = [
+                        [name.decode("latin-1"), value.decode("latin-1")]
+                        for name, value in response_start.get("headers", [])
+                        if name.decode("latin-1").lower() in STORED_HEADERS
+                    ]
+                    await run_in_threadpool(
+                        store.complete,
+                        key,
+                        status_code,
+                        stored_headers,
+                        b"".join(chunks),
+                    )
+                else:
+                    await run_in_threadpool(store.release, key)
+            except Exception as e:
+                log.warning(f"Could not store the response for an idempotency key: {e}")
+            finally:
+                self._in_flight.pop(key, None)
+                event.set()
+
+    @staticmethod
+    async def _replay(send, record: dict):
+        headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in record["headers"] or []
+        ]
+        headers.append((b"idempotent-replayed", b"true"))
+        body = record["body"] or b""
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": record["status_code"],
+                "headers": headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _error(scope, receive, send, status_code: int, detail: str, headers=None):
+        response = JSONResponse(
+            {"detail": detail}, status_code=status_code, headers=headers
+        )
+        await response(scope, receive, send)
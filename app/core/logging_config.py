@@ -1,8 +1,18 @@
 # app/core/logging_config.py
+import asyncio
+import copy
+import json
 import logging
 import os
+import queue
+import random
+import re
 import sys
+import threading
+import time
+from contextvars import ContextVar
 from logging.config import dictConfig
+from logging.handlers import QueueHandler
 
 # Use a third-party library for easy JSON formatting if available,
 # otherwise fall back to a basic implementation.
@@ -15,27 +25,391 @@ except ImportError:
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
+# --- Asynchronous Logging ---
+# When enabled, request handlers only put records on a bounded queue; a dedicated
+# writer thread formats them and writes them to stdout in batches.
+LOG_ASYNC = os.getenv("LOG_ASYNC", "false").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# What to do when the queue is full: "drop" the record, or "block" the caller
+# for up to LOG_QUEUE_BLOCK_TIMEOUT seconds and drop it only if there is still no room.
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop").lower()
+LOG_QUEUE_BLOCK_TIMEOUT = float(os.getenv("LOG_QUEUE_BLOCK_TIMEOUT", "1.0"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "256"))
+
+# --- Access Log Sampling & Rate Limiting ---
+# Per-route access log policy as JSON. Keys are regex patterns matched like the keys of
+# authz.map.json (BASE_PATH is prepended). "sample_rate" is the fraction of requests
+# logged and "rate_limit" caps the number of lines per second for that route.
+# Example: {"/api/items.*": {"sample_rate": 0.1, "rate_limit": 50}}
+ACCESS_LOG_ROUTES = json.loads(os.getenv("LOG_ACCESS_ROUTES", "{}"))
+# Requests slower than this, or answered with at least this status, are always logged.
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+LOG_ALWAYS_KEEP_STATUS = int(os.getenv("LOG_ALWAYS_KEEP_STATUS", "400"))
+# Maximum lines per second from any single logging call site (0 disables the limit).
+# Errors are never limited.
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "0"))
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "20"))
+
+# Set by RequestTimingMiddleware at the start of every HTTP request.
+request_start_time: ContextVar[float | None] = ContextVar(
+    "request_start_time", default=None
+)
+
+_STOP = object()
+
 
 class HealthCheckFilter(logging.Filter):
     """
     Filter out log messages for health check endpoints to reduce log noise.
     """
 
+    def __init__(self, name: str = ""):
+        super().__init__(name)
+        # Resolved once, instead of reading the environment for every record.
+        base_path = os.getenv("BASE_PATH", "")
+        self.excluded_paths = frozenset({f"{base_path}/api/health", "/api/health"})
+
     def filter(self, record: logging.LogRecord) -> bool:
-        # FastAPI/Uvicorn log records have 'scope' in their args
-        if len(record.args) >= 3 and isinstance(record.args[2], dict):
-            scope = record.args[2]
-            path = scope.get("path", "")
-            base_path = os.getenv("BASE_PATH", "")
-            if path in [f"{base_path}/api/health", "/api/health"]:
+        # Uvicorn access log records carry (client_addr, method, path, http_version, status)
+        # in their args; older versions passed the ASGI scope as the third argument.
+        if isinstance(record.args, tuple) and len(record.args) >= 3:
+            path = record.args[2]
+            if isinstance(path, dict):
+                path = path.get("path", "")
+            if isinstance(path, str) and path.split("?", 1)[0] in self.excluded_paths:
                 return False
         return True
 
 
+class TokenBucket:
+    """
+    A thread-safe token bucket refilled at `rate` tokens per second, holding at most `burst` tokens.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+
+class RequestTimingMiddleware:
+    """
+    A minimal ASGI middleware that records when each request started, so access log
+    filters can always keep slow requests. Uvicorn writes the access log line from
+    the request's own task, where this context variable is visible.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            request_start_time.set(time.perf_counter())
+        await self.app(scope, receive, send)
+
+
+class AccessLogSampler(logging.Filter):
+    """
+    Samples and rate-limits uvicorn access logs per route, according to ACCESS_LOG_ROUTES.
+    Error responses and slow requests are always kept. Surviving lines of a sampled
+    route report the sample rate, and lines following rate-limited ones report how
+    many were suppressed.
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        routes: dict | None = None,
+        slow_ms: float = LOG_SLOW_REQUEST_MS,
+        keep_status: int = LOG_ALWAYS_KEEP_STATUS,
+    ):
+        super().__init__(name)
+        base_path = os.getenv("BASE_PATH", "")
+        routes = ACCESS_LOG_ROUTES if routes is None else routes
+        self.slow_ms = slow_ms
+        self.keep_status = keep_status
+        self.routes = []
+        for pattern, policy in routes.items():
+            rate_limit = policy.get("rate_limit")
+            self.routes.append(
+                {
+                    "pattern": re.compile(f"{base_path}{pattern}"),
+                    "sample_rate": float(policy.get("sample_rate", 1.0)),
+                    "bucket": TokenBucket(float(rate_limit)) if rate_limit else None,
+                    "suppressed": 0,
+                }
+            )
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.routes:
+            return True
+        # Uvicorn access log args: (client_addr, method, path, http_version, status)
+        args = record.args
+        if not (isinstance(args, tuple) and len(args) >= 5):
+            return True
+        path = str(args[2]).split("?", 1)[0]
+        route = next((r for r in self.routes if r["pattern"].fullmatch(path)), None)
+        if route is None:
+            return True
+
+        if isinstance(args[4], int) and args[4] >= self.keep_status:
+            return True
+        started = request_start_time.get()
+        if (
+            started is not None
+            and (time.perf_counter() - started) * 1000 >= self.slow_ms
+        ):
+            return True
+
+        sample_rate = route["sample_rate"]
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return False
+        if route["bucket"] is not None and not route["bucket"].consume():
+            route["suppressed"] += 1
+            return False
+
+        if sample_rate < 1.0:
+            record.sample_rate = sample_rate
+            record.msg = f"{record.msg} [sample_rate={sample_rate:g}]"
+        if route["suppressed"]:
+            record.suppressed = route["suppressed"]
+            record.msg = f"{record.msg} [suppressed={route['suppressed']}]"
+            route["suppressed"] = 0
+        return True
+
+
+class MessageRateLimitFilter(logging.Filter):
+    """
+    Limits how often the same logging call site can emit, using one token bucket per
+    call site. Errors are never limited, and uvicorn access logs are left to
+    AccessLogSampler. The next line from a limited call site reports how many were suppressed.
+    """
+
+    def __init__(
+        self, name: str = "", rate: float = LOG_RATE_LIMIT, burst: int = LOG_RATE_BURST
+    ):
+        super().__init__(name)
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._suppressed = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            self.rate <= 0
+            or record.levelno >= logging.ERROR
+            or record.name == "uvicorn.access"
+        ):
+            return True
+        key = (record.pathname, record.lineno)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets.setdefault(key, TokenBucket(self.rate, self.burst))
+        if not bucket.consume():
+            self._suppressed[key] = self._suppressed.get(key, 0) + 1
+            return False
+        suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg} [suppressed={suppressed} similar]"
+        return True
+
+
+class AsyncQueueHandler(QueueHandler):
+    """
+    A non-blocking handler for the request path. Records are put on a bounded queue
+    and a dedicated writer thread formats and writes them in batches.
+    The message and traceback are rendered on the logging thread, while the objects
+    they refer to are still valid; only the final formatting (e.g. JSON) is deferred.
+    """
+
+    terminator = "\n"
+
+    def __init__(
+        self,
+        stream=None,
+        maxsize: int = LOG_QUEUE_SIZE,
+        policy: str = LOG_QUEUE_POLICY,
+        block_timeout: float = LOG_QUEUE_BLOCK_TIMEOUT,
+        batch_size: int = LOG_BATCH_SIZE,
+    ):
+        super().__init__(queue.Queue(maxsize))
+        self.stream = stream or sys.stdout
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.delayed = 0
+        self.written = 0
+        self._reported_dropped = 0
+        self._counters_lock = threading.Lock()
+        self._writer = threading.Thread(
+            target=self._write_loop, name="log-writer", daemon=True
+        )
+        self._writer.start()
+
+    def handle(self, record: logging.LogRecord):
+        # Unlike Handler.handle, emit() is not serialised by the handler lock: the queue
+        # is thread-safe, and a caller blocked on a full queue must not hold up the others.
+        result = self.filter(record)
+        if isinstance(result, logging.LogRecord):
+            record = result
+        if result:
+            self.emit(record)
+        return result
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # As QueueHandler.prepare, but without applying the formatter: `msg % args` and
+        # the traceback are rendered here, since args (e.g. ORM instances) may not be
+        # usable from the writer thread later.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            formatter = self.formatter or logging.Formatter()
+            if not record.exc_text:
+                record.exc_text = formatter.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            if self.policy != "block" or self._in_event_loop():
+                self._count("dropped")
+                return
+        self._count("delayed")
+        try:
+            self.queue.put(record, timeout=self.block_timeout)
+        except queue.Full:
+            self._count("dropped")
+
+    @staticmethod
+    def _in_event_loop() -> bool:
+        # Blocking the event loop thread would stall every request it serves, so the
+        # "block" policy drops records logged from it instead.
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    def _count(self, counter: str):
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _write_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self._write_batch(batch):
+                return
+
+    def _write_batch(self, batch: list) -> bool:
+        """Formats and writes one batch. Returns True once the stop marker is seen."""
+        stop = False
+        lines = []
+        for record in batch:
+            if record is _STOP:
+                stop = True
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+
+        dropped = self.dropped
+        if dropped > self._reported_dropped:
+            lines.append(
+                self.format(
+                    logging.makeLogRecord(
+                        {
+                            "name": __name__,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": f"Log queue full: dropped {dropped - self._reported_dropped} records.",
+                        }
+                    )
+                )
+            )
+            self._reported_dropped = dropped
+
+        if lines:
+            try:
+                self.stream.write(self.terminator.join(lines) + self.terminator)
+                self.stream.flush()
+                self.written += len(lines)
+            except Exception:
+                self.handleError(batch[0])
+        return stop
+
+    def stats(self) -> dict:
+        """Returns the queue depth and the dropped/delayed/written record counters."""
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.dropped,
+            "delayed": self.delayed,
+            "written": self.written,
+        }
+
+    def close(self):
+        """Drains the queue and stops the writer thread."""
+        if self._writer.is_alive():
+            self.queue.put(_STOP)
+            self._writer.join(timeout=5)
+        super().close()
+
+
+def get_log_queue_stats() -> dict | None:
+    """Returns the counters of the active asynchronous handler, or None in synchronous mode."""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, AsyncQueueHandler):
+            return handler.stats()
+    return None
+
+
 def setup_logging():
     """
     Configures the logging for the application.
+    Set LOG_ASYNC=true to move formatting and stdout writes off the request path.
+    Access log sampling and per-call-site rate limits are configured by the
+    LOG_ACCESS_ROUTES and LOG_RATE_LIMIT settings above.
     """
+    formatter = "json" if os.getenv("APP_ENV") == "production" else "default"
+    if LOG_ASYNC:
+        stdout_handler = {
+            "()": AsyncQueueHandler,
+            "stream": sys.stdout,
+            "formatter": formatter,
+        }
+    else:
+        stdout_handler = {
+            "class": "logging.StreamHandler",
+            "stream": sys.stdout,
+            "formatter": formatter,
+        }
+
     log_config = {
         "version": 1,
         "disable_existing_loggers": False,
@@ -50,13 +424,7 @@ def setup_logging():
             },
         },
         "handlers": {
-            "stdout": {
-                "class": "logging.StreamHandler",
-                "stream": sys.stdout,
-                "formatter": (
-                    "json" if os.getenv("APP_ENV") == "production" else "default"
-                ),
-            },
+            "stdout": {**stdout_handler, "filters": ["message_rate_limit"]},
         },
         "loggers": {
             "": {  # Root logger
@@ -67,9 +435,13 @@ def setup_logging():
                 "handlers": ["stdout"],
                 "level": LOG_LEVEL,
                 "propagate": False,
-                "filters": ["health_check_filter"],
+                "filters": ["health_check_filter", "access_log_sampler"],
             },
         },
-        "filters": {"health_check_filter": {"()": HealthCheckFilter}},
+        "filters": {
+            "health_check_filter": {"()": HealthCheckFilter},
+            "access_log_sampler": {"()": AccessLogSampler},
+            "message_rate_limit": {"()": MessageRateLimitFilter},
+        },
     }
     dictConfig(log_config)
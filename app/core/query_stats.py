@@ -0,0 +1,249 @@
+# app/core/query_stats.py
+import bisect
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Statements slower than this are logged (and optionally explained).
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# "off", "plan" (EXPLAIN) or "analyze" (EXPLAIN (ANALYZE, BUFFERS), which runs the
+# query again). Only SELECT statements on PostgreSQL are explained, in the background;
+# locking SELECTs and ones calling volatile functions only get a plain EXPLAIN.
+DB_EXPLAIN_SLOW = os.getenv("DB_EXPLAIN_SLOW", "off").lower()
+# Minimum seconds between two EXPLAINs of the same statement fingerprint.
+DB_EXPLAIN_INTERVAL = float(os.getenv("DB_EXPLAIN_INTERVAL", "300"))
+# A session issuing more statements than this is reported as a likely N+1 pattern.
+DB_QUERIES_PER_SESSION_WARN = int(os.getenv("DB_QUERIES_PER_SESSION_WARN", "20"))
+# Fingerprints tracked individually; the rest are aggregated under "<other>".
+DB_QUERY_STATS_MAX_FINGERPRINTS = int(
+    os.getenv("DB_QUERY_STATS_MAX_FINGERPRINTS", "500")
+)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s|\?|(?<![:\w]):\w+|\$\d+")
+_VALUE_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+# SELECTs with side effects that running them again under EXPLAIN ANALYZE would repeat:
+# row locks (which SKIP LOCKED queues rely on), sequences, notifications, advisory locks.
+_SIDE_EFFECTS_RE = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b|\bFOR\s+(?:KEY\s+)?SHARE\b"
+    r"|\b(?:nextval|setval|pg_notify|pg_(?:try_)?advisory_\w+)\s*\(",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """
+    Normalises a SQL statement so that executions differing only in literal values,
+    placeholder style, IN-list length or whitespace share one fingerprint.
+    """
+    normalised = _STRING_LITERAL_RE.sub("?", statement)
+    normalised = _PLACEHOLDER_RE.sub("?", normalised)
+    normalised = _NUMBER_RE.sub("?", normalised)
+    normalised = _VALUE_LIST_RE.sub("(?+)", normalised)
+    return _WHITESPACE_RE.sub(" ", normalised).strip()
+
+
+class QueryStats:
+    """Per-fingerprint execution counts, total/max latency and latency histograms."""
+
+    def __init__(self, max_fingerprints: int = DB_QUERY_STATS_MAX_FINGERPRINTS):
+        self.max_fingerprints = max_fingerprints
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, elapsed_ms: float):
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    key = "<other>"
+                entry = self._stats.setdefault(
+                    key,
+                    {
+                        "count": 0,
+                        "total_ms": 0.0,
+                        "max_ms": 0.0,
+                        "slow": 0,
+                        "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                        "plan": None,
+                    },
+                )
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["histogram"][bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+            if elapsed_ms >= DB_SLOW_QUERY_MS:
+                entry["slow"] += 1
+
+    def set_plan(self, key: str, plan: str):
+        with self._lock:
+            if key in self._stats:
+                self._stats[key]["plan"] = plan
+
+    def snapshot(self, top: int = 20, order_by: str = "total_ms") -> list[dict]:
+        """The `top` fingerprints by `order_by` (total_ms, count, max_ms or slow)."""
+        with self._lock:
+            entries = [
+                {"fingerprint": key, **entry, "histogram": list(entry["histogram"])}
+                for key, entry in self._stats.items()
+            ]
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        for entry in entries:
+            entry["mean_ms"] = round(entry["total_ms"] / entry["count"], 3)
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+            entry["histogram"] = {
+                f"le_{bound}ms": count
+                for bound, count in zip(
+                    (*LATENCY_BUCKETS_MS, "inf"), entry["histogram"]
+                )
+            }
+        return entries[:top]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class ExplainCapturer:
+    """
+    Captures execution plans of slow SELECTs on a background thread, on a separate
+    connection, so requests never wait for them. Each fingerprint is explained at most
+    once per `interval`, and pending requests beyond the queue size are dropped.
+    """
+
+    def __init__(
+        self, mode: str = DB_EXPLAIN_SLOW, interval: float = DB_EXPLAIN_INTERVAL
+    ):
+        self.mode = mode
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=100)
+        self._last_explained = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, engine, key: str, statement: str, parameters):
+        if self.mode not in ("plan", "analyze") or engine.dialect.name != "postgresql":
+            return
+        if not statement.lstrip()[:6].upper() == "SELECT":
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_explained.get(key, float("-inf")) < self.interval:
+                return
+            self._last_explained[key] = now
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="query-explainer", daemon=True
+                )
+                self._thread.start()
+        try:
+            self._queue.put_nowait((engine, key, statement, parameters))
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            engine, key, statement, parameters = self._queue.get()
+            try:
+                plan = self.explain(engine, statement, parameters)
+            except Exception as e:
+                log.warning(f"Could not EXPLAIN slow query {key!r}: {e}")
+                continue
+            query_stats.set_plan(key, plan)
+            log.warning(f"Plan for slow query {key!r}:\n{plan}")
+
+    def explain(self, engine, statement: str, parameters) -> str:
+        analyze = self.mode == "analyze" and not _SIDE_EFFECTS_RE.search(statement)
+        options = "ANALYZE, BUFFERS" if analyze else "COSTS"
+        # A raw DBAPI connection: it bypasses the instrumentation events, and the
+        # transaction is rolled back so ANALYZE has no lasting effect.
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"EXPLAIN ({options}) {statement}", parameters)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            connection.rollback()
+            connection.close()
+
+
+# --- Singleton Instances ---
+query_stats = QueryStats()
+explain_capturer = ExplainCapturer()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with a statement that fails.
+    context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - context._query_start_time) * 1000
+    key = fingerprint(statement)
+    query_stats.record(key, elapsed_ms)
+
+    session_queries = conn.info.get("session_queries")
+    if session_queries is not None:
+        session_queries[key] += 1
+
+    if elapsed_ms >= DB_SLOW_QUERY_MS:
+        log.warning(f"Slow query ({elapsed_ms:.1f} ms): {key}")
+        explain_capturer.submit(conn.engine, key, statement, parameters)
+
+
+def _track_session(session, transaction, connection):
+    # Statements on this connection are counted against the session until it is returned to the pool.
+    connection.info["session_queries"] = session.info.setdefault("queries", Counter())
+
+
+def _untrack_connection(dbapi_connection, connection_record):
+    connection_record.info.pop("session_queries", None)
+
+
+def instrument_engine(engine):
+    """Attaches the query timing, slow query and per-session counting listeners to an engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "checkin", _untrack_connection)
+
+
+event.listen(Session, "after_begin", _track_session)
+
+
+def check_session_queries(
+    session: Session, limit: int = DB_QUERIES_PER_SESSION_WARN
+) -> int:
+    """
+    Reports a session that issued more than `limit` statements (typically one request),
+    listing the most repeated ones, which usually point at an N+1 loop.
+    Returns the number of statements issued.
+    """
+    queries = session.info.get("queries")
+    total = sum(queries.values()) if queries else 0
+    if total > limit:
+        repeated = ", ".join(
+            f"{count}x {key[:120]!r}" for key, count in queries.most_common(3)
+        )
+        log.warning(
+            f"Session issued {total} queries (limit {limit}); most repeated: {repeated}"
+        )
+    return total
@@ -0,0 +1,244 @@
+# app/core/rate_limit.py
+import asyncio
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+from .logging_config import TokenBucket
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Requests per second and burst allowed per user ("sub" claim) on each route pattern of
+# authz.map.json that declares no "rate_limit" of its own (0 disables).
+RATE_LIMIT_DEFAULT_RATE = float(os.getenv("RATE_LIMIT_DEFAULT_RATE", "0"))
+RATE_LIMIT_DEFAULT_BURST = float(os.getenv("RATE_LIMIT_DEFAULT_BURST", "0"))
+# The same per client IP, for every request before its token is validated (and so for
+# all anonymous requests).
+RATE_LIMIT_ANONYMOUS_RATE = float(os.getenv("RATE_LIMIT_ANONYMOUS_RATE", "0"))
+RATE_LIMIT_ANONYMOUS_BURST = float(os.getenv("RATE_LIMIT_ANONYMOUS_BURST", "0"))
+# "memory" (buckets per worker process) or "redis" (shared by all workers; needs the
+# redis package and RATE_LIMIT_REDIS_URL).
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# Buckets kept by the memory backend; the least recently used are dropped beyond this.
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Requests handled at once by one worker before new ones are shed with a 503 (0 disables),
+# and how long a request may wait for a free slot before being shed.
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "0"))
+IN_FLIGHT_QUEUE_TIMEOUT_MS = float(os.getenv("IN_FLIGHT_QUEUE_TIMEOUT_MS", "0"))
+# Retry-After (seconds) sent with shed requests.
+LOAD_SHED_RETRY_AFTER = int(os.getenv("LOAD_SHED_RETRY_AFTER", "1"))
+
+
+# --- Rate Limit Backends ---
+
+
+class MemoryRateLimitBackend:
+    """
+    Token buckets in this process. With several workers each one enforces the limit
+    separately, so a client can get up to (workers x rate) in total.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rate: float, burst: float) -> float:
+        """Takes a token; returns 0 if one was available, else the seconds until one is."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.rate != rate or bucket.capacity != burst:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+        if bucket.consume():
+            return 0.0
+        return max(1.0 - bucket.tokens, 0.0) / rate
+
+
+class RedisRateLimitBackend:
+    """
+    Token buckets in Redis, shared by every worker and host. Each check is one atomic
+    script call using the Redis server clock. If Redis is unreachable, requests are
+    allowed rather than failed.
+    """
+
+    SCRIPT = """
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        # Optional dependency, only needed with RATE_LIMIT_BACKEND=redis.
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def consume(self, key: str, rate: float, burst: float) -> float:
+        try:
+            return float(self.script(keys=[f"ratelimit:{key}"], args=[rate, burst]))
+        except Exception as e:
+            log.warning(f"Rate limit backend unavailable, allowing request: {e}")
+            return 0.0
+
+
+BACKENDS = {"memory": MemoryRateLimitBackend, "redis": RedisRateLimitBackend}
+
+
+# --- Per-Client Rate Limiting ---
+
+
+def client_ip(request: Request) -> str:
+    # The peer address. Behind a proxy listed in FORWARDED_ALLOW_IPS, Uvicorn's proxy
+    # headers support has already replaced it with the right-most X-Forwarded-For hop
+    # that is not a trusted proxy. The header itself is never read here: clients can
+    # put any address first, and get a fresh bucket on every request.
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """
+    Token-bucket limits per caller and route pattern. Callers are identified by the
+    "sub" claim of their validated token, or by IP when anonymous (which is also how
+    every request is checked before its token is validated). A rule in
+    authz.map.json may declare its own limit, e.g. "rate_limit": {"rate": 1, "burst": 10}
+    (requests per second per caller; a rate of 0 disables it); other routes use the
+    default limits.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        default: tuple[float, float] = (
+            RATE_LIMIT_DEFAULT_RATE,
+            RATE_LIMIT_DEFAULT_BURST,
+        ),
+        anonymous: tuple[float, float] = (
+            RATE_LIMIT_ANONYMOUS_RATE,
+            RATE_LIMIT_ANONYMOUS_BURST,
+        ),
+    ):
+        self.backend = backend
+        self.default = default
+        self.anonymous = anonymous
+        self._lock = threading.Lock()
+
+    def _get_backend(self):
+        if self.backend is None:
+            with self._lock:
+                if self.backend is None:
+                    self.backend = BACKENDS[RATE_LIMIT_BACKEND]()
+        return self.backend
+
+    def check(self, request: Request, user: dict | None, matched: tuple | None):
+        """
+        Consumes a token for this caller and the matched authz rule
+        ((rule_path, rule, requires_context) or None), raising a 429 with Retry-After
+        when none is left.
+        """
+        rule_path, rule = (matched[0], matched[1]) if matched else ("*", {})
+        sub = user.get("sub") if user else None
+        if "rate_limit" in rule:
+            limit = rule["rate_limit"] or {}
+            rate = float(limit.get("rate", 0))
+            burst = float(limit.get("burst", 0))
+        else:
+            rate, burst = self.default if sub else self.anonymous
+        if rate <= 0:
+            return
+        identity = f"sub:{sub}" if sub else f"ip:{client_ip(request)}"
+        wait = self._get_backend().consume(
+            f"{rule_path}|{identity}", rate, burst or max(rate, 1.0)
+        )
+        if wait > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+
+# --- Load Shedding ---
+
+
+class LoadSheddingMiddleware:
+    """
+    Caps the requests handled at once by this worker. Once `max_in_flight` are in
+    progress, a new request waits at most `queue_timeout` seconds for a slot and is
+    otherwise answered with an immediate 503 and Retry-After, instead of queueing until
+    it times out. Exempt paths (health checks) are never shed.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_in_flight: int = MAX_IN_FLIGHT_REQUESTS,
+        queue_timeout: float = IN_FLIGHT_QUEUE_TIMEOUT_MS / 1000,
+        retry_after: int = LOAD_SHED_RETRY_AFTER,
+        exempt_paths: frozenset[str] = frozenset(),
+    ):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.exempt_paths = exempt_paths
+        self.shed = 0
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or self._slots is None
+            or scope["path"] in self.exempt_paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots.locked():
+            acquired = False
+            if self.queue_timeout > 0:
+                try:
+                    acquired = await asyncio.wait_for(
+                        self._slots.acquire(), self.queue_timeout
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            if not acquired:
+                self.shed += 1
+                response = JSONResponse(
+                    {"detail": "Server is overloaded, please retry later"},
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": str(self.retry_after)},
+                )
+                await response(scope, receive, send)
+                return
+        else:
+            await self._slots.acquire()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+
+# --- Singleton Instance ---
+rate_limiter = RateLimiter()
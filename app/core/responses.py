@@ -0,0 +1,141 @@
+# app/core/responses.py
+import hashlib
+import json
+from typing import Any, Iterable, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Encodes content as compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    The app's default response class. Same output as JSONResponse, but rendered with
+    orjson (when installed), which is several times faster for large payloads.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def schema_columns(model, schema, fields: list[str] | None = None) -> list:
+    """
+    Returns the ORM columns of `model` backing each field of a Pydantic `schema`, in field
+    order, or only those backing `fields` (as returned by parse_fields).
+    """
+    return [getattr(model, name) for name in (fields or schema.model_fields)]
+
+
+def parse_fields(fields: str | None, schema) -> list[str] | None:
+    """
+    Parses a sparse fieldset parameter ("fields=id,name") into field names of `schema`,
+    in schema order. Returns None when no fields are requested, meaning all of them.
+    Raises a 400 error for unknown fields.
+    """
+    requested = {name.strip() for name in (fields or "").split(",") if name.strip()}
+    if not requested:
+        return None
+    unknown = requested.difference(schema.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return [name for name in schema.model_fields if name in requested]
+
+
+class RowsJSONResponse(FastJSONResponse):
+    """
+    Encodes column tuples (e.g. the result of a select() over specific columns) straight
+    to a JSON list of objects, skipping ORM instances and per-object Pydantic validation.
+    Only use it for rows whose column types already match the response schema.
+    """
+
+    def __init__(self, rows: Iterable[Sequence], columns: Sequence[str], **kwargs):
+        names = tuple(columns)
+        super().__init__([dict(zip(names, row)) for row in rows], **kwargs)
+
+
+# --- Conditional Requests ---
+# Authenticated data may be stored by the browser, but must be revalidated on every use.
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Returns a strong ETag derived from the given version values."""
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+# Content-codings whose compressed representations get their own ETag (see coded_etag).
+ETAG_CODINGS = ("gzip", "br", "zstd")
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """
+    The ETag of a representation compressed with `coding`: '"abc"' becomes '"abc-gzip"'.
+    RFC 9110 forbids one strong validator for different content-codings.
+    """
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def _uncoded_etag(tag: str) -> str:
+    tag = tag.strip().removeprefix("W/")
+    for coding in ETAG_CODINGS:
+        suffix = f'-{coding}"'
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: str | None, etag: str, weak: bool = True) -> bool:
+    """
+    True if an If-None-Match header matches the ETag, using the weak comparison
+    RFC 9110 prescribes for it ("*", lists, and W/ prefixes are handled). The ETags
+    of compressed representations (see coded_etag) match their uncompressed one.
+    With weak=False it compares strongly, as for If-Match: W/ tags never match.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        _uncoded_etag(candidate) == etag
+        for candidate in if_none_match.split(",")
+        if weak or not candidate.strip().startswith("W/")
+    )
+
+
+def matching_etag(if_none_match: str | None, etag: str) -> str | None:
+    """
+    The If-None-Match entry that matches `etag` (weakly), as the client sent it, e.g.
+    the coded ETag of a compressed copy; None if there is none.
+    """
+    for candidate in (if_none_match or "").split(","):
+        if _uncoded_etag(candidate) == etag:
+            return candidate.strip()
+    return None
+
+
+def etag_headers(etag: str) -> dict:
+    """The validator headers sent with every conditional response."""
+    return {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    """An empty 304 response carrying the current ETag."""
+    return Response(status_code=304, headers=etag_headers(etag))
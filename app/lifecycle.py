@@ -0,0 +1,119 @@
+# app/lifecycle.py
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from .core.cache import entity_caches
+from .core.database import dispose_engine, get_engine
+from .core.geoip import geoip_resolver
+from .core.logging_config import setup_logging
+from .security import authz_engine, get_jwks
+from .services.jobs import JOB_WORKER_IN_APP, job_worker, load_handlers
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Subsystems to initialise during startup instead of on the first request that needs them.
+# Comma-separated list of: policies, jwks, db, geoip
+STARTUP_PREWARM = [
+    name.strip()
+    for name in os.getenv("STARTUP_PREWARM", "policies").split(",")
+    if name.strip()
+]
+# Number of connections opened to fill the DB pool when "db" is pre-warmed.
+PREWARM_DB_CONNECTIONS = int(os.getenv("PREWARM_DB_CONNECTIONS", "5"))
+
+
+def _prewarm_policies():
+    authz_engine.ensure_loaded()
+
+
+def _prewarm_jwks():
+    get_jwks()
+
+
+def _prewarm_db():
+    engine = get_engine()
+    connections = [engine.connect() for _ in range(PREWARM_DB_CONNECTIONS)]
+    # Closing returns the connections to the pool, where they stay open for reuse.
+    for connection in connections:
+        connection.close()
+
+
+def _prewarm_geoip():
+    geoip_resolver.available
+
+
+PREWARM_TASKS = {
+    "policies": _prewarm_policies,
+    "jwks": _prewarm_jwks,
+    "db": _prewarm_db,
+    "geoip": _prewarm_geoip,
+}
+
+
+def preload_shared_state():
+    """
+    Loads read-only state in the Gunicorn master before workers are forked (preload_app),
+    so every worker shares the same memory pages copy-on-write instead of building its own.
+    Nothing here opens sockets or starts threads; DB connections are created per worker.
+    """
+    authz_engine.ensure_loaded()
+    geoip_resolver.available
+
+
+async def prewarm(names: list[str] = STARTUP_PREWARM) -> dict[str, float]:
+    """
+    Runs the selected warm-up tasks in parallel worker threads and returns how long
+    each one took, in seconds. A failing task is logged and skipped; that subsystem
+    then initialises lazily on first use, as it would without pre-warming.
+    """
+
+    async def run(name: str):
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(PREWARM_TASKS[name])
+        except KeyError:
+            log.warning(f"Unknown pre-warm task '{name}', skipping.")
+        except Exception as e:
+            log.warning(
+                f"Pre-warming '{name}' failed: {e}. It will initialise on first use."
+            )
+        return name, time.perf_counter() - start
+
+    return dict(await asyncio.gather(*(run(name) for name in names)))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Actions to take on application startup and shutdown.
+    Heavy subsystems (DB engine, authz policies, JWKS, GeoIP) initialise lazily;
+    the ones listed in STARTUP_PREWARM are initialised here before traffic arrives.
+    """
+    setup_logging()
+    timings = await prewarm()
+    if timings:
+        log.info(
+            "Pre-warmed: "
+            + ", ".join(
+                f"{name} ({seconds * 1000:.0f} ms)" for name, seconds in timings.items()
+            )
+        )
+    # Starts the cross-worker cache invalidation listener, if one is configured.
+    entity_caches.ensure_started()
+    # Job kinds are validated against the handler registry when jobs are submitted.
+    load_handlers()
+    # Development convenience; production runs dedicated `python -m app.services.jobs` workers.
+    if JOB_WORKER_IN_APP:
+        job_worker.start()
+    log.info("Application startup complete.")
+    yield
+    job_worker.stop(wait=False)
+    dispose_engine()
+    geoip_resolver.close()
@@ -3,21 +3,77 @@ import logging
 import os
 from datetime import datetime, timezone
 
-import geoip2.database
-from fastapi import APIRouter, Depends, FastAPI, Header, Request
+from fastapi import (
+    APIRouter,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 
 # Import models and schemas
 from . import models, schemas
-# Import the database dependency
-from .core.database import get_db
-# Import the logging setup function
-from .core.logging_config import setup_logging
+
+# Import the entity cache registry
+from .core.cache import entity_caches
+
+# Import the item change feed (server-sent events)
+from .core.change_feed import change_feed
+
+# Import the response compression middleware
+from .core.compression import CompressionMiddleware
+
+# Import the database dependencies (get_read_db reads from replicas when configured)
+from .core.database import get_db, get_read_db, replica_router
+
+# Import the geolocation dependency for geofenced routes
+from .core.geoip import get_source_country
+
+# Import the Idempotency-Key middleware for safely retried POST requests
+from .core.idempotency import IdempotencyMiddleware
+
+# Import the request timing middleware used by access log sampling
+from .core.logging_config import RequestTimingMiddleware
+
+# Import the query statistics collector
+from .core.query_stats import query_stats
+
+# Import the load shedding middleware (per-user rate limits are applied in verify_access)
+from .core.rate_limit import LoadSheddingMiddleware
+
+# Import the fast JSON response classes and conditional request helpers
+from .core.responses import (
+    FastJSONResponse,
+    RowsJSONResponse,
+    etag_headers,
+    etag_matches,
+    make_etag,
+    not_modified,
+    parse_fields,
+    schema_columns,
+)
+
+# Import the startup/shutdown lifecycle
+from .lifecycle import lifespan
+
 # Import the authentication dependency and the authorization engine instance
 from .security import authz_engine, get_current_user, verify_access
 
+# Import the background job queue
+from .services.jobs import enqueue
+
+# Import the item search service
+from .services.search import search_items
+
 # --- Logger Initialization ---
 # Get a logger for this module
 log = logging.getLogger(__name__)
@@ -25,13 +81,7 @@ log = logging.getLogger(__name__)
 # --- Database Integration Completed ---
 # The mock_db has been replaced with a real PostgreSQL database
 # All data is now managed through SQLAlchemy ORM models
-# To use Geofencing, you must download the free GeoLite2-Country.mmdb database from MaxMind's website
-# and place it in the root directory of your project. Run: pip install geoip2
-try:
-    geoip_reader = geoip2.database.Reader("/app/app/GeoLite2-Country.mmdb")
-except FileNotFoundError:
-    geoip_reader = None
-    log.warning("GeoLite2-Country.mmdb not found. Geofencing will default to 'US'.")
+# Geofencing uses the GeoLite2-Country.mmdb database configured in app/core/geoip.py
 
 
 # --- Pydantic Models for Request Bodies ---
@@ -44,24 +94,24 @@ class FileUpload(BaseModel):
 
 
 # --- App & Router Initialization ---
-# Create the FastAPI app instance
-app = FastAPI(title="AI Command Center API")
-
-
-@app.on_event("startup")
-async def startup_event():
-    """
-    Actions to take on application startup.
-    """
-    setup_logging()
-    log.info("Application startup complete.")
+# Create the FastAPI app instance. Startup and shutdown are handled in app/lifecycle.py.
+# Responses are encoded with orjson when it is installed (see app/core/responses.py).
+app = FastAPI(
+    title="AI Command Center API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 
 base_path = os.getenv("BASE_PATH", "")
+# Maximum number of IDs accepted by one multi-get request
+ITEMS_BATCH_MAX_IDS = int(os.getenv("ITEMS_BATCH_MAX_IDS", "200"))
 # The global 'verify_access' dependency is applied here. It will protect every
 # endpoint on this router according to the rules in this file.
 api_router = APIRouter(prefix=f"{base_path}/api", dependencies=[Depends(verify_access)])
 
+# Innermost: replays the stored response of a POST retried with the same Idempotency-Key.
+app.add_middleware(IdempotencyMiddleware)
 # Add the CORS middleware to the main FastAPI app instance.
 app.add_middleware(
     CORSMiddleware,
@@ -70,6 +120,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compresses responses above COMPRESSION_MIN_SIZE bytes (gzip, plus brotli/zstd when installed).
+app.add_middleware(CompressionMiddleware)
+# Records each request's start time so slow requests are never sampled out of the access log.
+app.add_middleware(RequestTimingMiddleware)
+# Outermost: beyond MAX_IN_FLIGHT_REQUESTS concurrent requests, new ones get a fast 503.
+app.add_middleware(
+    LoadSheddingMiddleware,
+    # Change streams stay open indefinitely and would hold a slot each.
+    exempt_paths=frozenset(
+        {
+            f"{base_path}/api/health",
+            f"{base_path}/api/ready",
+            f"{base_path}/api/items/changes",
+        }
+    ),
+)
 
 # --- SIMPLE ENDPOINTS (Protected Automatically) ---
 # These endpoints require no special code because their rules are simple
@@ -88,6 +154,35 @@ def read_test_data(user: dict = Depends(get_current_user)):
     return {"message": f"Hello, {user.get('preferred_username')}"}
 
 
+@api_router.get("/admin/cache", tags=["Simple Scenarios"])
+def get_cache_stats():
+    """Entity cache hit/miss metrics for this worker. Requires the 'admin' role."""
+    return entity_caches.stats()
+
+
+@api_router.get("/admin/queries", tags=["Simple Scenarios"])
+def get_query_stats(top: int = 20, order_by: str = "total_ms"):
+    """
+    The costliest SQL statement fingerprints in this worker, with latency histograms
+    and captured plans. Requires the 'admin' role.
+    """
+    if order_by not in ("total_ms", "count", "max_ms", "slow"):
+        raise HTTPException(status_code=400, detail="Invalid order_by")
+    return query_stats.snapshot(top, order_by)
+
+
+@api_router.get("/admin/replicas", tags=["Simple Scenarios"])
+def get_replica_stats():
+    """Health and connections in use of each read replica, as seen by this worker."""
+    return replica_router.stats()
+
+
+@api_router.get("/admin/change-feed", tags=["Simple Scenarios"])
+def get_change_feed_stats():
+    """Open item change streams of this worker and slow subscribers evicted so far."""
+    return change_feed.stats()
+
+
 @api_router.get("/admin/dashboard", tags=["Simple Scenarios"])
 def get_admin_dashboard(user: dict = Depends(get_current_user)):
     """Requires the 'admin' role."""
@@ -96,46 +191,246 @@ def get_admin_dashboard(user: dict = Depends(get_current_user)):
     }
 
 
+@api_router.get("/me/permissions", tags=["Authorization"])
+def get_my_permissions(
+    response: Response,
+    user: dict = Depends(get_current_user),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Returns the caller's accessible routes from the engine's precomputed permission matrix,
+    so the frontend can gate its navigation without probing endpoints for 403s.
+    'allowed' routes are granted by roles alone; 'conditional' routes depend on runtime context.
+    The ETag only changes when the policy or the caller's effective roles change.
+    """
+    permissions = authz_engine.get_permissions(user)
+    etag = f'"{permissions["version"]}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+    return permissions
+
+
 # --- NEW DATABASE-DRIVEN ENDPOINTS ---
 
+# Read-through cache for single-item lookups. Entries are invalidated whenever a
+# session commits a change to an item (see app/core/cache.py).
+item_cache = entity_caches.register(models.Item)
+# Committed item changes are streamed to GET /items/changes subscribers allowed to read them.
+change_feed.register(models.Item, path=f"{base_path}/api/items/{{id}}")
+
+# Item ETags are derived from the version column, which SQLAlchemy increments on
+# every UPDATE. A conditional request is answered from the versions alone, without
+# loading or serialising the rows.
+
+
+def item_etag(item_id: int, version: int, fields: list[str] | None = None) -> str:
+    if fields:
+        return make_etag(item_id, version, tuple(fields))
+    return make_etag(item_id, version)
+
+
+def page_etag(id_versions, fields: list[str] | None = None) -> str:
+    pairs = [(item_id, version) for item_id, version in id_versions]
+    if fields:
+        return make_etag(tuple(fields), *pairs)
+    return make_etag(*pairs)
+
+
+def item_page(*columns, skip: int, limit: int):
+    return select(*columns).order_by(models.Item.id).offset(skip).limit(limit)
+
 
 @api_router.post("/items/", response_model=schemas.Item, tags=["Items"])
-def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db)):
+def create_item(
+    item: schemas.ItemCreate, response: Response, db: Session = Depends(get_db)
+):
     """
     Create a new item in the database.
-    This endpoint requires any authenticated user.
+    This endpoint requires any authenticated user. Clients that retry should send an
+    Idempotency-Key header, so a retry returns the first item instead of a duplicate.
     """
     db_item = models.Item(name=item.name, description=item.description)
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
+    response.headers.update(etag_headers(item_etag(db_item.id, db_item.version)))
     return db_item
 
 
 @api_router.get("/items/", response_model=list[schemas.Item], tags=["Items"])
-def list_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def list_items(
+    skip: int = 0,
+    limit: int = 100,
+    fields: str | None = Query(
+        None, description="Comma-separated fields to return, e.g. id,name"
+    ),
+    db: Session = Depends(get_read_db),
+    if_none_match: str | None = Header(None),
+):
+    """
+    List all items from the database, ordered by id.
+    This endpoint requires any authenticated user.
+    Rows are fetched as column tuples and encoded directly, without building ORM
+    objects or re-validating each one against the schema. With `fields`, only those
+    columns are selected (id+name listings are covered by the ix_items_id_name index).
+    The ETag covers the ids and versions of the page; If-None-Match is answered from those alone.
+    Read from a replica when DATABASE_REPLICA_URLS is set (see get_read_db).
+    """
+    fields = parse_fields(fields, schemas.Item)
+    columns = schema_columns(models.Item, schemas.Item, fields)
+    version_columns = (models.Item.id, models.Item.version)
+    if if_none_match:
+        etag = page_etag(
+            db.execute(item_page(*version_columns, skip=skip, limit=limit)), fields
+        )
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    result = db.execute(item_page(*columns, *version_columns, skip=skip, limit=limit))
+    rows = result.all()
+    width = len(columns)
+    etag = page_etag((row[width:] for row in rows), fields)
+    return RowsJSONResponse(
+        (row[:width] for row in rows),
+        list(result.keys())[:width],
+        headers=etag_headers(etag),
+    )
+
+
+# Declared before /items/{item_id} so "search" is not taken for an item ID.
+@api_router.get(
+    "/items/search", response_model=schemas.ItemSearchResults, tags=["Items"]
+)
+def search_items_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    db: Session = Depends(get_read_db),
+):
     """
-    List all items from the database.
+    Full-text and prefix search over item names and descriptions, best matches first.
     This endpoint requires any authenticated user.
+    Uses the tsvector/trigram indexes on PostgreSQL and an in-memory index elsewhere.
+    Pages are fetched with the returned next_cursor instead of an offset.
+    """
+    return search_items(db, q, limit, cursor)
+
+
+# Declared before /items/{item_id} so "batch" is not taken for an item ID.
+@api_router.get("/items/batch", response_model=schemas.ItemBatch, tags=["Items"])
+def get_items_batch(ids: list[int] = Query(...), db: Session = Depends(get_read_db)):
+    """
+    Get many items by ID in one request (?ids=1&ids=2...), instead of one request per item.
+    This endpoint requires any authenticated user.
+    Items missing from the item cache are loaded with a single query. Results follow
+    the order of the requested IDs, with null (and an entry in 'missing') for unknown IDs.
+    """
+    if len(ids) > ITEMS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {ITEMS_BATCH_MAX_IDS} IDs can be requested at once",
+        )
+    found = item_cache.get_many(db, ids)
+    return {
+        "items": [found[item_id] for item_id in ids],
+        "missing": [
+            item_id for item_id in dict.fromkeys(ids) if found[item_id] is None
+        ],
+    }
+
+
+# Declared before /items/{item_id} so "changes" is not taken for an item ID.
+@api_router.get("/items/changes", tags=["Items"])
+async def stream_item_changes(user: dict = Depends(get_current_user)):
+    """
+    A live stream of item inserts, updates and deletes as server-sent events, so
+    dashboards no longer need to poll GET /items/. This endpoint requires any
+    authenticated user, and each change is only sent if the user may GET that item.
+    A client that falls behind receives an "evicted" event and should reconnect and
+    reload; a "reset" event means changes may have been missed.
     """
-    items = db.query(models.Item).offset(skip).limit(limit).all()
-    return items
+    subscriber = change_feed.subscribe(change_feed.authz_filter(authz_engine, user))
+    return StreamingResponse(
+        change_feed.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @api_router.get("/items/{item_id}", response_model=schemas.Item, tags=["Items"])
-def get_item(item_id: int, db: Session = Depends(get_db)):
+def get_item(
+    item_id: int,
+    response: Response,
+    fields: str | None = Query(
+        None, description="Comma-separated fields to return, e.g. id,name"
+    ),
+    db: Session = Depends(get_read_db),
+    if_none_match: str | None = Header(None),
+):
     """
     Get a specific item by ID.
     This endpoint requires any authenticated user.
+    Served from the item cache; on a hit (including a cached 404 or a matching
+    If-None-Match) the database is not queried at all. With a per-process cache and
+    several workers, a matching If-None-Match is first checked against the database.
     """
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
+    fields = parse_fields(fields, schemas.Item)
+    item = item_cache.get(db, item_id)
     if item is None:
-        from fastapi import HTTPException
-
         raise HTTPException(status_code=404, detail="Item not found")
+    etag = item_etag(item_id, item["version"], fields)
+    if etag_matches(if_none_match, etag) and not entity_caches.coherent:
+        # Another worker may have changed the row without invalidating our copy, so a
+        # 304 is only sent once the version has been confirmed by the database.
+        item = item_cache.refresh(db, item_id)
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        etag = item_etag(item_id, item["version"], fields)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    if fields:
+        return FastJSONResponse(
+            {name: item[name] for name in fields}, headers=etag_headers(etag)
+        )
+    response.headers.update(etag_headers(etag))
     return item
 
 
+# --- BACKGROUND JOBS ---
+# Long-running work is queued and run by job workers (app/services/jobs.py), so the
+# request returns at once and its latency does not depend on the size of the job.
+
+
+@api_router.post("/jobs", response_model=schemas.Job, status_code=202, tags=["Jobs"])
+def submit_job(
+    job: schemas.JobCreate,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Queue a job for a background worker and return immediately.
+    This endpoint requires any authenticated user. The kind must be a registered handler.
+    Poll GET /jobs/{job_id} for its status, progress and result.
+    """
+    return enqueue(db, job.kind, job.payload, job.priority, owner_id=user.get("sub"))
+
+
+@api_router.get("/jobs/{job_id}", response_model=schemas.Job, tags=["Jobs"])
+def get_job(
+    job_id: int,
+    request: Request,
+    user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Status, progress and result of a job. Only its submitter or an admin can read it."""
+    job = db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    authz_engine.check(request, user, context={"resource": {"owner_id": job.owner_id}})
+    return job
+
+
 # --- CONTEXT-AWARE ENDPOINTS (Require Manual Checks) ---
 # These endpoints demonstrate the 3-step pattern for context-aware authorization:
 # 1. Fetch data needed for the context from database
@@ -148,25 +443,42 @@ def get_item(item_id: int, db: Session = Depends(get_db)):
 def update_item(
     item_id: int,
     request: Request,
+    response: Response,
     user: dict = Depends(get_current_user),
     db: Session = Depends(get_db),
+    if_match: str | None = Header(None),
 ):
     """
     Update an item. This demonstrates context-aware authorization using database data.
     The authorization engine can check ownership or other business rules.
+    Send the item's ETag in If-Match to update it only if it has not changed since
+    (412 otherwise). An update that loses a race with a concurrent one gets a 409.
     """
     item = db.query(models.Item).filter(models.Item.id == item_id).first()
     if not item:
-        from fastapi import HTTPException
-
         raise HTTPException(status_code=404, detail="Item not found")
 
     # Pass the database record to the authorization engine for context-aware decisions
     authz_engine.check(request, user, context={"resource": item})
 
-    # If authorization passes, update the item
+    etag = item_etag(item.id, item.version)
+    if if_match is not None and not etag_matches(if_match, etag, weak=False):
+        raise HTTPException(
+            status_code=412, detail="Item has changed", headers=etag_headers(etag)
+        )
+
+    # If authorization passes, update the item (its version is incremented on flush,
+    # and the UPDATE only applies if the version is still the one read above)
     item.name = f"Updated: {item.name}"
-    db.commit()
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(
+            status_code=412 if if_match is not None else 409,
+            detail="Item was modified concurrently",
+        )
+    response.headers.update(etag_headers(item_etag(item.id, item.version)))
     return {"status": "Item updated", "item": item}
 
 
@@ -184,17 +496,9 @@ def get_analytics(
 def get_secure_asset(
     request: Request,
     user: dict = Depends(get_current_user),
-    x_forwarded_for: str | None = Header(None),
+    country: str = Depends(get_source_country),
 ):
     """Geofencing example - authorization based on request origin"""
-    country = "US"  # Default
-    if geoip_reader and x_forwarded_for:
-        try:
-            country = geoip_reader.country(
-                x_forwarded_for.split(",")[0]
-            ).country.iso_code
-        except geoip2.errors.AddressNotFoundError:
-            country = "UNKNOWN"
     authz_engine.check(
         request, user, context={"environment": {"source_country": country}}
     )
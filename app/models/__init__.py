@@ -1,4 +1,6 @@
 # app/models/__init__.py
+from .idempotency import IdempotencyKey
 from .item import Item
+from .job import Job
 
-__all__ = ["Item"]
+__all__ = ["IdempotencyKey", "Item", "Job"]
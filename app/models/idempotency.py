@@ -0,0 +1,21 @@
+# app/models/idempotency.py
+from sqlalchemy import JSON, Column, DateTime, Integer, LargeBinary, String
+
+from ..core.database import Base
+
+
+class IdempotencyKey(Base):
+    """The stored response of a POST sent with an Idempotency-Key (app/core/idempotency.py)."""
+
+    __tablename__ = "idempotency_keys"
+
+    # SHA-256 of the client's credentials and its Idempotency-Key header.
+    key = Column(String(64), primary_key=True)
+    # SHA-256 of the method, path, query string and body of the first request.
+    fingerprint = Column(String(64), nullable=False)
+    # NULL while the first request is still being handled.
+    status_code = Column(Integer)
+    headers = Column(JSON)
+    body = Column(LargeBinary)
+    # In-flight records expire after a short lease, completed ones after the TTL.
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -1,5 +1,5 @@
 # app/models/item.py
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 
 from ..core.database import Base
 
@@ -10,3 +10,12 @@ class Item(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String)
+    # Incremented by SQLAlchemy on every UPDATE; used for ETags and optimistic locking.
+    version = Column(Integer, nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        # Covers id+name listings (and, on PostgreSQL, the version-only ETag query),
+        # so they can be answered with index-only scans instead of reading the wide rows.
+        Index("ix_items_id_name", "id", "name", postgresql_include=["version"]),
+    )
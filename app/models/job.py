@@ -0,0 +1,47 @@
+# app/models/job.py
+from sqlalchemy import JSON, Column, DateTime, Float, Index, Integer, String, Text, text
+
+from ..core.database import Base
+
+
+class Job(Base):
+    """A unit of background work, run by app/services/jobs.py outside the request path."""
+
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    # Name of the registered handler that runs the job.
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # queued -> running -> succeeded | failed (back to queued while retries remain)
+    status = Column(String(20), nullable=False, server_default="queued")
+    # Higher runs first.
+    priority = Column(Integer, nullable=False, server_default="0")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    max_attempts = Column(Integer, nullable=False, server_default="3")
+    # Not dequeued before this time (set by retry backoff).
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    # 0.0 to 1.0, as reported by the handler.
+    progress = Column(Float, nullable=False, server_default="0")
+    result = Column(JSON)
+    # The "sub" claim of the user who submitted the job.
+    owner_id = Column(String(255))
+    error = Column(Text)
+    # The worker holding a running job; the lease is renewed through updated_at.
+    locked_by = Column(String(100))
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # The dequeue order. On PostgreSQL only queued jobs are indexed, so the index
+        # stays small however many finished jobs the table keeps.
+        Index(
+            "ix_jobs_dequeue",
+            priority.desc(),
+            run_after,
+            id,
+            postgresql_where=text("status = 'queued'"),
+        ),
+        Index("ix_jobs_status_updated_at", "status", "updated_at"),
+    )
@@ -1,4 +1,21 @@
 # app/schemas/__init__.py
-from .item import Item, ItemBase, ItemCreate
+from .item import (
+    Item,
+    ItemBase,
+    ItemBatch,
+    ItemCreate,
+    ItemSearchHit,
+    ItemSearchResults,
+)
+from .job import Job, JobCreate
 
-__all__ = ["ItemBase", "ItemCreate", "Item"]
+__all__ = [
+    "ItemBase",
+    "ItemCreate",
+    "Item",
+    "ItemBatch",
+    "ItemSearchHit",
+    "ItemSearchResults",
+    "JobCreate",
+    "Job",
+]
@@ -16,3 +16,19 @@ class Item(ItemBase):
 
     class Config:
         orm_mode = True
+
+
+class ItemBatch(BaseModel):
+    # One entry per requested ID, in request order; null where the item does not exist.
+    items: list[Item | None]
+    missing: list[int]
+
+
+class ItemSearchHit(Item):
+    rank: float
+
+
+class ItemSearchResults(BaseModel):
+    items: list[ItemSearchHit]
+    # Pass back as `cursor` to fetch the next page; null on the last page.
+    next_cursor: str | None = None
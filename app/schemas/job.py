@@ -0,0 +1,32 @@
+# app/schemas/job.py
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+
+class JobCreate(BaseModel):
+    kind: str
+    payload: dict = {}
+    # Higher runs first.
+    priority: int = Field(0, ge=-100, le=100)
+
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    # queued, running, succeeded or failed
+    status: str
+    priority: int
+    attempts: int
+    max_attempts: int
+    progress: float
+    result: Any = None
+    error: str | None = None
+    run_after: datetime
+    created_at: datetime
+    updated_at: datetime
+    finished_at: datetime | None = None
+
+    class Config:
+        orm_mode = True
@@ -1,16 +1,14 @@
 # app/security.py
-import json
 import logging
 import os
-import re
 from functools import lru_cache
 
-import requests
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
 from .authz import AuthzEngine
+from .core.rate_limit import rate_limiter
 
 # --- Logger Setup ---
 log = logging.getLogger(__name__)
@@ -35,14 +33,18 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 # --- Singleton Engine Instance ---
 # We create one instance of the engine when the application starts.
-# This is efficient as policies are loaded from disk only once.
+# Policies are loaded from disk only once: during startup (see app/lifecycle.py),
+# or on the first authorization check if startup pre-warming is disabled.
 # This instance is imported by main.py for manual, context-aware checks.
-authz_engine = AuthzEngine()
+authz_engine = AuthzEngine(lazy=True)
 
 
 @lru_cache(maxsize=1)
 def get_jwks():
     """Fetches and caches the JSON Web Key Set (JWKS) from Keycloak."""
+    # Imported on first use to keep 'requests' out of the application's import time.
+    import requests
+
     log.info(f"Fetching JWKS from: {jwks_url}")
     try:
         response = requests.get(jwks_url)
@@ -54,6 +56,8 @@ def get_jwks():
 
 def introspect_token(token: str) -> dict:
     """Makes a back-channel call to Keycloak's introspection endpoint to validate the token."""
+    import requests
+
     payload = {
         "client_id": KEYCLOAK_CLIENT_ID,
         "client_secret": KEYCLOAK_CLIENT_SECRET,
@@ -113,50 +117,74 @@ def get_current_user(token: str | None = Depends(oauth2_scheme)) -> dict | None:
         raise credentials_exception
 
 
+def limit_by_peer(request: Request):
+    """
+    Consumes a token from the client IP's bucket for the route before the caller's
+    token is validated, so requests with invalid tokens cannot trigger unlimited
+    introspection calls. These are the only limits for anonymous callers.
+    """
+    request_path = request.url.path
+    matched = (
+        None
+        if authz_engine.is_public(request_path)
+        else authz_engine.match_rule(request_path)
+    )
+    rate_limiter.check(request, None, matched)
+
+
 def verify_access(
-    request: Request, current_user: dict | None = Depends(get_current_user)
+    request: Request,
+    # Declared first: FastAPI resolves dependencies in order, so the peer limit is
+    # checked before get_current_user validates and introspects the token.
+    _: None = Depends(limit_by_peer),
+    current_user: dict | None = Depends(get_current_user),
 ):
     """
     This is the global AUTHORIZATION dependency, applied to the main router.
     It acts as a "first pass" filter. It automatically protects simple endpoints.
     If it detects a rule that requires runtime context, it "steps aside" and lets the
     endpoint perform the check manually.
+    Every request to a public or configured route also consumes a token from the
+    caller's rate limit bucket for that route (see app/core/rate_limit.py): by client
+    IP before authentication, then by "sub" claim for authenticated callers.
     """
     request_path = request.url.path
-    
-    # Dynamically get the base_path from the environment (same as in authz.py)
-    base_path = os.getenv("BASE_PATH", "")
+    # Anonymous callers were already counted by limit_by_peer.
+    per_user = bool(current_user and current_user.get("sub"))
 
     # Check if the path is whitelisted as public (same logic as AuthzEngine.check)
-    if any(re.fullmatch(f"{base_path}{p}", request_path) for p in authz_engine._public_paths):
+    if authz_engine.is_public(request_path):
+        if per_user:
+            rate_limiter.check(request, current_user, None)
         return
 
-    for rule_path, rule in authz_engine._authz_rules.items():
-        # Construct the full, expected path from the base_path and the rule key (same as in authz.py)
-        full_rule_path = f"{base_path}{rule_path}"
-        if re.fullmatch(full_rule_path, request_path):
-            rule_str = json.dumps(rule)
-            # If the rule contains placeholders, it's a "context-aware" rule.
-            # Its logic depends on runtime data (e.g., the owner of a document).
-            # We cannot decide now, so we "step aside" and delegate the final check
-            # to the endpoint function, which is responsible for fetching the data
-            # and building the context.
-            if "{context" in rule_str or "{path" in rule_str:
-                if IS_AUTH_DEBUG:
-                    log.debug(
-                        f"Rule for '{request_path}' requires context. Deferring check to endpoint."
-                    )
-                return
-            else:
-                # This is a "simple" rule that only depends on the user's token (e.g., roles).
-                # The engine has all the information it needs, so it can make the final
-                # authorization decision right now, before the endpoint code is ever executed.
-                if IS_AUTH_DEBUG:
-                    log.debug(
-                        f"Performing automatic check for simple rule at '{request_path}'."
-                    )
-                authz_engine.check(request, current_user)
-                return
+    matched = authz_engine.match_rule(request_path)
+    if matched is not None:
+        # Limits are keyed by the validated "sub" claim and the rule's pattern.
+        if per_user:
+            rate_limiter.check(request, current_user, matched)
+        _, _, requires_context = matched
+        # If the rule contains placeholders, it's a "context-aware" rule.
+        # Its logic depends on runtime data (e.g., the owner of a document).
+        # We cannot decide now, so we "step aside" and delegate the final check
+        # to the endpoint function, which is responsible for fetching the data
+        # and building the context.
+        if requires_context:
+            if IS_AUTH_DEBUG:
+                log.debug(
+                    f"Rule for '{request_path}' requires context. Deferring check to endpoint."
+                )
+            return
+        else:
+            # This is a "simple" rule that only depends on the user's token (e.g., roles).
+            # The engine has all the information it needs, so it can make the final
+            # authorization decision right now, before the endpoint code is ever executed.
+            if IS_AUTH_DEBUG:
+                log.debug(
+                    f"Performing automatic check for simple rule at '{request_path}'."
+                )
+            authz_engine.check(request, current_user)
+            return
 
     # If the path is not public and no rule is found, deny access by default.
     if current_user:
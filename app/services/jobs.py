@@ -0,0 +1,514 @@
+# app/services/jobs.py
+import importlib
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..core.database import SessionLocal, dispose_engine, get_engine
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Jobs run at the same time by one worker process (a claimed batch counts as one).
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+# "thread" for I/O-bound handlers (API calls, database work), "process" for CPU-bound ones.
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "thread").lower()
+# Seconds between polls of the jobs table while it has nothing due.
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Attempts before a job is marked failed, and the retry backoff (doubling, with jitter).
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", "600"))
+# A running job whose lease was not renewed for this long was abandoned by a crashed
+# worker and is queued again. Workers renew the leases of their jobs every
+# JOB_HEARTBEAT_SECONDS while the jobs run.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+JOB_HEARTBEAT_SECONDS = float(
+    os.getenv("JOB_HEARTBEAT_SECONDS", str(min(60.0, JOB_LEASE_SECONDS / 4)))
+)
+# Modules imported by web and worker processes so that their @job_handler functions
+# are registered (see load_handlers).
+JOB_HANDLER_MODULES = [
+    name.strip()
+    for name in os.getenv("JOB_HANDLER_MODULES", "").split(",")
+    if name.strip()
+]
+# Also run a worker inside each web process (convenient in development). In production
+# run dedicated workers with `python -m app.services.jobs`.
+JOB_WORKER_IN_APP = os.getenv("JOB_WORKER_IN_APP", "false").lower() == "true"
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+# Minimum seconds between two progress writes for the same job.
+PROGRESS_INTERVAL = 1.0
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure that retrying cannot fix; the job fails at once."""
+
+
+# --- Handler Registry ---
+
+
+class JobHandler:
+    def __init__(self, fn, batch_size: int = 1, max_attempts: int | None = None):
+        self.fn = fn
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts or JOB_MAX_ATTEMPTS
+
+
+HANDLERS: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str, batch_size: int = 1, max_attempts: int | None = None):
+    """
+    Registers the decorated function as the handler of `kind` jobs. It is called as
+    fn(payload, report_progress) and returns a JSON-serialisable result; report_progress
+    takes a fraction between 0 and 1.
+    With batch_size > 1, up to that many queued jobs of the kind are claimed together:
+    fn receives the list of payloads and returns the list of results in the same order,
+    so many small jobs share one call (and typically one transaction).
+    In process mode handlers must be module-level functions, and progress is not recorded.
+    """
+
+    def register(fn):
+        HANDLERS[kind] = JobHandler(fn, batch_size, max_attempts)
+        return fn
+
+    return register
+
+
+def load_handlers(modules: list[str] | None = None):
+    """
+    Imports the handler modules (JOB_HANDLER_MODULES by default). Both the web app, which
+    validates job kinds in enqueue, and the workers, which run them, need the registry.
+    """
+    for module in JOB_HANDLER_MODULES if modules is None else modules:
+        importlib.import_module(module)
+
+
+def _ignore_progress(fraction: float):
+    pass
+
+
+# --- Queue Operations ---
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: dict,
+    priority: int = 0,
+    delay: float = 0.0,
+    owner_id: str | None = None,
+) -> models.Job:
+    """Adds a job to the queue and commits. Higher priorities are dequeued first."""
+    handler = HANDLERS.get(kind)
+    if handler is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind '{kind}'")
+    now = utcnow()
+    job = models.Job(
+        kind=kind,
+        payload=payload,
+        priority=priority,
+        status=QUEUED,
+        attempts=0,
+        max_attempts=handler.max_attempts,
+        progress=0.0,
+        owner_id=owner_id,
+        run_after=now + timedelta(seconds=delay),
+        created_at=now,
+        updated_at=now,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim_jobs(db: Session, worker_id: str, kinds=None) -> list[models.Job]:
+    """
+    Claims the next due job (highest priority, then oldest) and, for a batching handler,
+    more queued jobs of the same kind up to its batch size. On PostgreSQL the candidate
+    rows are locked FOR UPDATE SKIP LOCKED, so concurrent workers never wait on each
+    other or claim the same job. Returns [] when nothing is due.
+    """
+    now = utcnow()
+    Job = models.Job
+    due = (
+        select(Job)
+        .where(
+            Job.status == QUEUED,
+            Job.run_after <= now,
+            Job.kind.in_(list(kinds or HANDLERS)),
+        )
+        .order_by(Job.priority.desc(), Job.run_after, Job.id)
+        .with_for_update(skip_locked=True)
+    )
+    first = db.scalars(due.limit(1)).first()
+    if first is None:
+        db.rollback()
+        return []
+    ids = [first.id]
+    batch_size = HANDLERS[first.kind].batch_size
+    if batch_size > 1:
+        more = due.where(Job.kind == first.kind, Job.id != first.id).limit(
+            batch_size - 1
+        )
+        ids += [job.id for job in db.scalars(more)]
+    # The status condition also keeps databases without row locks (SQLite) from
+    # handing a job to two workers: only one of the UPDATEs matches it.
+    db.execute(
+        update(Job)
+        .where(Job.id.in_(ids), Job.status == QUEUED)
+        .values(
+            status=RUNNING,
+            attempts=Job.attempts + 1,
+            locked_by=worker_id,
+            updated_at=now,
+        )
+    )
+    db.commit()
+    claimed = select(Job).where(
+        Job.id.in_(ids), Job.status == RUNNING, Job.locked_by == worker_id
+    )
+    return list(db.scalars(claimed.order_by(Job.id)))
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with jitter, so failed jobs do not all come back at once."""
+    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _held_by(worker_id: str, job_ids: list[int]):
+    # A job whose lease expired may already be running elsewhere; only its current
+    # holder may record progress or an outcome for it.
+    Job = models.Job
+    return (Job.id.in_(job_ids), Job.status == RUNNING, Job.locked_by == worker_id)
+
+
+def finish_jobs(db: Session, worker_id: str, job_ids: list[int], results: list):
+    now = utcnow()
+    for job_id, result in zip(job_ids, results):
+        done = db.execute(
+            update(models.Job)
+            .where(*_held_by(worker_id, [job_id]))
+            .values(
+                status=SUCCEEDED,
+                result=result,
+                error=None,
+                progress=1.0,
+                locked_by=None,
+                updated_at=now,
+                finished_at=now,
+            )
+        )
+        if not done.rowcount:
+            log.warning(
+                f"Job {job_id} is no longer held by {worker_id}; its result is dropped."
+            )
+    db.commit()
+
+
+def _release(job: models.Job, error: str, now: datetime, retry: bool = True):
+    """Queues the job again after a backoff delay, or fails it once out of attempts."""
+    job.error = error
+    job.locked_by = None
+    job.updated_at = now
+    if retry and job.attempts < job.max_attempts:
+        job.status = QUEUED
+        job.run_after = now + timedelta(seconds=retry_delay(job.attempts))
+    else:
+        job.status = FAILED
+        job.finished_at = now
+
+
+def fail_jobs(
+    db: Session, worker_id: str, job_ids: list[int], error: str, retry: bool = True
+):
+    """Queues the jobs again after a backoff delay, or fails them once out of attempts."""
+    now = utcnow()
+    for job in db.scalars(select(models.Job).where(*_held_by(worker_id, job_ids))):
+        _release(job, error, now, retry)
+    db.commit()
+
+
+def set_progress(db: Session, worker_id: str, job_ids: list[int], fraction: float):
+    """Records progress, which also renews the lease of the running jobs."""
+    db.execute(
+        update(models.Job)
+        .where(*_held_by(worker_id, job_ids))
+        .values(progress=min(max(fraction, 0.0), 1.0), updated_at=utcnow())
+    )
+    db.commit()
+
+
+def renew_leases(db: Session, worker_id: str, job_ids: list[int]) -> int:
+    """Renews the leases of running jobs, so they are not taken for abandoned ones."""
+    renewed = db.execute(
+        update(models.Job)
+        .where(*_held_by(worker_id, job_ids))
+        .values(updated_at=utcnow())
+    ).rowcount
+    db.commit()
+    return renewed
+
+
+def requeue_abandoned(db: Session, lease: float = JOB_LEASE_SECONDS) -> int:
+    """
+    Returns running jobs whose worker stopped renewing their lease (crashed or was
+    killed) to the queue, or fails them if they have no attempts left. Returns the
+    number recovered.
+    """
+    Job = models.Job
+    now = utcnow()
+    cutoff = now - timedelta(seconds=lease)
+    # Locked until the commit, so a lease renewed meanwhile is not lost.
+    abandoned = list(
+        db.scalars(
+            select(Job)
+            .where(Job.status == RUNNING, Job.updated_at < cutoff)
+            .with_for_update(skip_locked=True)
+        )
+    )
+    if abandoned:
+        log.warning(
+            f"Recovering {len(abandoned)} abandoned job(s): {[job.id for job in abandoned][:20]}"
+        )
+        for job in abandoned:
+            _release(job, "Abandoned by its worker (lease expired)", now)
+        db.commit()
+    else:
+        db.rollback()
+    return len(abandoned)
+
+
+# --- Worker ---
+
+
+def _init_process():
+    # Connections inherited from the parent belong to it; drop them without closing.
+    dispose_engine(close=False)
+
+
+class JobWorker:
+    """
+    Claims due jobs and runs them on a thread or process pool with `concurrency` slots.
+    Claiming, results, failures and progress each use a short session of their own,
+    so no database connection is held while a handler runs. The polling thread renews
+    the leases of the running jobs every `heartbeat_interval` seconds, which also covers
+    handlers that never report progress (all of them in process mode).
+    """
+
+    def __init__(
+        self,
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        mode: str = JOB_WORKER_MODE,
+        poll_interval: float = JOB_POLL_INTERVAL,
+        kinds=None,
+        session_factory=SessionLocal,
+        heartbeat_interval: float = JOB_HEARTBEAT_SECONDS,
+    ):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown job worker mode '{mode}'")
+        self.concurrency = concurrency
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.kinds = kinds
+        self.session_factory = session_factory
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._executor = None
+        self._thread = None
+        # Ids of the jobs submitted to the pool and not yet completed.
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.session_factory is SessionLocal:
+            get_engine()
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                self.concurrency, initializer=_init_process
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                self.concurrency, thread_name_prefix="job"
+            )
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="job-worker", daemon=True
+        )
+        self._thread.start()
+        log.info(
+            f"Job worker {self.worker_id} started ({self.concurrency} {self.mode} slots)."
+        )
+
+    def stop(self, wait: bool = True):
+        """Stops claiming jobs; with `wait`, lets the running ones finish first."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._executor.shutdown(wait=wait)
+        self._thread = self._executor = None
+
+    def wake(self):
+        """Polls for due jobs now instead of after the poll interval."""
+        self._wake.set()
+
+    def _run(self):
+        last_recovery = last_heartbeat = float("-inf")
+        while not self._stop.is_set():
+            if time.monotonic() - last_heartbeat > self.heartbeat_interval:
+                last_heartbeat = time.monotonic()
+                self._heartbeat()
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            jobs = []
+            try:
+                with self.session_factory() as db:
+                    if time.monotonic() - last_recovery > min(
+                        60.0, JOB_LEASE_SECONDS / 4
+                    ):
+                        last_recovery = time.monotonic()
+                        requeue_abandoned(db)
+                    jobs = claim_jobs(db, self.worker_id, self.kinds)
+                    # Plain values: the instances must not outlive their session.
+                    jobs = [(job.id, job.kind, job.payload) for job in jobs]
+            except Exception as e:
+                log.warning(f"Could not claim jobs: {e}")
+            if not jobs:
+                self._slots.release()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._submit(jobs)
+
+    def _heartbeat(self):
+        with self._running_lock:
+            job_ids = list(self._running)
+        if not job_ids:
+            return
+        try:
+            with self.session_factory() as db:
+                renew_leases(db, self.worker_id, job_ids)
+        except Exception as e:
+            log.warning(f"Could not renew the leases of jobs {job_ids}: {e}")
+
+    def _submit(self, jobs):
+        job_ids = [job_id for job_id, _, _ in jobs]
+        kind = jobs[0][1]
+        handler = HANDLERS[kind]
+        payloads = [payload for _, _, payload in jobs]
+        argument = payloads if handler.batch_size > 1 else payloads[0]
+        report = _ignore_progress if self.mode == "process" else self._reporter(job_ids)
+        log.info(f"Running {kind} job(s) {job_ids}")
+        with self._running_lock:
+            self._running.update(job_ids)
+        try:
+            future = self._executor.submit(handler.fn, argument, report)
+        except RuntimeError as e:  # the executor is shutting down
+            self._complete(job_ids, handler, None, e)
+            return
+        future.add_done_callback(
+            lambda f: self._complete(job_ids, handler, f, f.exception())
+        )
+
+    def _reporter(self, job_ids: list[int]):
+        last_write = float("-inf")
+
+        def report_progress(fraction: float):
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write < PROGRESS_INTERVAL and fraction < 1.0:
+                return
+            last_write = now
+            try:
+                with self.session_factory() as db:
+                    set_progress(db, self.worker_id, job_ids, fraction)
+            except Exception as e:
+                log.warning(f"Could not record progress of jobs {job_ids}: {e}")
+
+        return report_progress
+
+    def _complete(self, job_ids, handler, future, error):
+        try:
+            results = None
+            if error is None:
+                results = future.result()
+                if handler.batch_size == 1:
+                    results = [results]
+                elif not isinstance(results, list) or len(results) != len(job_ids):
+                    error = PermanentJobError(
+                        f"Batch handler did not return one result per job ({len(job_ids)} jobs)"
+                    )
+            with self.session_factory() as db:
+                if error is None:
+                    finish_jobs(db, self.worker_id, job_ids, results)
+                else:
+                    log.warning(f"Jobs {job_ids} failed: {error!r}")
+                    fail_jobs(
+                        db,
+                        self.worker_id,
+                        job_ids,
+                        repr(error),
+                        retry=not isinstance(error, PermanentJobError),
+                    )
+        except Exception as e:
+            # The lease expires and the jobs are recovered by requeue_abandoned.
+            log.error(f"Could not record the outcome of jobs {job_ids}: {e}")
+        finally:
+            with self._running_lock:
+                self._running.difference_update(job_ids)
+            self._slots.release()
+            self._wake.set()
+
+
+# --- Singleton Instance ---
+job_worker = JobWorker()
+
+
+def run_worker():
+    """Runs a dedicated worker process until SIGTERM or SIGINT (`python -m app.services.jobs`)."""
+    from ..core.logging_config import setup_logging
+
+    setup_logging()
+    load_handlers()
+    if not HANDLERS:
+        log.warning("No job handlers are registered; set JOB_HANDLER_MODULES.")
+    stopped = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopped.set())
+    job_worker.start()
+    stopped.wait()
+    log.info("Stopping job worker; waiting for running jobs to finish.")
+    job_worker.stop(wait=True)
+
+
+if __name__ == "__main__":
+    run_worker()
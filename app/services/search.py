@@ -0,0 +1,279 @@
+# app/services/search.py
+import base64
+import bisect
+import json
+import logging
+import math
+import re
+import threading
+import weakref
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# --- Logger Setup ---
+log = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Weights of name and description matches, mirroring setweight('A'/'B') in the migration.
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+# Ranks are rounded so they compare exactly when used in a pagination cursor.
+RANK_DIGITS = 6
+# Maximum number of terms taken from a query.
+MAX_QUERY_TERMS = 8
+# Shorter terms only match whole words; as prefixes they would match most of the table.
+MIN_PREFIX_LENGTH = 3
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(value: str | None) -> list[str]:
+    """Lower-cased word tokens, like PostgreSQL's 'simple' text search configuration."""
+    return _TOKEN_RE.findall(value.lower()) if value else []
+
+
+# --- Pagination Cursors ---
+
+
+def encode_cursor(rank, item_id: int) -> str:
+    """An opaque keyset cursor pointing just after the hit with this rank and id."""
+    payload = json.dumps([str(rank), item_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Decimal, int]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, item_id = json.loads(payload)
+        return Decimal(rank), int(item_id)
+    except (ValueError, TypeError, ArithmeticError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# --- PostgreSQL Search ---
+
+
+class PostgresItemSearch:
+    """
+    Searches the `search_vector` tsvector column (GIN index) with prefix matching on
+    every query term, plus trigram similarity on `name` (pg_trgm GIN index) for typos.
+    Both objects are created by the search migration and are not mapped on the model.
+    Results are ordered by rank, then id, and paginated with a keyset cursor.
+    """
+
+    SQL = text(f"""
+        SELECT id, name, description, rank FROM (
+            SELECT id, name, description,
+                   round((ts_rank_cd(search_vector, to_tsquery('simple', :tsquery))
+                          + similarity(name, :q))::numeric, {RANK_DIGITS}) AS rank
+            FROM items
+            WHERE search_vector @@ to_tsquery('simple', :tsquery) OR name % :q
+        ) hits
+        WHERE :after_rank IS NULL OR rank < :after_rank OR (rank = :after_rank AND id > :after_id)
+        ORDER BY rank DESC, id
+        LIMIT :limit
+        """)
+
+    def search(self, db: Session, query: str, limit: int, after=None) -> list[dict]:
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        after_rank, after_id = after or (None, None)
+        rows = db.execute(
+            self.SQL,
+            {
+                # Terms are plain \w+ tokens, so they are safe inside a tsquery.
+                "tsquery": " & ".join(
+                    f"{term}:*" if len(term) >= MIN_PREFIX_LENGTH else term
+                    for term in terms
+                ),
+                "q": " ".join(terms),
+                "after_rank": after_rank,
+                "after_id": after_id,
+                "limit": limit,
+            },
+        ).mappings()
+        return [dict(row) for row in rows]
+
+
+# --- In-Memory Search (SQLite and tests) ---
+
+
+class InMemoryItemSearch:
+    """
+    A pure-Python inverted index over item names and descriptions, used when the
+    database is not PostgreSQL (e.g. SQLite test runs).
+    Every query term must match a token by prefix (or exactly, if shorter than
+    MIN_PREFIX_LENGTH); hits are scored by the idf of the matched tokens, weighted by
+    field. Typo tolerance (trigrams) is only available on PostgreSQL.
+    One index is kept per engine searched through (the primary and each read
+    replica), and rebuilt on its next search after a session in this process commits
+    a change to items (including bulk UPDATE/DELETE statements); writes made by other
+    processes are not seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Bumped on every committed change to items.
+        self._generation = 0
+        # (sorted vocabulary, {token: (name ids, description ids)}, {id: (name, description)}),
+        # replaced as a whole so searches never see a half-built index. The last one
+        # built is searched when no session is given.
+        self._index = ([], {}, {})
+        # {engine: (generation, index)}
+        self._indexes = weakref.WeakKeyDictionary()
+        self._listeners = [
+            ("after_flush", lambda session, flush_context: self._collect(session)),
+            ("do_orm_execute", self._collect_statement),
+            ("after_commit", self._invalidate_committed),
+            ("after_rollback", lambda session: session.info.pop(self, None)),
+        ]
+        for name, listener in self._listeners:
+            event.listen(Session, name, listener)
+
+    def close(self):
+        """Stops listening to session events."""
+        for name, listener in self._listeners:
+            event.remove(Session, name, listener)
+
+    def _collect(self, session: Session):
+        if any(
+            isinstance(obj, models.Item)
+            for obj in (*session.new, *session.dirty, *session.deleted)
+        ):
+            session.info[self] = True
+
+    def _collect_statement(self, state):
+        if (state.is_insert or state.is_update or state.is_delete) and (
+            state.bind_mapper is not None and state.bind_mapper.class_ is models.Item
+        ):
+            state.session.info[self] = True
+
+    def _invalidate_committed(self, session: Session):
+        if session.info.pop(self, None):
+            self._generation += 1
+
+    def build(self, rows):
+        """Indexes (id, name, description) rows, replacing and returning the current index."""
+        postings, items = {}, {}
+        for item_id, name, description in rows:
+            items[item_id] = (name, description)
+            for field, value in ((0, name), (1, description)):
+                for token in set(tokenize(value)):
+                    postings.setdefault(token, ([], []))[field].append(item_id)
+        self._index = (sorted(postings), postings, items)
+        return self._index
+
+    def _current_index(self, db: Session):
+        engine = db.get_bind().engine
+        built = self._indexes.get(engine)
+        if built is not None and built[0] == self._generation:
+            return built[1]
+        with self._lock:
+            # Read first, so a commit during the build triggers another one.
+            generation = self._generation
+            built = self._indexes.get(engine)
+            if built is not None and built[0] == generation:
+                return built[1]
+            rows = db.execute(
+                select(models.Item.id, models.Item.name, models.Item.description)
+            )
+            index = self.build(rows)
+            self._indexes[engine] = (generation, index)
+            log.debug(f"Rebuilt in-memory item search index ({len(index[2])} items).")
+            return index
+
+    def score(self, terms: list[str], index=None) -> dict:
+        """Returns {item_id: rank} for items matching every term (each term as a token prefix)."""
+        vocabulary, postings, items = index or self._index
+        total = max(len(items), 1)
+        scores = None
+        for term in terms:
+            term_scores = {}
+            if len(term) >= MIN_PREFIX_LENGTH:
+                start = bisect.bisect_left(vocabulary, term)
+                tokens = vocabulary[
+                    start : bisect.bisect_left(vocabulary, term + "\uffff", start)
+                ]
+            else:
+                tokens = [term] if term in postings else []
+            for token in tokens:
+                name_ids, description_ids = postings[token]
+                idf = math.log(1 + total / (len(name_ids) + len(description_ids)))
+                for weight, ids in (
+                    (NAME_WEIGHT, name_ids),
+                    (DESCRIPTION_WEIGHT, description_ids),
+                ):
+                    for item_id in ids:
+                        term_scores[item_id] = max(
+                            term_scores.get(item_id, 0.0), weight * idf
+                        )
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    item_id: score + term_scores[item_id]
+                    for item_id, score in scores.items()
+                    if item_id in term_scores
+                }
+            if not scores:
+                return {}
+        return scores or {}
+
+    def search(self, db: Session, query: str, limit: int, after=None) -> list[dict]:
+        index = self._index if db is None else self._current_index(db)
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        items = index[2]
+        hits = [
+            (round(Decimal(score), RANK_DIGITS), item_id)
+            for item_id, score in self.score(terms, index).items()
+        ]
+        if after is not None:
+            after_rank, after_id = after
+            hits = [
+                (rank, item_id)
+                for rank, item_id in hits
+                if rank < after_rank or (rank == after_rank and item_id > after_id)
+            ]
+        hits.sort(key=lambda hit: (-hit[0], hit[1]))
+        return [
+            {
+                "id": item_id,
+                "name": items[item_id][0],
+                "description": items[item_id][1],
+                "rank": rank,
+            }
+            for rank, item_id in hits[:limit]
+        ]
+
+
+postgres_item_search = PostgresItemSearch()
+memory_item_search = InMemoryItemSearch()
+
+
+def search_items(
+    db: Session, query: str, limit: int = 20, cursor: str | None = None
+) -> dict:
+    """
+    Ranked item search. Returns {"items": [...], "next_cursor": ...}; pass next_cursor
+    back to get the following page.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    if db.get_bind().dialect.name == "postgresql":
+        engine = postgres_item_search
+    else:
+        engine = memory_item_search
+    # One extra hit tells whether there is a next page.
+    hits = engine.search(db, query, limit + 1, after)
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1]["rank"], hits[-1]["id"])
+    return {"items": hits, "next_cursor": next_cursor}
@@ -0,0 +1,17 @@
+# benchmarks/bench_app.py
+"""
+Benchmark-only ASGI entrypoint: the real application with Keycloak authentication
+stubbed out, so authenticated endpoints can be load-tested locally.
+Never deploy this module; it is not part of the Docker image.
+"""
+
+from app.main import app
+from app.security import get_current_user
+
+BENCH_USER = {
+    "sub": "bench-user",
+    "preferred_username": "bench_user",
+    "realm_access": {"roles": ["admin"]},
+}
+
+app.dependency_overrides[get_current_user] = lambda: BENCH_USER
@@ -0,0 +1,103 @@
+# benchmarks/bench_compression.py
+"""
+Measures the bandwidth and latency trade-off of response compression for item list
+payloads of realistic sizes: compressed size, compression time, and the resulting
+time to deliver the body over links of different speeds.
+
+Usage: python -m benchmarks.bench_compression [--sizes 10 100 1000 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.compression import (
+    BrotliEncoder,
+    GzipEncoder,
+    ZstdEncoder,
+    available_encoders,
+)
+from app.core.responses import dumps
+
+# Link speeds in megabits per second
+LINKS = {"10 Mbit/s": 10, "100 Mbit/s": 100, "1 Gbit/s": 1000}
+
+ENCODINGS = [
+    ("gzip", GzipEncoder, [1, 6, 9]),
+    ("br", BrotliEncoder, [1, 4, 11]),
+    ("zstd", ZstdEncoder, [1, 3, 9]),
+]
+
+
+def item_page(count: int) -> bytes:
+    """A list response with the same shape and value variety as GET /api/items/."""
+    return dumps(
+        [
+            {
+                "name": f"Item {i}",
+                "description": (
+                    f"Benchmark item number {i}, created for load testing."
+                    if i % 3
+                    else None
+                ),
+                "id": i + 1,
+            }
+            for i in range(count)
+        ]
+    )
+
+
+def timed_compress(
+    encoder_class, level: int, body: bytes, repeat: int
+) -> tuple[int, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        compressed = encoder_class(level).finish(body)
+    return len(compressed), (time.perf_counter() - start) / repeat
+
+
+def transfer_ms(size: int, mbits: int) -> float:
+    return size * 8 / (mbits * 1e6) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    installed = available_encoders()
+    header = "".join(f"{name:>13}" for name in LINKS)
+    for count in args.sizes:
+        body = item_page(count)
+        print(f"\n{count} items, {len(body):,} bytes uncompressed")
+        print(
+            f"{'encoding':<12}{'size':>10}{'ratio':>8}{'compress':>11}   total latency at{header}"
+        )
+        print(
+            f"{'identity':<12}{len(body):>10,}{1:>8.2f}{0:>9.2f}ms   {'':>16}"
+            + "".join(
+                f"{transfer_ms(len(body), mbits):>11.2f}ms" for mbits in LINKS.values()
+            )
+        )
+        for name, encoder_class, levels in ENCODINGS:
+            if name not in installed:
+                print(f"{name:<12} (not installed)")
+                continue
+            for level in levels:
+                size, seconds = timed_compress(encoder_class, level, body, args.repeat)
+                totals = "".join(
+                    f"{seconds * 1000 + transfer_ms(size, mbits):>11.2f}ms"
+                    for mbits in LINKS.values()
+                )
+                label = f"{name}-{level}"
+                print(
+                    f"{label:<12}{size:>10,}{len(body) / size:>8.2f}{seconds * 1000:>9.2f}ms   {'':>16}{totals}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/bench_event_loop.py
+"""
+Compares requests per second of one production worker with the stock asyncio loop
+and h11 parser against uvloop and httptools, for the health and items endpoints.
+
+Usage: python -m benchmarks.bench_event_loop [--duration 5] [--concurrency 64]
+"""
+
+import argparse
+
+from benchmarks.load import format_stats, prepare_database, run_load, serve
+from utils.workers import select_http, select_loop
+
+ENDPOINTS = ["/api/health", "/api/items/?limit=100"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--clients", type=int, default=2, help="load generator processes"
+    )
+    args = parser.parse_args()
+
+    variants = [("asyncio", "h11"), ("uvloop", "httptools")]
+    if "auto" in (select_loop("uvloop"), select_http("httptools")):
+        print(
+            "uvloop/httptools are not installed; only the stock setup can be measured."
+        )
+        variants = variants[:1]
+
+    prepare_database()
+    results = {}
+    for loop, http in variants:
+        env = {"WEB_CONCURRENCY": "1", "UVICORN_LOOP": loop, "UVICORN_HTTP": http}
+        with serve(env=env) as base_url:
+            for path in ENDPOINTS:
+                stats = run_load(
+                    base_url + path, args.duration, args.concurrency, args.clients
+                )
+                results[(loop, http, path)] = stats
+                print(f"{loop + '+' + http:<20} {path:<24} {format_stats(stats)}")
+
+    if len(variants) == 2:
+        print()
+        for path in ENDPOINTS:
+            stock = results[(*variants[0], path)]["rps"]
+            fast = results[(*variants[1], path)]["rps"]
+            print(
+                f"{path:<24} {fast - stock:+10,.0f} req/s ({(fast / stock - 1) * 100:+.1f}%)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_exclusions.py
+"""
+Measures exclusion matching in make_ingest.py over a tree of 100k+ files.
+The compiled PatternMatcher is compared with testing every pattern's regex against every
+path (the naive approach) and, when installed, with pathspec (what gitingest uses).
+It reports both per-path matching over every file in the tree and a full pruned walk.
+
+Usage: python -m benchmarks.bench_exclusions [--packages 400] [--files-per-package 80] [--keep DIR]
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import make_ingest
+from benchmarks.bench_ingest import make_monorepo
+
+
+class NaiveMatcher:
+    """Every pattern as its own full-path regex, all tried for every path."""
+
+    def __init__(self, patterns):
+        self.rules = []
+        for pattern in patterns:
+            body = pattern.strip("/")
+            prefix = "" if "/" in body else "(?:.*/)?"
+            suffix = "/.*" if pattern.endswith("/") else "(?:/.*)?"
+            self.rules.append(
+                re.compile(prefix + make_ingest.glob_to_regex(body) + suffix)
+            )
+
+    def match(self, path, is_dir=False):
+        path = path + "/" if is_dir else path
+        return any(rule.fullmatch(path) for rule in self.rules)
+
+    first_match = match
+
+
+def list_files(root: str) -> list[str]:
+    paths = []
+    for directory, _, files in os.walk(root):
+        rel_dir = os.path.relpath(directory, root).replace(os.sep, "/")
+        prefix = "" if rel_dir == "." else rel_dir + "/"
+        paths.extend(prefix + name for name in files)
+    return paths
+
+
+def time_matching(label: str, match, paths: list[str]) -> list[bool]:
+    start = time.perf_counter()
+    results = [bool(match(path)) for path in paths]
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {label:<28} {elapsed:7.2f} s  {elapsed / len(paths) * 1e6:7.2f} µs/path"
+        f"  {sum(results):,} excluded"
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packages", type=int, default=400)
+    parser.add_argument("--files-per-package", type=int, default=80)
+    parser.add_argument(
+        "--keep", help="generate the tree here and keep it (reused if present)"
+    )
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="bench_exclusions_")
+    try:
+        if not os.path.isdir(os.path.join(root, "packages")):
+            start = time.perf_counter()
+            total = make_monorepo(root, args.packages, args.files_per_package)
+            print(
+                f"Generated {total:,} files in {time.perf_counter() - start:.1f} s under {root}"
+            )
+
+        exclusions, _ = make_ingest.build_patterns()
+        compiled = make_ingest.PatternMatcher(exclusions)
+        naive = NaiveMatcher(exclusions)
+        print(f"{len(exclusions)} patterns compiled into {len(compiled.rules)} rules")
+
+        paths = list_files(root)
+        print(f"Matching every one of {len(paths):,} file paths (no pruning):")
+        expected = time_matching("naive regex per pattern", naive.match, paths)
+        try:
+            import pathspec
+
+            spec = pathspec.PathSpec.from_lines("gitwildmatch", exclusions)
+            time_matching("pathspec", spec.match_file, paths)
+        except ImportError:
+            print("  pathspec is not installed; skipping it.")
+        results = time_matching(
+            "PatternMatcher.first_match", compiled.first_match, paths
+        )
+        mismatches = sum(a != b for a, b in zip(expected, results))
+        print(f"  decisions differing from the naive matcher: {mismatches}")
+
+        print("Walking the tree with pruning (scan_tree):")
+        for label, matcher in (("naive", naive), ("PatternMatcher", compiled)):
+            start = time.perf_counter()
+            tree = make_ingest.scan_tree(root, matcher)
+            files = sum(1 for _ in make_ingest.iter_files(tree))
+            print(
+                f"  {label:<28} {time.perf_counter() - start:7.2f} s  {files:,} files kept"
+            )
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
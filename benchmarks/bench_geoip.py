@@ -0,0 +1,99 @@
+# benchmarks/bench_geoip.py
+"""
+Compares GeoIP country lookups through the plain geoip2 reader against GeoIPResolver
+(mmdb reader with and without the LRU cache, and the in-memory range table).
+
+Usage: python -m benchmarks.bench_geoip --db /path/to/GeoLite2-Country.mmdb
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.geoip import GeoIPResolver
+
+
+def random_ips(count: int, unique: int, seed: int = 42) -> list[str]:
+    """Returns `count` IPv4 addresses drawn from a pool of `unique` addresses."""
+    rng = random.Random(seed)
+    pool = [
+        f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        for _ in range(unique)
+    ]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def timed(label: str, fn, ips: list[str]):
+    start = time.perf_counter()
+    fn(ips)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<36} {elapsed * 1000:>9.1f} ms  {len(ips) / elapsed:>12,.0f} lookups/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--db", default=os.getenv("GEOIP_DB_PATH", "GeoLite2-Country.mmdb")
+    )
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--unique", type=int, default=5_000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(
+            f"GeoIP database not found at {args.db}. Pass --db to run this benchmark."
+        )
+        sys.exit(1)
+
+    import geoip2.database
+    import geoip2.errors
+
+    ips = random_ips(args.lookups, args.unique)
+    print(f"{args.lookups:,} lookups over {args.unique:,} distinct addresses\n")
+
+    plain_reader = geoip2.database.Reader(args.db)
+
+    def plain(ips):
+        for ip in ips:
+            try:
+                plain_reader.country(ip).country.iso_code
+            except geoip2.errors.AddressNotFoundError:
+                pass
+
+    timed("geoip2 Reader.country (baseline)", plain, ips)
+
+    uncached = GeoIPResolver(args.db, cache_size=0)
+    timed(
+        "resolver, mmap, no cache",
+        lambda ips: [uncached.country_code(ip) for ip in ips],
+        ips,
+    )
+
+    cached = GeoIPResolver(args.db)
+    timed(
+        "resolver, mmap, LRU cache",
+        lambda ips: [cached.country_code(ip) for ip in ips],
+        ips,
+    )
+    print(f"  cache: {cached.cache_info()}")
+
+    start = time.perf_counter()
+    table = GeoIPResolver(args.db, cache_size=0, use_range_table=True)
+    table.available
+    print(f"\nrange table build: {(time.perf_counter() - start) * 1000:.0f} ms")
+    timed(
+        "resolver, range table, no cache",
+        lambda ips: [table.country_code(ip) for ip in ips],
+        ips,
+    )
+    timed("resolver, range table, batch", table.country_codes, ips)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/bench_git_index.py
+"""
+Compares enumerating files for make_ingest.py from the git index with walking the tree.
+The synthetic monorepo is committed to a git repository, and gitignored build output that
+the exclusion rules do not cover (target/, .gradle/) is added next to the sources, as a
+directory walk has to visit it before the exclusion rules can say anything about it.
+`git ls-files` is timed as the reference for the same file lists.
+
+Usage: python -m benchmarks.bench_git_index [--packages 200] [--files-per-package 40] [--keep DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import make_ingest
+from benchmarks.bench_ingest import make_monorepo, write_file
+
+GITIGNORED_TREES = [("target", ".txt", 8), (".gradle", ".bin", 4)]
+
+
+def git(root: str, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *args],
+        cwd=root,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def make_repository(root: str, packages: int, files_per_package: int) -> int:
+    """Commits the monorepo, then adds gitignored build output; returns the files written."""
+    total = make_monorepo(root, packages, files_per_package)
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("".join(f"{directory}/\n" for directory, _, _ in GITIGNORED_TREES))
+        f.write("node_modules/\n__pycache__/\ndist/\n")
+    git(root, "init", "-q")
+    git(root, "add", "-A")
+    git(root, "commit", "-qm", "synthetic monorepo")
+    rng = random.Random(5)
+    for package in range(packages):
+        base = os.path.join(root, f"packages/pkg_{package:04d}")
+        for directory, ext, factor in GITIGNORED_TREES:
+            for i in range(files_per_package * factor // 4):
+                write_file(
+                    os.path.join(base, f"{directory}/part_{i % 9}/f_{i}{ext}"), rng, 3
+                )
+                total += 1
+        # A few untracked but not ignored files, picked up only with --untracked.
+        write_file(os.path.join(base, "NOTES.md"), rng, 3)
+        total += 1
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packages", type=int, default=200)
+    parser.add_argument("--files-per-package", type=int, default=40)
+    parser.add_argument(
+        "--keep", help="generate the repository here and keep it (reused if any)"
+    )
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="bench_git_index_")
+    try:
+        if not os.path.isdir(os.path.join(root, ".git")):
+            start = time.perf_counter()
+            total = make_repository(root, args.packages, args.files_per_package)
+            print(
+                f"Generated {total:,} files in {time.perf_counter() - start:.1f} s under {root}"
+            )
+
+        exclusions, _ = make_ingest.build_patterns()
+        exclude = make_ingest.PatternMatcher(exclusions)
+        runs = [
+            (
+                "scan_tree (directory walk)",
+                lambda: make_ingest.scan_tree(root, exclude),
+            ),
+            ("git_tree, tracked", lambda: make_ingest.git_tree(root, exclude)),
+            (
+                "git_tree, + untracked",
+                lambda: make_ingest.git_tree(root, exclude, untracked=True),
+            ),
+        ]
+        for label, build in runs:
+            start = time.perf_counter()
+            files = sum(1 for _ in make_ingest.iter_files(build()))
+            print(
+                f"  {label:<28} {time.perf_counter() - start:7.2f} s  {files:,} files kept"
+            )
+
+        for label, options in (
+            ("git ls-files", ["--cached"]),
+            ("git ls-files --others", ["--cached", "--others", "--exclude-standard"]),
+        ):
+            start = time.perf_counter()
+            listed = len(git(root, "ls-files", *options).splitlines())
+            print(
+                f"  {label:<28} {time.perf_counter() - start:7.2f} s  {listed:,} files listed"
+            )
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
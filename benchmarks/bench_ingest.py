@@ -0,0 +1,170 @@
+# benchmarks/bench_ingest.py
+"""
+Compares the native digest engine in make_ingest.py with running gitingest as a subprocess,
+and measures repeat runs served from the digest cache.
+A synthetic monorepo is generated in a temporary directory: source packages, plus the
+node_modules, __pycache__ and build trees that the exclusion rules are meant to skip.
+Note that gitingest stops after 10,000 files, so it is also compared on file counts.
+
+Usage: python -m benchmarks.bench_ingest [--packages 200] [--files-per-package 40] [--keep DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import make_ingest
+
+SOURCE_EXTENSIONS = [".py", ".ts", ".tsx", ".md", ".json", ".css"]
+IGNORED_TREES = [
+    ("node_modules", ".js", 6),
+    ("__pycache__", ".pyc", 1),
+    ("dist", ".js", 2),
+]
+
+
+def write_file(path: str, rng: random.Random, lines: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for line in range(lines):
+            f.write(
+                f"value_{line} = {rng.randint(0, 10**9)}  # {'x' * rng.randint(0, 60)}\n"
+            )
+
+
+def make_monorepo(
+    root: str, packages: int, files_per_package: int, seed: int = 3
+) -> int:
+    """Creates the synthetic tree; returns the total number of files written."""
+    rng = random.Random(seed)
+    total = 0
+    for package in range(packages):
+        base = os.path.join(root, f"packages/pkg_{package:04d}")
+        for i in range(files_per_package):
+            ext = rng.choice(SOURCE_EXTENSIONS)
+            write_file(
+                os.path.join(base, f"src/mod_{i % 5}/file_{i}{ext}"),
+                rng,
+                rng.randint(20, 200),
+            )
+            total += 1
+        # Excluded trees are several times larger than the sources, as in real checkouts.
+        for directory, ext, factor in IGNORED_TREES:
+            for i in range(files_per_package * factor // 4):
+                write_file(
+                    os.path.join(base, f"{directory}/lib_{i % 7}/f_{i}{ext}"), rng, 5
+                )
+                total += 1
+    return total
+
+
+def timed(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def count_files(digest: str) -> int:
+    with open(digest, encoding="utf-8") as f:
+        return sum(1 for line in f if line.startswith("FILE: "))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packages", type=int, default=200)
+    parser.add_argument("--files-per-package", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--keep", help="generate the tree here and keep it (reused if present)"
+    )
+    args = parser.parse_args()
+
+    root = args.keep or tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        if not os.path.isdir(os.path.join(root, "packages")):
+            start = time.perf_counter()
+            total = make_monorepo(root, args.packages, args.files_per_package)
+            print(
+                f"Generated {total:,} files in {time.perf_counter() - start:.1f} s under {root}"
+            )
+        output = os.path.join(tempfile.gettempdir(), "bench_digest.txt")
+
+        for workers in (1, make_ingest.DIGEST_WORKERS):
+            seconds = timed(
+                lambda: make_ingest.generate_digest(
+                    root, output, workers=workers, use_cache=False
+                ),
+                args.repeat,
+            )
+            print(
+                f"native ({workers:>2} workers): {seconds:7.2f} s, {count_files(output):,} files"
+            )
+
+        stats = {}
+        seconds = timed(
+            lambda: stats.update(
+                make_ingest.generate_digest(
+                    root, output, use_cache=False, max_tokens=100_000
+                )
+            ),
+            args.repeat,
+        )
+        print(
+            f"native, 100k-token chunks:       {seconds:7.2f} s, {stats['chunks']} chunks"
+        )
+
+        # Repeat runs with the digest cache: unchanged, then with a few files modified.
+        cache_file = output + ".cache"
+        for path in (cache_file, output):
+            if os.path.exists(path):
+                os.remove(path)
+        make_ingest.generate_digest(root, output, cache_file=cache_file)
+        seconds = timed(lambda: make_ingest.generate_digest(root, output), args.repeat)
+        print(f"native, cached, unchanged tree:  {seconds:7.2f} s")
+        sources = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(os.path.join(root, "packages"))
+            if os.path.basename(os.path.dirname(directory)) == "src"
+            for name in names
+        ]
+        for path in random.Random(1).sample(sources, 10):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("changed = True\n")
+        seconds = timed(lambda: make_ingest.generate_digest(root, output), 1)
+        print(f"native, cached, 10 files edited: {seconds:7.2f} s")
+
+        if shutil.which("gitingest"):
+            cmd = [
+                sys.executable,
+                make_ingest.__file__,
+                root,
+                output,
+                "--engine=gitingest",
+            ]
+            seconds = timed(
+                lambda: subprocess.run(cmd, check=True, capture_output=True),
+                args.repeat,
+            )
+            print(
+                f"gitingest subprocess:  {seconds:7.2f} s, {count_files(output):,} files"
+            )
+        else:
+            print("gitingest is not installed; skipping the subprocess comparison.")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
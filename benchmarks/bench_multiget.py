@@ -0,0 +1,83 @@
+# benchmarks/bench_multiget.py
+"""
+Compares fetching N specific items with N sequential GET /api/items/{id} calls against
+one GET /api/items/batch call, over a single keep-alive connection to one worker.
+Authentication is stubbed by the benchmark app, so real deployments (JWT validation
+and introspection on every request) favour the batch call even more.
+
+Usage: python -m benchmarks.bench_multiget [--counts 1 10 50 100] [--rounds 20]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks.load import _read_response, _request_bytes, prepare_database, serve
+
+
+async def measure(
+    host: str, port: int, paths_per_round: list[list[str]]
+) -> list[float]:
+    """Returns the wall time of each round, where a round sends its paths one after another."""
+    reader, writer = await asyncio.open_connection(host, port)
+    timings = []
+    try:
+        for paths in paths_per_round:
+            start = time.perf_counter()
+            for path in paths:
+                writer.write(_request_bytes(host, port, path, None))
+                status, _ = await _read_response(reader)
+                assert status == 200, (status, path)
+            timings.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--items", type=int, default=1000)
+    args = parser.parse_args()
+
+    prepare_database(items=args.items)
+    rng = random.Random(42)
+    # The entity cache is disabled so every variant reaches the database.
+    env = {"WEB_CONCURRENCY": "1", "ENTITY_CACHE_SIZE": "0"}
+    with serve(env=env) as base_url:
+        host, port = base_url.split("://")[1].split(":")
+        port = int(port)
+        print(f"{'items':>6} {'sequential p50':>16} {'batch p50':>12} {'speed-up':>10}")
+        for count in args.counts:
+            rounds = [
+                rng.sample(range(1, args.items + 1), count) for _ in range(args.rounds)
+            ]
+            sequential = asyncio.run(
+                measure(
+                    host, port, [[f"/api/items/{i}" for i in ids] for ids in rounds]
+                )
+            )
+            batch = asyncio.run(
+                measure(
+                    host,
+                    port,
+                    [
+                        ["/api/items/batch?" + "&".join(f"ids={i}" for i in ids)]
+                        for ids in rounds
+                    ],
+                )
+            )
+            seq_ms, batch_ms = (
+                statistics.median(sequential) * 1000,
+                statistics.median(batch) * 1000,
+            )
+            print(
+                f"{count:>6} {seq_ms:>13.2f} ms {batch_ms:>9.2f} ms {seq_ms / batch_ms:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
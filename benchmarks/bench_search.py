@@ -0,0 +1,148 @@
+# benchmarks/bench_search.py
+"""
+Measures item search latency at millions of rows.
+Without --database-url, it benchmarks the in-memory index (index build time and query
+latency). With a PostgreSQL URL whose schema is migrated (alembic upgrade head), it
+seeds the items table if needed and compares the tsvector/trigram search against an
+unindexed ILIKE scan.
+
+Usage: python -m benchmarks.bench_search [--rows 1000000] [--database-url postgresql://...]
+"""
+
+import argparse
+import io
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.search import InMemoryItemSearch, decode_cursor, encode_cursor
+
+QUERIES = ["ka", "kal", "kalo", "kalomi", "ra ve", "tusidane", "kalomi ravet"]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list[str]:
+    syllables = ["ka", "lo", "mi", "ra", "ve", "tu", "si", "da", "ne", "po", "zu", "be"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 5))))
+    return sorted(words)
+
+
+def make_rows(count: int, seed: int = 7):
+    """Yields (id, name, description) rows with Zipf-like word frequencies."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(50_000, rng)
+    cum_weights = list(
+        itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary)))
+    )
+    for item_id in range(1, count + 1):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(12, 24))
+        yield item_id, " ".join(words[:3]).title(), " ".join(words[3:])
+
+
+def timed_queries(search, repeat: int) -> None:
+    for query in QUERIES:
+        latencies, hits = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            hits = search(query, None)
+            latencies.append(time.perf_counter() - start)
+        page_two = []
+        if hits:
+            cursor = decode_cursor(encode_cursor(hits[-1]["rank"], hits[-1]["id"]))
+            start = time.perf_counter()
+            page_two = search(query, cursor)
+            page_two_ms = (time.perf_counter() - start) * 1000
+        else:
+            page_two_ms = 0.0
+        print(
+            f"  {query!r:<18} p50 {statistics.median(latencies) * 1000:8.2f} ms"
+            f"   next page {page_two_ms:8.2f} ms   hits on page {len(hits)}/{len(page_two)}"
+        )
+
+
+def bench_memory(rows: int, repeat: int):
+    index = InMemoryItemSearch()
+    start = time.perf_counter()
+    index.build(make_rows(rows))
+    print(
+        f"In-memory index: {rows:,} items built in {time.perf_counter() - start:.1f} s"
+    )
+    timed_queries(lambda query, after: index.search(None, query, 20, after), repeat)
+
+
+def seed_postgres(engine, rows: int):
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        existing = conn.execute(text("SELECT count(*) FROM items")).scalar()
+    if existing >= rows:
+        return
+    print(f"Seeding {rows - existing:,} items...")
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        buffer = io.StringIO()
+        for i, (_, name, description) in enumerate(
+            make_rows(rows - existing, seed=existing), 1
+        ):
+            buffer.write(f"{name}\t{description}\n")
+            if i % 100_000 == 0:
+                buffer.seek(0)
+                cursor.copy_expert("COPY items (name, description) FROM STDIN", buffer)
+                buffer = io.StringIO()
+        buffer.seek(0)
+        cursor.copy_expert("COPY items (name, description) FROM STDIN", buffer)
+        raw.commit()
+        cursor.execute("ANALYZE items")
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def bench_postgres(url: str, rows: int, repeat: int):
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    from app.services.search import PostgresItemSearch
+
+    engine = create_engine(url)
+    seed_postgres(engine, rows)
+    search = PostgresItemSearch()
+    with Session(engine) as db:
+        print(f"PostgreSQL tsvector + trigram search ({rows:,}+ items)")
+        timed_queries(lambda query, after: search.search(db, query, 20, after), repeat)
+
+        print("PostgreSQL ILIKE '%term%' scan (baseline)")
+        baseline = text(
+            "SELECT id FROM items WHERE name ILIKE :p OR description ILIKE :p LIMIT 20"
+        )
+        for query in QUERIES[:3]:
+            start = time.perf_counter()
+            db.execute(baseline, {"p": f"%{query}%"}).all()
+            print(f"  {query!r:<18} {(time.perf_counter() - start) * 1000:8.2f} ms")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--database-url", help="a migrated PostgreSQL database to benchmark"
+    )
+    args = parser.parse_args()
+
+    if args.database_url:
+        bench_postgres(args.database_url, args.rows, args.repeat)
+    else:
+        bench_memory(args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
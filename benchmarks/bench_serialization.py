@@ -0,0 +1,79 @@
+# benchmarks/bench_serialization.py
+"""
+Measures the per-item cost of fetching and serialising a page of items through each
+response path: ORM objects validated by schemas.Item and encoded with the standard
+JSON encoder (the original path), FastAPI's Pydantic dump_json path, and the column
+tuple path encoded by RowsJSONResponse.
+
+Usage: python -m benchmarks.bench_serialization [--pages 100 1000] [--repeat 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.core.responses import RowsJSONResponse, orjson, schema_columns
+from benchmarks.load import DEFAULT_DATABASE_URL, prepare_database
+
+ITEM_LIST = TypeAdapter(list[schemas.Item])
+ITEM_COLUMNS = schema_columns(models.Item, schemas.Item)
+
+
+def orm_stdlib(db: Session, limit: int) -> bytes:
+    items = db.query(models.Item).limit(limit).all()
+    content = jsonable_encoder(ITEM_LIST.validate_python(items, from_attributes=True))
+    return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+
+def orm_dump_json(db: Session, limit: int) -> bytes:
+    items = db.query(models.Item).limit(limit).all()
+    return ITEM_LIST.dump_json(ITEM_LIST.validate_python(items, from_attributes=True))
+
+
+def column_tuples(db: Session, limit: int) -> bytes:
+    result = db.execute(select(*ITEM_COLUMNS).limit(limit))
+    return RowsJSONResponse(result.all(), result.keys()).body
+
+
+PATHS = [
+    ("ORM + Pydantic + json", orm_stdlib),
+    ("ORM + Pydantic dump_json", orm_dump_json),
+    ("column tuples + RowsJSONResponse", column_tuples),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    prepare_database(items=max(args.pages))
+    engine = create_engine(DEFAULT_DATABASE_URL)
+    print(f"JSON encoder: {'orjson' if orjson else 'json (orjson not installed)'}")
+    with Session(engine) as db:
+        for limit in args.pages:
+            expected = json.loads(orm_stdlib(db, limit))
+            for label, fn in PATHS:
+                assert json.loads(fn(db, limit)) == expected, label
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    fn(db, limit)
+                    db.expunge_all()
+                per_item = (time.perf_counter() - start) / args.repeat / limit
+                print(f"{limit:>5} items  {label:<34} {per_item * 1e6:>7.2f} µs/item")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_startup.py
+"""
+Reports worker cold-start cost: wall time to import app.main in a fresh interpreter,
+the slowest imports (from `python -X importtime`), and the duration of each
+startup pre-warm task.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--top 15] [--prewarm policies,geoip]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_wall_times(runs: int) -> list[float]:
+    code = "import time; s = time.perf_counter(); import app.main; print(time.perf_counter() - s)"
+    return [float(run_python(code).stdout.strip()) for _ in range(runs)]
+
+
+def import_time_report(top: int):
+    """Parses `-X importtime` output into (cumulative_us, self_us, module) rows."""
+    stderr = run_python("import app.main", "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    top_level = [
+        row for row in rows if not row[2].startswith(" ") and "." not in row[2]
+    ]
+    app_modules = [row for row in rows if row[2].startswith("app")]
+    return (
+        sorted(top_level, reverse=True)[:top],
+        sorted(app_modules, reverse=True),
+        sorted(rows, key=lambda row: row[1], reverse=True)[:top],
+    )
+
+
+def prewarm_timings(names: str) -> str:
+    code = (
+        "import asyncio, time\n"
+        "from app.lifecycle import prewarm\n"
+        f"names = {names.split(',')!r}\n"
+        "s = time.perf_counter()\n"
+        "timings = asyncio.run(prewarm(names))\n"
+        "total = time.perf_counter() - s\n"
+        "for name, seconds in timings.items():\n"
+        "    print(f'  {name:<12} {seconds * 1000:8.1f} ms')\n"
+        "print(f'  {\"total\":<12} {total * 1000:8.1f} ms (tasks run in parallel)')\n"
+    )
+    return run_python(code).stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--prewarm", default="policies,geoip")
+    args = parser.parse_args()
+
+    times = import_wall_times(args.runs)
+    print(
+        f"import app.main: median {statistics.median(times) * 1000:.0f} ms, "
+        f"min {min(times) * 1000:.0f} ms over {args.runs} fresh interpreters\n"
+    )
+
+    top_level, app_modules, by_self = import_time_report(args.top)
+    print("Slowest top-level packages (cumulative):")
+    for cumulative_us, _, module in top_level:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+    print("\nApplication modules (cumulative):")
+    for cumulative_us, _, module in app_modules:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module.strip()}")
+    print("\nSlowest individual modules (self):")
+    for _, self_us, module in by_self:
+        print(f"  {self_us / 1000:8.1f} ms  {module.strip()}")
+
+    print(f"\nStartup pre-warm tasks ({args.prewarm}):")
+    start = time.perf_counter()
+    print(prewarm_timings(args.prewarm), end="")
+    print(
+        f"  (including interpreter start and imports: {(time.perf_counter() - start) * 1000:.0f} ms)"
+    )
+
+
+if __name__ == "__main__":
+    main()
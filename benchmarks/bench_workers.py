@@ -0,0 +1,48 @@
+# benchmarks/bench_workers.py
+"""
+Measures how throughput scales with the number of Gunicorn workers, using the
+production config (preload, CPU-aware sizing) against a seeded SQLite database.
+
+Usage: python -m benchmarks.bench_workers [--workers 1,2,4] [--duration 5] [--concurrency 64]
+"""
+
+import argparse
+
+from benchmarks.load import format_stats, prepare_database, run_load, serve
+from utils.cpu import effective_cpu_count
+
+ENDPOINTS = ["/api/health", "/api/items/?limit=100"]
+
+
+def main():
+    cpus = effective_cpu_count()
+    default_counts = sorted({1, 2, max(1, cpus // 2), cpus, cpus * 2})
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", default=",".join(map(str, default_counts)))
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--clients", type=int, default=2, help="load generator processes"
+    )
+    args = parser.parse_args()
+
+    prepare_database()
+    print(
+        f"{cpus} usable CPU(s); load: {args.concurrency} connections, {args.duration:g}s per run\n"
+    )
+    baseline = {}
+    for count in [int(c) for c in args.workers.split(",")]:
+        with serve(env={"WEB_CONCURRENCY": str(count)}) as base_url:
+            for path in ENDPOINTS:
+                stats = run_load(
+                    base_url + path, args.duration, args.concurrency, args.clients
+                )
+                baseline.setdefault(path, stats["rps"])
+                speedup = stats["rps"] / baseline[path] if baseline[path] else 0.0
+                print(
+                    f"workers={count:<3} {path:<24} {format_stats(stats)}  x{speedup:.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
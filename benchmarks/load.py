@@ -0,0 +1,217 @@
+# benchmarks/load.py
+"""
+A small HTTP load harness shared by the server benchmarks. It starts Gunicorn with a
+given config, waits until the app is healthy, and drives it with keep-alive clients
+spread over several processes. The client speaks minimal HTTP/1.1 over raw asyncio
+streams, so the load generator is not the bottleneck.
+"""
+
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_DATABASE_URL = (
+    f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_app.db')}"
+)
+
+
+def prepare_database(database_url: str = DEFAULT_DATABASE_URL, items: int = 1000):
+    """Creates the schema and seeds `items` rows, so every server run starts from the same data."""
+    from sqlalchemy import create_engine, inspect
+    from sqlalchemy.orm import Session
+
+    from app import models
+    from app.core.database import Base
+
+    engine = create_engine(database_url)
+    # Rebuild a database left over from an older schema.
+    inspector = inspect(engine)
+    if inspector.has_table("items"):
+        columns = {column["name"] for column in inspector.get_columns("items")}
+        if columns != set(models.Item.__table__.columns.keys()):
+            Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        missing = items - db.query(models.Item).count()
+        if missing > 0:
+            db.add_all(
+                models.Item(
+                    name=f"Item {i}", description=f"Benchmark item number {i}. " * 4
+                )
+                for i in range(missing)
+            )
+            db.commit()
+    engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(
+    config: str = "gunicorn/prod.py",
+    env: dict | None = None,
+    app: str = "benchmarks.bench_app:app",
+    extra_args: list[str] | None = None,
+    startup_timeout: float = 60,
+):
+    """Runs Gunicorn on a free local port and yields the base URL once /api/health answers."""
+    port = free_port()
+    cmd = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "-c",
+        config,
+        "--bind",
+        f"127.0.0.1:{port}",
+    ]
+    cmd += (extra_args or []) + [app]
+    server_env = {
+        **os.environ,
+        "BASE_PATH": "",
+        "DATABASE_URL": DEFAULT_DATABASE_URL,
+        "PYTHONPATH": ROOT,
+        **(env or {}),
+    }
+    process = subprocess.Popen(
+        cmd,
+        cwd=ROOT,
+        env=server_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited during startup: {' '.join(cmd)}")
+            try:
+                status, _ = asyncio.run(_fetch_once("127.0.0.1", port, "/api/health"))
+                if status == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not become healthy in time.")
+            time.sleep(0.2)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+async def _read_response(reader: asyncio.StreamReader) -> tuple[int, int]:
+    """Reads one HTTP/1.1 response and returns (status, body_size)."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding") == "chunked":
+        size = 0
+        while True:
+            chunk_size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(chunk_size + 2)
+            size += chunk_size
+            if chunk_size == 0:
+                return status, size
+    length = int(headers.get("content-length", "0"))
+    await reader.readexactly(length)
+    return status, length
+
+
+def _request_bytes(host: str, port: int, path: str, headers: dict | None) -> bytes:
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}:{port}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def _fetch_once(host: str, port: int, path: str, headers: dict | None = None):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(_request_bytes(host, port, path, headers))
+        return await _read_response(reader)
+    finally:
+        writer.close()
+
+
+async def _client_loop(host, port, path, headers, duration, connections):
+    request = _request_bytes(host, port, path, headers)
+    latencies, errors, body_bytes = [], 0, 0
+    deadline = time.perf_counter() + duration
+
+    async def connection():
+        nonlocal errors, body_bytes
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                writer.write(request)
+                status, size = await _read_response(reader)
+                latencies.append(time.perf_counter() - start)
+                body_bytes += size
+                if status >= 400:
+                    errors += 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(connection() for _ in range(connections)))
+    return latencies, errors, body_bytes
+
+
+def _client_process(args):
+    return asyncio.run(_client_loop(*args))
+
+
+def run_load(
+    url: str,
+    duration: float = 5.0,
+    concurrency: int = 32,
+    processes: int = 2,
+    headers: dict | None = None,
+) -> dict:
+    """
+    Sends GET requests to `url` over `concurrency` keep-alive connections for `duration`
+    seconds and returns throughput and latency statistics.
+    """
+    rest = url.split("://", 1)[1]
+    hostport, _, path = rest.partition("/")
+    host, port = hostport.split(":")
+    per_process = max(1, concurrency // processes)
+    args = (host, int(port), "/" + path, headers, duration, per_process)
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_client_process, [args] * processes)
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "errors": sum(result[1] for result in results),
+        "rps": requests / duration,
+        "bytes_per_response": sum(result[2] for result in results) / max(requests, 1),
+        "p50_ms": latencies[requests // 2] * 1000 if requests else 0.0,
+        "p99_ms": latencies[int(requests * 0.99)] * 1000 if requests else 0.0,
+    }
+
+
+def format_stats(stats: dict) -> str:
+    return (
+        f"{stats['rps']:>10,.0f} req/s  p50 {stats['p50_ms']:7.2f} ms  "
+        f"p99 {stats['p99_ms']:7.2f} ms  errors {stats['errors']}"
+    )
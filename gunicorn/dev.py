@@ -2,6 +2,10 @@
 
 import multiprocessing
 import os
+import sys
+
+# Add the project root to the Python path to allow importing 'utils'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # FastAPI ASGI application path in the pattern MODULE_NAME:VARIABLE_NAME
 wsgi_app = "app.main:app"  # Update "app" if your FastAPI instance is named differently
@@ -36,7 +40,12 @@ daemon = False
 timeout = 5000
 
 # Worker class for ASGI support with FastAPI
-worker_class = "uvicorn.workers.UvicornWorker"
+# (selects uvloop and httptools when they are installed, see utils/workers.py)
+worker_class = "utils.workers.UvicornFastWorker"
 
 # Maximum number of simultaneous clients (relevant for async worker types)
 worker_connections = 1000
+
+# Seconds to keep idle keep-alive connections open, and the listen backlog
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
@@ -1,8 +1,14 @@
 # gunicorn/prod.py
 """Gunicorn *production* config file"""
 
-import multiprocessing
+import gc
 import os
+import sys
+
+# Add the project root to the Python path to allow importing 'utils' and 'app'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.cpu import recommended_workers
 
 # FastAPI ASGI application path
 wsgi_app = "app.main:app"
@@ -13,15 +19,62 @@ accesslog = errorlog = "-"  # Log to stdout/stderr for Docker
 capture_output = True
 
 # Concurrency and Workers
-# Use the WEB_CONCURRENCY env var if set, otherwise calculate based on CPU
-workers = 1  # int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
-worker_class = "uvicorn.workers.UvicornWorker"
+# Use the WEB_CONCURRENCY env var if set, otherwise run one async worker per usable CPU,
+# taking container CPU limits into account. WORKERS_PER_CORE and MAX_WORKERS tune this.
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or recommended_workers(
+    float(os.getenv("WORKERS_PER_CORE", "1")),
+    int(os.getenv("MAX_WORKERS", "0")) or None,
+)
+# Workers inherit the environment, so the app can tell when it runs in several processes
+# (per-process caches and stores warn about this, see app/core/cache.py).
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# Uvicorn worker using uvloop and httptools when they are installed (see utils/workers.py)
+worker_class = "utils.workers.UvicornFastWorker"
 worker_connections = int(os.getenv("WORKER_CONNECTIONS", "1000"))
 timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
 
+# Load the application in the master before forking, so the compiled authz policy
+# and other read-only state are shared copy-on-write by all workers.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Restart each worker after this many requests (plus random jitter, so workers
+# don't all restart at once) to bound memory growth.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Addresses of the reverse proxies / load balancers allowed to set X-Forwarded-For.
+# Uvicorn then reports the right-most untrusted hop as the client address, which the
+# rate limiter keys anonymous callers by. "*" trusts every peer: only use it when the
+# app cannot be reached except through the proxy.
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Maximum number of pending connections queued by the listening socket
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+# Seconds to keep idle keep-alive connections open. Keep it above the idle
+# timeout of any load balancer in front of the app to avoid reset connections.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
 
 # Production settings (no reload, no daemon)
 reload = False
 daemon = False
+
+
+# --- Server Hooks ---
+def when_ready(server):
+    """Runs in the master after the app is preloaded, before any worker is forked."""
+    if preload_app:
+        from app.lifecycle import preload_shared_state
+
+        preload_shared_state()
+        # Move everything loaded so far out of the garbage collector's reach, so that
+        # collections in the workers don't write to (and un-share) these pages.
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    """Runs in each worker right after it is forked."""
+    from app.core.database import dispose_engine
+
+    # Pooled connections inherited from the master must never be used by a worker.
+    dispose_engine(close=False)
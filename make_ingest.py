@@ -1,344 +1,1536 @@
 # make_ingest.py
 
+import codecs
+import hashlib
+import json
+import locale
+import math
+import mmap
+import os
+import re
+import sqlite3
+import struct
 import subprocess
 import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from stat import S_ISLNK, S_ISREG
 
+# --- Configuration ---
+# Files larger than this are left out of the digest, like gitingest's own limit.
+DIGEST_MAX_FILE_SIZE = int(os.getenv("DIGEST_MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+# Threads reading and decoding files; reads are I/O bound, so more threads than CPUs help.
+DIGEST_WORKERS = int(
+    os.getenv("DIGEST_WORKERS", str(min(32, (os.cpu_count() or 1) * 4)))
+)
+# Characters per token assumed by the approximate token counter (about 4 for code and English).
+DIGEST_CHARS_PER_TOKEN = float(os.getenv("DIGEST_CHARS_PER_TOKEN", "4"))
+# Files at least this large are mapped instead of read, so truncating one never loads all of it.
+DIGEST_MMAP_THRESHOLD = int(os.getenv("DIGEST_MMAP_THRESHOLD", str(1024 * 1024)))
 
-def generate_digest_cli(
-    source, output_file="digest.txt", exclude_exts=None, is_frontend=False
-):
-    cmd = ["gitingest", source, "-o", output_file]
+# Same section layout as gitingest, so both engines produce interchangeable digests.
+SEPARATOR = "=" * 48
+# Bytes sampled to tell text from binary files.
+BINARY_SNIFF_SIZE = 1024
+# Part of the cache key: bump it whenever the rendering of a section changes.
+DIGEST_FORMAT_VERSION = 1
+# Files modified this close to a run are re-hashed next time even if size and mtime match,
+# since a second write within the same mtime tick would not change them.
+RACY_WINDOW_NS = 2_000_000_000
+ENCODINGS = list(
+    dict.fromkeys(["utf-8", locale.getpreferredencoding(False), "cp1252", "latin-1"])
+)
+
+# --- Exclusion Rules ---
+
+# Frontend-specific exclusions when processing frontend folder
+FRONTEND_EXCLUSIONS = [
+    # Build and cache directories
+    "node_modules",
+    "node_modules/*",
+    ".next",
+    ".next/*",
+    "out",
+    "build",
+    "dist",
+    ".cache",
+    # Generated files
+    "package-lock.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    ".tsbuildinfo",
+    "*.tsbuildinfo",
+    # Test and coverage
+    "coverage",
+    "__tests__/coverage",
+    ".nyc_output",
+    # Static assets
+    "public/images",
+    "public/fonts",
+    "public/*.ico",
+    "public/*.png",
+    "public/*.svg",
+    # IDE and system files
+    ".vscode",
+    ".idea",
+    ".DS_Store",
+    # Storybook
+    "storybook-static",
+    ".storybook-build",
+    # Environment files
+    ".env",
+    ".env.*",
+    # Temporary files
+    "*.log",
+    "npm-debug.log*",
+    "yarn-debug.log*",
+    "yarn-error.log*",
+]
+
+# Default exclusions for non-frontend directories
+DEFAULT_EXCLUSIONS = [
+    # Project-specific directories
+    "ai_ap_manager",
+    "ai_ap_manager/*",
+    "invoices",
+    "processed_documents",
+    "sample_data",
+    "sample_data/*",
+    "sample_data/**",
+    "sample_data/invoices",
+    "sample_data/invoices/*",
+    "sample_data/invoices/**",
+    "sample_data/demo_inoices",
+    "sample_data/demo_inoices/*",
+    "sample_data/demo_inoices/**",
+    "sample_data/GRNs",
+    "sample_data/GRNs/*",
+    "sample_data/GRNs/**",
+    "sample_data/POs",
+    "sample_data/POs/*",
+    "sample_data/POs/**",
+    "sample_data/pdf_templates.py",
+    # Generated documents and output files
+    "generated_documents",
+    "generated_documents/*",
+    "generated_documents/**",
+    "*.pdf",
+    "REGEN_*.pdf",
+    # Database export files
+    "database_export",
+    "database_export/*",
+    "database_export/**",
+    "database_export/csv",
+    "database_export/csv/*",
+    "database_export/json",
+    "database_export/json/*",
+    "ap_database_master.csv",
+    "ap_database_master.json",
+    "database_summary.txt",
+    "export_summary.json",
+    "alembic",
+    "alembic/*",
+    "alembic/**",
+    "alembic.ini",
+    "alembic.ini/*",
+    "alembic.ini/**",
+    "scripts/",
+    "scripts/alembic/*",
+    "scripts/alembic/**",
+    "scripts/alembic.ini",
+    "scripts/alembic.ini/*",
+    "scripts/alembic.ini/**",
+    "alembic.ini.py",
+    # Token usage and monitoring files
+    "token_usage",
+    "token_usage/*",
+    "token_usage/**",
+    "job_*.json",
+    "jobs_summary.json",
+    # Script conversion and processing files
+    "scripts/converted",
+    "scripts/converted/*",
+    "scripts/converted/**",
+    "scripts/to_convert",
+    "scripts/to_convert/*",
+    "scripts/to_convert/**",
+    "scripts/to_convert/processed",
+    "scripts/to_convert/processed/*",
+    "scripts/to_convert/processed/**",
+    # Utility and setup scripts (non-core business logic)
+    "scripts/data_generator.py",
+    "scripts/file_converter.py",
+    "scripts/verify_test_data.py",
+    "export_database.py",
+    "make_ingest.py",
+    "run_fresh.py",
+    "run.py",
+    "start_gunicorn.sh",
+    # Database files
+    "*.sqlite3",
+    "*.sqlite",
+    "ap_data.db",
+    "chroma.sqlite3",
+    # Python-related
+    "__pycache__",
+    "__pycache__/*",
+    "*/__pycache__",
+    "*/__pycache__/*",
+    "**/__pycache__/**",
+    "*.pyc",
+    "*.pyo",
+    "*.egg-info",
+    ".pytest_cache",
+    "venv",
+    "venv/*",
+    ".venv",
+    "env",
+    ".env",
+    # Poetry and dependency management
+    "poetry.lock",
+    "*/poetry.lock",
+    "ai_ap_manager/*/poetry.lock",
+    # Database and vector store files (ai_ap_manager specific)
+    "chroma_db",
+    "chroma_db/*",
+    "*/chroma_db",
+    "*/chroma_db/*",
+    "**/chroma_db/**",
+    "ai_ap_manager/*/chroma_db",
+    "ai_ap_manager/*/chroma_db/*",
+    # Binary data files (vector store related)
+    "*.bin",
+    "data_level0.bin",
+    "ai_ap_manager/",
+    "ai_ap_manager/*",
+    "header.bin",
+    "length.bin",
+    "link_lists.bin",
+    # Version control
+    ".git",
+    ".gitignore",
+    # System files
+    ".DS_Store",
+    "Thumbs.db",
+    "desktop.ini",
+    # Build and distribution
+    "build",
+    "dist",
+    "*.egg",
+    # Logs and temporary files
+    "*.log",
+    "*.tmp",
+    "*.temp",
+    "logs",
+    # Documentation and media files
+    "*.doc",
+    "*.docx",
+    "*.xls",
+    "*.xlsx",
+    "*.ppt",
+    "*.pptx",
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "DOCKER_GUIDE.md",
+    "FEATURES.md",
+    "*.svg",
+    "*.ico",
+    "favicon.png",
+    "favicon.ico",
+    # IDE and editor files
+    ".vscode",
+    ".idea",
+    "*.swp",
+    "*.swo",
+    # Node.js and React/Next.js related - more comprehensive exclusions
+    "node_modules",
+    "node_modules/*",
+    "*/node_modules",
+    "*/node_modules/*",
+    "**/node_modules/**",
+    "frontend/node_modules",
+    "frontend/node_modules/*",
+    "frontend/package-lock.json",
+    "frontend/yarn.lock",
+    "frontend/pnpm-lock.yaml",
+    "frontend/.next",
+    "frontend/.next/*",
+    "frontend/.next/**",
+    "frontend/public",
+    "frontend/public/*",
+    "frontend/public/**",
+    "frontend/.nuxt",
+    "frontend/.nuxt/*",
+    "frontend/out",
+    "frontend/out/*",
+    "frontend/build",
+    "frontend/dist",
+    "frontend/.cache",
+    "frontend/.parcel-cache",
+    "frontend/.vercel",
+    "frontend/.netlify",
+    "frontend/coverage",
+    "frontend/.nyc_output",
+    "frontend/.storybook-build",
+    "frontend/storybook-static",
+    "frontend/.turbo",
+    "frontend/.swc",
+    "frontend/.tsbuildinfo",
+    "frontend/*.tsbuildinfo",
+    "frontend/copy-pdf-worker.js",
+    "frontend/next-env.d.ts",
+    "npm-debug.log",
+    "yarn-error.log",
+    "package-lock.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    ".next",
+    ".next/*",
+    ".next/**",
+    ".nuxt",
+    ".nuxt/*",
+    "out",
+    "out/*",
+    "build",
+    "dist",
+    ".cache",
+    ".parcel-cache",
+    ".vercel",
+    ".netlify",
+    "coverage",
+    ".nyc_output",
+    ".storybook-build",
+    "storybook-static",
+    ".turbo",
+    ".swc",
+    ".tsbuildinfo",
+    "*.tsbuildinfo",
+    # Frontend build artifacts and static files
+    "build-manifest.json",
+    "app-build-manifest.json",
+    "fallback-build-manifest.json",
+    "next-minimal-server.js.nft.json",
+    "next-server.js.nft.json",
+    "export-marker.json",
+    "images-manifest.json",
+    "prerender-manifest.json",
+    "routes-manifest.json",
+    "required-server-files.json",
+    "app-path-routes-manifest.json",
+    "react-loadable-manifest.json",
+    "BUILD_ID",
+    "trace",
+    "transform.js",
+    "transform.js.map",
+    "pdf.worker.mjs",
+    "pdf.worker.min.mjs",
+    "logo.svg",
+    "logo-dark.svg",
+    # Archives
+    "*.zip",
+    "*.tar",
+    "*.tar.gz",
+    "*.rar",
+    "*.7z",
+    # CSV and data files (non-core)
+    "*.csv",
+    "grns.csv",
+    "pos.json",
+    "GRN_Header.csv",
+    "GRN_LineItem.csv",
+    "PO_Header.csv",
+    "PO_LineItem.csv",
+    "QC_RangIndia.csv",
+    "QC_mahawat.pdf",
+    "contract_*.pdf",
+    "invoice_*.pdf",
+    "Sindri*.pdf",
+]
+
+# Include only relevant frontend code files
+FRONTEND_INCLUDES = [
+    "*.tsx",
+    "*.ts",
+    "*.jsx",
+    "*.js",
+    "*.css",
+    "*.scss",
+    "*.sass",
+    "*.less",
+    "*.module.css",
+    "*.module.scss",
+    "*.module.sass",
+    "*.module.less",
+    "*.json",  # For configuration files
+    "*.html",
+    "*.md",  # For documentation
+]
 
-    # Frontend-specific exclusions when processing frontend folder
-    if is_frontend:
-        exclusions = [
-            # Build and cache directories
-            "node_modules",
-            "node_modules/*",
-            ".next",
-            ".next/*",
-            "out",
-            "build",
-            "dist",
-            ".cache",
-            # Generated files
-            "package-lock.json",
-            "yarn.lock",
-            "pnpm-lock.yaml",
-            ".tsbuildinfo",
-            "*.tsbuildinfo",
-            # Test and coverage
-            "coverage",
-            "__tests__/coverage",
-            ".nyc_output",
-            # Static assets
-            "public/images",
-            "public/fonts",
-            "public/*.ico",
-            "public/*.png",
-            "public/*.svg",
-            # IDE and system files
-            ".vscode",
-            ".idea",
-            ".DS_Store",
-            # Storybook
-            "storybook-static",
-            ".storybook-build",
-            # Environment files
-            ".env",
-            ".env.*",
-            # Temporary files
-            "*.log",
-            "npm-debug.log*",
-            "yarn-debug.log*",
-            "yarn-error.log*",
-        ]
-    else:
-        # Default exclusions for non-frontend directories
-        exclusions = [
-            # Project-specific directories
-            "ai_ap_manager",
-            "ai_ap_manager/*",
-            "invoices",
-            "processed_documents",
-            "sample_data",
-            "sample_data/*",
-            "sample_data/**",
-            "sample_data/invoices",
-            "sample_data/invoices/*",
-            "sample_data/invoices/**",
-            "sample_data/demo_inoices",
-            "sample_data/demo_inoices/*",
-            "sample_data/demo_inoices/**",
-            "sample_data/GRNs",
-            "sample_data/GRNs/*",
-            "sample_data/GRNs/**",
-            "sample_data/POs",
-            "sample_data/POs/*",
-            "sample_data/POs/**",
-            "sample_data/pdf_templates.py",
-            # Generated documents and output files
-            "generated_documents",
-            "generated_documents/*",
-            "generated_documents/**",
-            "*.pdf",
-            "REGEN_*.pdf",
-            # Database export files
-            "database_export",
-            "database_export/*",
-            "database_export/**",
-            "database_export/csv",
-            "database_export/csv/*",
-            "database_export/json",
-            "database_export/json/*",
-            "ap_database_master.csv",
-            "ap_database_master.json",
-            "database_summary.txt",
-            "export_summary.json",
-            "alembic",
-            "alembic/*",
-            "alembic/**",
-            "alembic.ini",
-            "alembic.ini/*",
-            "alembic.ini/**",
-            "scripts/",
-            "scripts/alembic/*",
-            "scripts/alembic/**",
-            "scripts/alembic.ini",
-            "scripts/alembic.ini/*",
-            "scripts/alembic.ini/**",
-            "alembic.ini.py",
-            # Token usage and monitoring files
-            "token_usage",
-            "token_usage/*",
-            "token_usage/**",
-            "job_*.json",
-            "jobs_summary.json",
-            # Script conversion and processing files
-            "scripts/converted",
-            "scripts/converted/*",
-            "scripts/converted/**",
-            "scripts/to_convert",
-            "scripts/to_convert/*",
-            "scripts/to_convert/**",
-            "scripts/to_convert/processed",
-            "scripts/to_convert/processed/*",
-            "scripts/to_convert/processed/**",
-            # Utility and setup scripts (non-core business logic)
-            "scripts/data_generator.py",
-            "scripts/file_converter.py",
-            "scripts/verify_test_data.py",
-            "export_database.py",
-            "make_ingest.py",
-            "run_fresh.py",
-            "run.py",
-            "start_gunicorn.sh",
-            # Database files
-            "*.sqlite3",
-            "*.sqlite",
-            "ap_data.db",
-            "chroma.sqlite3",
-            # Python-related
-            "__pycache__",
-            "__pycache__/*",
-            "*/__pycache__",
-            "*/__pycache__/*",
-            "**/__pycache__/**",
-            "*.pyc",
-            "*.pyo",
-            "*.egg-info",
-            ".pytest_cache",
-            "venv",
-            "venv/*",
-            ".venv",
-            "env",
-            ".env",
-            # Poetry and dependency management
-            "poetry.lock",
-            "*/poetry.lock",
-            "ai_ap_manager/*/poetry.lock",
-            # Database and vector store files (ai_ap_manager specific)
-            "chroma_db",
-            "chroma_db/*",
-            "*/chroma_db",
-            "*/chroma_db/*",
-            "**/chroma_db/**",
-            "ai_ap_manager/*/chroma_db",
-            "ai_ap_manager/*/chroma_db/*",
-            # Binary data files (vector store related)
-            "*.bin",
-            "data_level0.bin",
-            "ai_ap_manager/",
-            "ai_ap_manager/*",
-            "header.bin",
-            "length.bin",
-            "link_lists.bin",
-            # Version control
-            ".git",
-            ".gitignore",
-            # System files
-            ".DS_Store",
-            "Thumbs.db",
-            "desktop.ini",
-            # Build and distribution
-            "build",
-            "dist",
-            "*.egg",
-            # Logs and temporary files
-            "*.log",
-            "*.tmp",
-            "*.temp",
-            "logs",
-            # Documentation and media files
-            "*.doc",
-            "*.docx",
-            "*.xls",
-            "*.xlsx",
-            "*.ppt",
-            "*.pptx",
-            "*.png",
-            "*.jpg",
-            "*.jpeg",
-            "*.gif",
-            "DOCKER_GUIDE.md",
-            "FEATURES.md",
-            "*.svg",
-            "*.ico",
-            "favicon.png",
-            "favicon.ico",
-            # IDE and editor files
-            ".vscode",
-            ".idea",
-            "*.swp",
-            "*.swo",
-            # Node.js and React/Next.js related - more comprehensive exclusions
-            "node_modules",
-            "node_modules/*",
-            "*/node_modules",
-            "*/node_modules/*",
-            "**/node_modules/**",
-            "frontend/node_modules",
-            "frontend/node_modules/*",
-            "frontend/package-lock.json",
-            "frontend/yarn.lock",
-            "frontend/pnpm-lock.yaml",
-            "frontend/.next",
-            "frontend/.next/*",
-            "frontend/.next/**",
-            "frontend/public",
-            "frontend/public/*",
-            "frontend/public/**",
-            "frontend/.nuxt",
-            "frontend/.nuxt/*",
-            "frontend/out",
-            "frontend/out/*",
-            "frontend/build",
-            "frontend/dist",
-            "frontend/.cache",
-            "frontend/.parcel-cache",
-            "frontend/.vercel",
-            "frontend/.netlify",
-            "frontend/coverage",
-            "frontend/.nyc_output",
-            "frontend/.storybook-build",
-            "frontend/storybook-static",
-            "frontend/.turbo",
-            "frontend/.swc",
-            "frontend/.tsbuildinfo",
-            "frontend/*.tsbuildinfo",
-            "frontend/copy-pdf-worker.js",
-            "frontend/next-env.d.ts",
-            "npm-debug.log",
-            "yarn-error.log",
-            "package-lock.json",
-            "yarn.lock",
-            "pnpm-lock.yaml",
-            ".next",
-            ".next/*",
-            ".next/**",
-            ".nuxt",
-            ".nuxt/*",
-            "out",
-            "out/*",
-            "build",
-            "dist",
-            ".cache",
-            ".parcel-cache",
-            ".vercel",
-            ".netlify",
-            "coverage",
-            ".nyc_output",
-            ".storybook-build",
-            "storybook-static",
-            ".turbo",
-            ".swc",
-            ".tsbuildinfo",
-            "*.tsbuildinfo",
-            # Frontend build artifacts and static files
-            "build-manifest.json",
-            "app-build-manifest.json",
-            "fallback-build-manifest.json",
-            "next-minimal-server.js.nft.json",
-            "next-server.js.nft.json",
-            "export-marker.json",
-            "images-manifest.json",
-            "prerender-manifest.json",
-            "routes-manifest.json",
-            "required-server-files.json",
-            "app-path-routes-manifest.json",
-            "react-loadable-manifest.json",
-            "BUILD_ID",
-            "trace",
-            "transform.js",
-            "transform.js.map",
-            "pdf.worker.mjs",
-            "pdf.worker.min.mjs",
-            "logo.svg",
-            "logo-dark.svg",
-            # Archives
-            "*.zip",
-            "*.tar",
-            "*.tar.gz",
-            "*.rar",
-            "*.7z",
-            # CSV and data files (non-core)
-            "*.csv",
-            "grns.csv",
-            "pos.json",
-            "GRN_Header.csv",
-            "GRN_LineItem.csv",
-            "PO_Header.csv",
-            "PO_LineItem.csv",
-            "QC_RangIndia.csv",
-            "QC_mahawat.pdf",
-            "contract_*.pdf",
-            "invoice_*.pdf",
-            "Sindri*.pdf",
-        ]
 
+def build_patterns(exclude_exts=None, is_frontend=False):
+    """Returns the (exclusions, includes) glob patterns for a digest run."""
+    exclusions = list(FRONTEND_EXCLUSIONS if is_frontend else DEFAULT_EXCLUSIONS)
     if exclude_exts:
         # Format extensions as "*.ext" and add to exclusions
         exclusions.extend(f"*{ext}" for ext in exclude_exts)
+    includes = list(FRONTEND_INCLUDES) if is_frontend else []
+    return exclusions, includes
+
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def glob_to_regex(glob):
+    """Translates a gitignore-style glob: "*" and "?" stay in one component, "**" spans them."""
+    parts = []
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif glob[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif glob[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif glob[i] == "[" and "]" in glob[i + 2 :]:
+            end = glob.index("]", i + 2)
+            chars = glob[i + 1 : end]
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            parts.append(f"[{chars}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(glob[i]))
+            i += 1
+    return "".join(parts)
+
+
+def canonical_pattern(pattern):
+    """
+    Normalises a gitignore-style pattern (the syntax gitingest accepts) to a canonical
+    rule: "name" or "name/" (directories only) matches a path component at any depth,
+    "/a/b" or "/a/b/" is anchored at the root. Returns None for blanks and comments.
+    """
+    pattern = pattern.strip()
+    if not pattern or pattern.startswith("#"):
+        return None
+    body = pattern.strip("/")
+    dir_only = pattern.endswith("/")
+    anchored = pattern.startswith("/")
+    # "x/*" and "x/**" leave nothing of x in a digest, exactly like the rule "x/".
+    while body.endswith(("/**", "/*")):
+        body = body.rpartition("/")[0]
+        dir_only = True
+    if body.startswith("**/") and "/" not in body[3:]:
+        body = body[3:]
+    elif "/" in body:
+        anchored = True
+    if not body:
+        return None
+    return f"{'/' if anchored else ''}{body}{'/' if dir_only else ''}"
+
+
+def _broader_rule(rule, rules):
+    """A rule in `rules` that already excludes everything `rule` does, if there is one."""
+    dir_only = rule.endswith("/")
+    anchored = rule.startswith("/")
+    if dir_only and rule[:-1] in rules:
+        return rule[:-1]
+    segments = rule.strip("/").split("/")
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if anchored and not last:
+            prefix = "/" + "/".join(segments[: i + 1])
+            for candidate in (prefix, prefix + "/"):
+                if candidate in rules:
+                    return candidate
+        # Names excluded at any depth: the segment itself, or a "*.ext" it ends with.
+        names = [segment] + [
+            "*" + segment[dot:]
+            for dot in range(1, len(segment))
+            if segment[dot] == "." and not _GLOB_CHARS.search(segment[dot:])
+        ]
+        for name in names:
+            for candidate in (name, name + "/") if dir_only or not last else (name,):
+                if candidate != rule and candidate in rules:
+                    return candidate
+    return None
+
+
+def normalise_patterns(patterns):
+    """
+    Returns {canonical rule: [original patterns]}, in first-seen order, with duplicates
+    merged and rules dropped when a broader one covers them (e.g. "sample_data/invoices/**"
+    under "sample_data", or "frontend/.next" under ".next").
+    """
+    rules = {}
+    for pattern in patterns:
+        rule = canonical_pattern(pattern)
+        if rule is not None:
+            rules.setdefault(rule, []).append(pattern)
+    kept = {}
+    for rule, originals in rules.items():
+        target = rule
+        while (broader := _broader_rule(target, rules)) is not None:
+            target = broader
+        kept.setdefault(target, []).extend(originals)
+    return kept
+
+
+class PatternMatcher:
+    """
+    A list of gitignore-style patterns compiled once for fast matching. The rules are
+    normalised and deduplicated, then split by how they are checked: literal names and
+    "*.ext" patterns are dict lookups on a path's last component, literal anchored paths
+    are a dict lookup on the whole path, and the remaining globs form one combined regex
+    for names and one for paths.
+    `match` looks only at the last component of a path and assumes its parent directories
+    were checked already, as they are when a walk prunes excluded directories.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.rules = normalise_patterns(self.patterns)
+        # Each lookup exists twice: for files, and for directories (which also match "x/" rules).
+        self._names, self._dir_names = {}, {}
+        self._extensions, self._dir_extensions = {}, {}
+        self._paths, self._dir_paths = {}, {}
+        name_globs, path_globs = [], []
+        for rule in self.rules:
+            body = rule.strip("/")
+            dir_only = rule.endswith("/")
+            if rule.startswith("/"):
+                if _GLOB_CHARS.search(body):
+                    path_globs.append((rule, body, dir_only))
+                    continue
+                lookups = (self._dir_paths, self._paths)
+                key = body
+            elif body.startswith("*.") and not _GLOB_CHARS.search(body[1:]):
+                lookups = (self._dir_extensions, self._extensions)
+                key = body[1:]
+            elif _GLOB_CHARS.search(body):
+                name_globs.append((rule, body, dir_only))
+                continue
+            else:
+                lookups = (self._dir_names, self._names)
+                key = body
+            lookups[0].setdefault(key, rule)
+            if not dir_only:
+                lookups[1].setdefault(key, rule)
+
+        self._groups = {}
+        self._name_regex, self._dir_name_regex = self._combine(name_globs, "n")
+        self._path_regex, self._dir_path_regex = self._combine(path_globs, "p")
+
+    def _combine(self, globs, prefix):
+        """One regex for files and one for directories, with a named group per rule."""
+        alternatives = []
+        for i, (rule, body, dir_only) in enumerate(globs):
+            group = f"{prefix}{i}"
+            self._groups[group] = rule
+            alternatives.append((f"(?P<{group}>{glob_to_regex(body)})", dir_only))
+        files = "|".join(regex for regex, dir_only in alternatives if not dir_only)
+        dirs = "|".join(regex for regex, _ in alternatives)
+        return (
+            re.compile(files) if files else None,
+            re.compile(dirs) if dirs else None,
+        )
+
+    def match(self, path, is_dir=False):
+        """The rule matching the last component of `path` (relative, "/"-separated), or None."""
+        name = path.rpartition("/")[2]
+        if is_dir:
+            names, extensions, paths = (
+                self._dir_names,
+                self._dir_extensions,
+                self._dir_paths,
+            )
+            name_regex, path_regex = self._dir_name_regex, self._dir_path_regex
+        else:
+            names, extensions, paths = self._names, self._extensions, self._paths
+            name_regex, path_regex = self._name_regex, self._path_regex
+
+        rule = names.get(name) or paths.get(path)
+        if rule:
+            return rule
+        if extensions:
+            dot = name.find(".")
+            while dot != -1:
+                rule = extensions.get(name[dot:])
+                if rule:
+                    return rule
+                dot = name.find(".", dot + 1)
+        if name_regex is not None and (m := name_regex.fullmatch(name)):
+            return self._groups[m.lastgroup]
+        if path_regex is not None and (m := path_regex.fullmatch(path)):
+            return self._groups[m.lastgroup]
+        return None
+
+    def first_match(self, path, is_dir=False):
+        """
+        Checks `path` and each of its parent directories, outermost first.
+        Returns (matched path, rule) for the first one that matches, or None.
+        """
+        parts = path.strip("/").split("/")
+        for i in range(len(parts)):
+            prefix = "/".join(parts[: i + 1])
+            rule = self.match(prefix, is_dir or i < len(parts) - 1)
+            if rule:
+                return prefix, rule
+        return None
+
+
+def explain(paths, exclude_exts=None, is_frontend=False, root="."):
+    """Prints which rule, and which of the original patterns, decides each path."""
+    exclusions, includes = build_patterns(exclude_exts, is_frontend)
+    exclude = PatternMatcher(exclusions)
+    include = PatternMatcher(includes) if includes else None
+    print(
+        f"{len(exclusions)} exclusion patterns compiled into {len(exclude.rules)} rules"
+    )
+    for path in paths:
+        is_dir = path.endswith("/") or os.path.isdir(os.path.join(root, path))
+        path = path.replace(os.sep, "/").removeprefix("./").strip("/")
+        found = exclude.first_match(path, is_dir)
+        if found:
+            matched, rule = found
+            patterns = ", ".join(repr(p) for p in exclude.rules[rule])
+            where = "" if matched == path else f" on '{matched}/'"
+            print(f"❌ {path}: excluded by rule '{rule}'{where} (patterns: {patterns})")
+        elif include and not is_dir and not include.first_match(path):
+            print(f"❌ {path}: matches none of the include patterns")
+        else:
+            print(f"✅ {path}: included")
+
+
+# --- Native Digest Engine ---
+
+
+def _sort_key(node):
+    # gitingest's order: README, files, hidden files, directories, hidden directories.
+    name = node["name"].lower()
+    if node["type"] == "dir":
+        return (4 if name.startswith(".") else 3, name)
+    if name == "readme" or name.startswith("readme."):
+        return (0, name)
+    return (2 if name.startswith(".") else 1, name)
+
+
+def scan_tree(
+    root,
+    exclude,
+    include=None,
+    max_file_size=DIGEST_MAX_FILE_SIZE,
+    truncate=False,
+    skipped=None,
+    rel_dir="",
+):
+    """
+    Walks `root` with os.scandir and returns a directory node
+    {"name", "path", "type", "children"} holding the files to digest, sorted as gitingest
+    sorts them. `exclude` and `include` are PatternMatchers; excluded directories are
+    pruned without being entered, and directories left without files are dropped.
+    Files over `max_file_size` are left out (and listed in `skipped`) unless `truncate`.
+    """
+    children = []
+    try:
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            entries = list(it)
+    except OSError as e:
+        print(f"⚠️  Skipping {rel_dir or root}: {e}", file=sys.stderr)
+        entries = []
+
+    for entry in entries:
+        rel_path = rel_dir + entry.name
+        if entry.is_symlink():
+            kind = "symlink"
+        elif entry.is_dir(follow_symlinks=False):
+            if exclude.match(rel_path, is_dir=True):
+                continue
+            node = scan_tree(
+                root, exclude, include, max_file_size, truncate, skipped, rel_path + "/"
+            )
+            if node["children"]:
+                children.append(node)
+            continue
+        elif entry.is_file(follow_symlinks=False):
+            kind = "file"
+        else:
+            continue
+        if exclude.match(rel_path):
+            continue
+        if include is not None and not include.first_match(rel_path):
+            continue
+        node = {"name": entry.name, "path": rel_path, "type": kind}
+        if kind == "file":
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_size > max_file_size and not truncate:
+                if skipped is not None:
+                    skipped.append(rel_path)
+                continue
+            node["size"], node["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+        children.append(node)
+
+    children.sort(key=_sort_key)
+    name = os.path.basename(rel_dir.rstrip("/")) or os.path.basename(
+        os.path.abspath(root)
+    )
+    return {"name": name, "path": rel_dir, "type": "dir", "children": children}
+
+
+def iter_tree_lines(node, prefix="", is_last=True):
+    """The "Directory structure" lines, drawn like gitingest's tree."""
+    if node["type"] == "dir":
+        display_name = node["name"] + "/"
+    elif node["type"] == "symlink":
+        display_name = f"{node['name']} -> {os.path.basename(node['target'])}"
+    else:
+        display_name = node["name"]
+    yield f"{prefix}{'└── ' if is_last else '├── '}{display_name}\n"
+    children = node.get("children", ())
+    prefix += "    " if is_last else "│   "
+    for i, child in enumerate(children):
+        yield from iter_tree_lines(child, prefix, i == len(children) - 1)
+
+
+def iter_files(node):
+    """The file and symlink nodes under `node`, in digest order."""
+    for child in node["children"]:
+        if child["type"] == "dir":
+            yield from iter_files(child)
+        else:
+            yield child
+
+
+def decode_content(data, final=True):
+    """
+    Decodes file bytes (or a memoryview) for the digest, or returns the placeholder
+    gitingest uses. With final=False, a multi-byte character cut off at the end is dropped.
+    """
+    if not data:
+        return "[Empty file]"
+    try:
+        # An incremental decode tolerates a multi-byte character cut by the sample boundary.
+        codecs.getincrementaldecoder("utf-8")().decode(
+            data[:BINARY_SNIFF_SIZE], final=False
+        )
+    except UnicodeDecodeError:
+        return "[Binary file]"
+    for encoding in ENCODINGS:
+        try:
+            text = codecs.getincrementaldecoder(encoding)().decode(data, final=final)
+        except UnicodeDecodeError:
+            continue
+        # Newlines are normalised as when gitingest reads the file in text mode.
+        return text.replace("\r\n", "\n").replace("\r", "\n")
+    return "Error: Unable to decode file with available encodings"
+
+
+def _render_content(header, data, known, max_file_size):
+    """render_file's result for `data`, the bytes of a whole file, truncated if over the cap."""
+    truncated = len(data) > max_file_size
+    kept = data[:max_file_size] if truncated else data
+    digest = hashlib.sha256(kept)
+    if truncated:
+        # Only the kept bytes are hashed, plus the total size that the marker shows.
+        digest.update(f"\0{len(data)}".encode("ascii"))
+    sha256 = digest.hexdigest()
+    if known is not None and known[2] == sha256:
+        return None, sha256
+    content = decode_content(kept, final=not truncated)
+    if truncated:
+        content += f"\n[... truncated: first {len(kept):,} of {len(data):,} bytes]"
+    return f"{SEPARATOR}\n{header}\n{SEPARATOR}\n{content}\n\n", sha256
+
+
+def render_file(root, node, known=None, max_file_size=DIGEST_MAX_FILE_SIZE):
+    """
+    One file's digest section, a header followed by its decoded content, returned as
+    (section, sha256 of the file). `known` is the cache's (size, mtime_ns, sha256) for the
+    file: if the file is unchanged the section is None, and it is never decoded.
+    Files over `max_file_size` are cut there; large files are memory-mapped, so only the
+    part that is kept is ever read.
+    """
+    if node["type"] == "symlink":
+        header = f"SYMLINK: {node['path']} -> {os.path.basename(node['target'])}"
+        return f"{SEPARATOR}\n{header}\n{SEPARATOR}\n\n\n", None
+    if known is not None and known[:2] == (node["size"], node["mtime_ns"]):
+        return None, known[2]
+
+    header = f"FILE: {node['path']}"
+    try:
+        with open(os.path.join(root, node["path"]), "rb") as f:
+            if node["size"] < DIGEST_MMAP_THRESHOLD:
+                return _render_content(header, f.read(), known, max_file_size)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as data:
+                    return _render_content(header, data, known, max_file_size)
+    except (OSError, ValueError):
+        # ValueError: the file was emptied after the scan and can no longer be mapped.
+        return f"{SEPARATOR}\n{header}\n{SEPARATOR}\nError reading file\n\n", None
+
+
+# --- Git Index Enumeration ---
+
+_INDEX_ENTRY = struct.Struct(">10I20sH")
+_S_IFMT, _S_IFREG, _S_IFLNK = 0o170000, 0o100000, 0o120000
+
+
+def find_git_dir(path):
+    """Returns (work tree root, git directory) of the repository containing `path`, or None."""
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return path, dot_git
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules: ".git" is a file pointing at the real directory.
+            with open(dot_git, encoding="utf-8") as f:
+                target = f.read().strip().removeprefix("gitdir:").strip()
+            return path, os.path.normpath(os.path.join(path, target))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def read_git_index(git_dir):
+    """
+    Reads the paths of regular files and symlinks in the git index (versions 2 to 4)
+    without running git. Returns {path: "file" | "symlink"}, relative to the work tree.
+    Submodules, sparse directory entries and skip-worktree files are left out.
+    """
+    with open(os.path.join(git_dir, "index"), "rb") as f:
+        data = f.read()
+    signature, version, count = struct.unpack_from(">4sII", data)
+    if signature != b"DIRC" or version not in (2, 3, 4):
+        raise ValueError(
+            f"unsupported git index (signature {signature!r}, version {version})"
+        )
+
+    paths, offset, previous = {}, 12, b""
+    for _ in range(count):
+        fields = _INDEX_ENTRY.unpack_from(data, offset)
+        mode, flags = fields[6], fields[11]
+        start = offset + _INDEX_ENTRY.size
+        skip_worktree = False
+        if flags & 0x4000:  # extended flags (version 3 and later)
+            skip_worktree = bool(struct.unpack_from(">H", data, start)[0] & 0x4000)
+            start += 2
+        if version == 4:
+            # The path shares all but the last N bytes of the previous one (N as git's varint).
+            byte = data[start]
+            start += 1
+            strip = byte & 0x7F
+            while byte & 0x80:
+                byte = data[start]
+                start += 1
+                strip = ((strip + 1) << 7) | (byte & 0x7F)
+            end = data.index(b"\0", start)
+            path = previous[: len(previous) - strip] + data[start:end]
+            offset = end + 1
+        else:
+            end = data.index(b"\0", start)
+            path = data[start:end]
+            # Entries are NUL-padded to a multiple of 8 bytes.
+            offset += (end - offset + 8) & ~7
+        previous = path
+        kind = {_S_IFREG: "file", _S_IFLNK: "symlink"}.get(mode & _S_IFMT)
+        if kind and not skip_worktree:
+            paths[os.fsdecode(path)] = kind
+
+    # Extensions follow until the trailing checksum; with a split index most entries
+    # live in a separate shared index, which is not read here.
+    while offset + 8 <= len(data) - 20:
+        name, size = struct.unpack_from(">4sI", data, offset)
+        if name == b"link":
+            raise ValueError("split git index (core.splitIndex) is not supported")
+        offset += 8 + size
+    return paths
+
+
+class GitIgnore:
+    """
+    The ignore rules of one directory level: a .gitignore file (or .git/info/exclude),
+    with patterns relative to `base`. As in git, the last matching rule wins and a "!"
+    rule re-includes what an earlier one ignored.
+    """
+
+    def __init__(self, base, lines):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            # A backslash escapes a leading "#" or "!"; unescaped trailing spaces are dropped.
+            line = line.removeprefix("\\")
+            line = line.rstrip(" ") if not line.endswith("\\ ") else line
+            dir_only = line.endswith("/")
+            body = line.strip("/")
+            if not body:
+                continue
+            anchored = "/" in line.rstrip("/")
+            self.rules.append(
+                (re.compile(glob_to_regex(body)), anchored, dir_only, negate)
+            )
+
+    @classmethod
+    def load(cls, path, base):
+        try:
+            with open(path, encoding="utf-8", errors="surrogateescape") as f:
+                return cls(base, f.readlines())
+        except OSError:
+            return None
+
+    def match(self, path, is_dir):
+        """True if ignored, False if re-included, None if no rule here matches."""
+        local = path[len(self.base) :]
+        name = local.rpartition("/")[2]
+        result = None
+        for regex, anchored, dir_only, negate in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(local if anchored else name):
+                result = not negate
+        return result
+
+
+def is_gitignored(levels, path, is_dir):
+    """Checks the GitIgnore levels deepest first; the first one with a matching rule decides."""
+    for level in reversed(levels):
+        result = level.match(path, is_dir)
+        if result is not None:
+            return result
+    return False
+
+
+def _walk_untracked(root, rel_dir, levels, exclude, prefix):
+    """
+    Yields (path, kind) for the files under root/rel_dir that .gitignore does not ignore.
+    Ignored and excluded directories are pruned; gitignore paths carry the repository
+    `prefix` of root.
+    """
+    ignore = GitIgnore.load(os.path.join(root, rel_dir, ".gitignore"), prefix + rel_dir)
+    if ignore is not None:
+        levels = levels + [ignore]
+    try:
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            entries = list(it)
+    except OSError:
+        return
+    for entry in entries:
+        rel_path = rel_dir + entry.name
+        if entry.is_symlink():
+            kind = "symlink"
+        elif entry.is_dir(follow_symlinks=False):
+            if (
+                entry.name == ".git"
+                or exclude.match(rel_path, is_dir=True)
+                or is_gitignored(levels, prefix + rel_path, True)
+                # A nested repository's files are not part of this one.
+                or os.path.exists(os.path.join(entry.path, ".git"))
+            ):
+                continue
+            yield from _walk_untracked(root, rel_path + "/", levels, exclude, prefix)
+            continue
+        elif entry.is_file(follow_symlinks=False):
+            kind = "file"
+        else:
+            continue
+        if not is_gitignored(levels, prefix + rel_path, False):
+            yield rel_path, kind
 
-    if is_frontend:
-        # Include only relevant frontend code files
-        include_patterns = [
-            "*.tsx",
-            "*.ts",
-            "*.jsx",
-            "*.js",
-            "*.css",
-            "*.scss",
-            "*.sass",
-            "*.less",
-            "*.module.css",
-            "*.module.scss",
-            "*.module.sass",
-            "*.module.less",
-            "*.json",  # For configuration files
-            "*.html",
-            "*.md",  # For documentation
+
+def build_tree(root, nodes):
+    """Assembles file nodes into sorted directory nodes, the structure scan_tree returns."""
+    name = os.path.basename(os.path.abspath(root))
+    tree = {"name": name, "path": "", "type": "dir", "children": []}
+    directories = {"": tree}
+
+    def directory(rel_dir):
+        if rel_dir not in directories:
+            parent = directory(
+                rel_dir[:-1].rpartition("/")[0] + "/" if "/" in rel_dir[:-1] else ""
+            )
+            name = rel_dir[:-1].rpartition("/")[2]
+            directories[rel_dir] = {
+                "name": name,
+                "path": rel_dir,
+                "type": "dir",
+                "children": [],
+            }
+            parent["children"].append(directories[rel_dir])
+        return directories[rel_dir]
+
+    for node in nodes:
+        rel_dir = node["path"].rpartition("/")[0]
+        directory(rel_dir + "/" if rel_dir else "")["children"].append(node)
+    for node in directories.values():
+        node["children"].sort(key=_sort_key)
+    return tree
+
+
+def git_tree(
+    root,
+    exclude,
+    include=None,
+    max_file_size=DIGEST_MAX_FILE_SIZE,
+    truncate=False,
+    skipped=None,
+    untracked=False,
+):
+    """
+    Builds the same tree as scan_tree from the git index instead of walking the disk:
+    only tracked files are candidates (plus, with `untracked`, untracked files that
+    .gitignore does not ignore), so ignored build output is never visited or stat-ed.
+    The exclusion rules still apply. Raises ValueError if `root` is not in a git work tree
+    or the index cannot be read.
+    """
+    found = find_git_dir(root)
+    if found is None:
+        raise ValueError(f"{root} is not inside a git work tree")
+    work_tree, git_dir = found
+    prefix = os.path.relpath(os.path.abspath(root), work_tree).replace(os.sep, "/")
+    prefix = "" if prefix == "." else prefix + "/"
+    try:
+        index = read_git_index(git_dir)
+    except (OSError, struct.error) as e:
+        raise ValueError(f"cannot read the git index: {e}")
+    candidates = {
+        path[len(prefix) :]: kind
+        for path, kind in index.items()
+        if path.startswith(prefix)
+    }
+
+    if untracked:
+        levels = [GitIgnore.load(os.path.join(git_dir, "info", "exclude"), "")]
+        parts = prefix.split("/")[:-1]
+        for depth in range(len(parts)):
+            base = "".join(part + "/" for part in parts[:depth])
+            levels.append(
+                GitIgnore.load(os.path.join(work_tree, base, ".gitignore"), base)
+            )
+        levels = [level for level in levels if level is not None]
+        for path, kind in _walk_untracked(root, "", levels, exclude, prefix):
+            candidates.setdefault(path, kind)
+
+    excluded_dirs = {"": False}
+
+    def is_excluded_dir(rel_dir):
+        # Each directory is matched once, parents first, as if the walk had pruned it.
+        if rel_dir not in excluded_dirs:
+            parent, _, _ = rel_dir[:-1].rpartition("/")
+            excluded_dirs[rel_dir] = is_excluded_dir(
+                parent + "/" if parent else ""
+            ) or bool(exclude.match(rel_dir[:-1], is_dir=True))
+        return excluded_dirs[rel_dir]
+
+    nodes = []
+    for path, kind in candidates.items():
+        rel_dir, _, name = path.rpartition("/")
+        if is_excluded_dir(rel_dir + "/" if rel_dir else "") or exclude.match(path):
+            continue
+        if include is not None and not include.first_match(path):
+            continue
+        node = {"name": name, "path": path, "type": kind}
+        try:
+            stat = os.lstat(os.path.join(root, path))
+        except OSError:
+            continue  # deleted from the work tree
+        # The index records the type the path had when it was added.
+        if not (S_ISLNK if kind == "symlink" else S_ISREG)(stat.st_mode):
+            continue
+        if kind == "file":
+            if stat.st_size > max_file_size and not truncate:
+                if skipped is not None:
+                    skipped.append(path)
+                continue
+            node["size"], node["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+        nodes.append(node)
+    return build_tree(root, nodes)
+
+
+# --- Token Budget ---
+
+
+def estimate_tokens(text):
+    """A fast approximate token count: the length divided by DIGEST_CHARS_PER_TOKEN."""
+    return math.ceil(len(text) / DIGEST_CHARS_PER_TOKEN)
+
+
+def _max_chars(node, max_file_size):
+    """
+    An upper bound of the characters a node adds to a chunk, from its path and size alone:
+    its tree line (indentation is at most 2 characters per path character) and, for a
+    file, its section (decoding never yields more characters than bytes).
+    """
+    chars = 3 * len(node["path"]) + 16
+    if node["type"] != "dir":
+        chars += 2 * len(SEPARATOR) + len(node["path"]) + 96
+        chars += min(node.get("size", 0), max_file_size)
+    return chars
+
+
+def plan_chunks(tree, max_tokens, max_file_size=DIGEST_MAX_FILE_SIZE):
+    """
+    Splits the files under `tree` into chunks of at most `max_tokens` estimated tokens,
+    keeping digest order. A directory stays in one chunk whenever it fits in one, so only
+    directories too large for any chunk are split, and a single file over the budget
+    gets a chunk of its own. Estimates come from file sizes, before anything is read.
+    """
+    costs = {}
+
+    def cost(node):
+        costs[id(node)] = math.ceil(
+            _max_chars(node, max_file_size) / DIGEST_CHARS_PER_TOKEN
+        ) + sum(cost(child) for child in node.get("children", ()))
+        return costs[id(node)]
+
+    cost(tree)
+    chunks, used = [[]], 0
+
+    def place(node):
+        nonlocal used
+        node_cost = costs[id(node)]
+        if used + node_cost > max_tokens:
+            if node["type"] == "dir" and node_cost > max_tokens:
+                for child in node["children"]:
+                    place(child)
+                return
+            if chunks[-1]:
+                chunks.append([])
+                used = 0
+        chunks[-1].extend(iter_files(node) if node["type"] == "dir" else [node])
+        used += node_cost
+
+    place(tree)
+    return chunks
+
+
+def subtree(tree, paths):
+    """A copy of the directory `tree` keeping only the files whose path is in `paths`."""
+    # Only the directories leading to those files are visited.
+    directories = {
+        path[: i + 1] for path in paths for i, char in enumerate(path) if char == "/"
+    }
+
+    def prune(node):
+        children = []
+        for child in node["children"]:
+            if child["type"] == "dir":
+                if child["path"] not in directories:
+                    continue
+                child = prune(child)
+            elif child["path"] not in paths:
+                continue
+            children.append(child)
+        return {**node, "children": children}
+
+    return prune(tree)
+
+
+def chunk_files(output_file, count):
+    """The numbered chunk files for `output_file` (digest.txt -> digest-001.txt, ...)."""
+    stem, ext = os.path.splitext(output_file)
+    return [f"{stem}-{index:03d}{ext}" for index in range(1, count + 1)]
+
+
+def manifest_file(output_file):
+    return os.path.splitext(output_file)[0] + ".manifest.json"
+
+
+# --- Digest Cache ---
+
+
+def config_hash(
+    exclusions, includes, max_file_size=DIGEST_MAX_FILE_SIZE, truncate=False
+):
+    """Identifies everything besides file contents that a cached section depends on."""
+    payload = json.dumps(
+        [
+            DIGEST_FORMAT_VERSION,
+            exclusions,
+            includes,
+            max_file_size,
+            truncate,
+            ENCODINGS,
+        ]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DigestCache:
+    """
+    Rendered file sections from previous runs, stored in a SQLite file by relative path.
+    A section is reused when the file's size and mtime are unchanged or, failing that,
+    when its content hash is. A different config (exclusions, size limit, encodings...)
+    empties the cache, and files no longer in the digest are dropped from it at the end
+    of a run.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS sections (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            section TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path, config):
+        self.path = path
+        self.started_ns = time.time_ns()
+        self.conn = sqlite3.connect(path)
+        # Losing the cache only costs a full render, so durability is traded for speed.
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.executescript(self.SCHEMA)
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'config'"
+        ).fetchone()
+        if row is None or row[0] != config:
+            # The recorded output was rendered with the old config too.
+            self.conn.execute("DELETE FROM sections")
+            self.conn.execute("DELETE FROM meta")
+            self.conn.execute("INSERT INTO meta VALUES ('config', ?)", (config,))
+        # Read by the reader threads; only the main thread touches the connection.
+        self.entries = {
+            path: (size, mtime_ns, sha256)
+            for path, size, mtime_ns, sha256 in self.conn.execute(
+                "SELECT path, size, mtime_ns, sha256 FROM sections"
+            )
+        }
+        self.seen = set()
+        self.stats = {"reused": 0, "rehashed": 0, "rendered": 0}
+
+    def is_racy(self, node):
+        return node.get("mtime_ns", 0) >= self.started_ns - RACY_WINDOW_NS
+
+    def output_unchanged(self, output_file, listing):
+        """
+        True if `output_file` is still the digest this cache last wrote, for the same file
+        listing (paths, sizes, mtimes), so it can be kept as it is.
+        """
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'output'"
+        ).fetchone()
+        try:
+            stat = os.stat(output_file)
+        except OSError:
+            return False
+        current = [
+            os.path.abspath(output_file),
+            stat.st_size,
+            stat.st_mtime_ns,
+            listing,
         ]
+        return row is not None and json.loads(row[0]) == current
+
+    def record_output(self, output_file, listing):
+        stat = os.stat(output_file)
+        value = json.dumps(
+            [os.path.abspath(output_file), stat.st_size, stat.st_mtime_ns, listing]
+        )
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('output', ?)", (value,))
+
+    def resolve(self, node, section, sha256):
+        """
+        Takes render_file's result for `node`: returns the cached section if it was
+        unchanged, and otherwise stores the new one.
+        """
+        path = node["path"]
+        self.seen.add(path)
+        known = self.entries.get(path)
+        # A racily clean file is stored with an impossible mtime, so it is hashed next time.
+        mtime_ns = -1 if self.is_racy(node) else node["mtime_ns"]
+        if section is None:
+            if known[:2] == (node["size"], mtime_ns):
+                self.stats["reused"] += 1
+            else:
+                self.stats["rehashed"] += 1
+                self.conn.execute(
+                    "UPDATE sections SET size = ?, mtime_ns = ? WHERE path = ?",
+                    (node["size"], mtime_ns, path),
+                )
+            return self.conn.execute(
+                "SELECT section FROM sections WHERE path = ?", (path,)
+            ).fetchone()[0]
+        self.stats["rendered"] += 1
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sections VALUES (?, ?, ?, ?, ?)",
+            (path, node["size"], mtime_ns, sha256, section),
+        )
+        return section
+
+    def close(self):
+        stale = [(path,) for path in self.entries.keys() - self.seen]
+        self.conn.executemany("DELETE FROM sections WHERE path = ?", stale)
+        self.conn.commit()
+        self.conn.close()
+
+
+# --- Digest Output ---
+
+
+def ordered_map(executor, fn, items, window, quick=None):
+    """
+    Like executor.map, but with at most `window` results in flight, yielded in order.
+    `quick(item)` is tried first on the calling thread; when it returns a result other
+    than None, the item skips the pool.
+    """
+    pending = deque()
+    for item in items:
+        result = quick(item) if quick is not None else None
+        if result is None:
+            pending.append(executor.submit(fn, item))
+        else:
+            pending.append(Future())
+            pending[-1].set_result(result)
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _inside(source, path):
+    """`path` relative to `source` as an anchored pattern, if it lies inside it."""
+    rel_path = os.path.relpath(os.path.abspath(path), os.path.abspath(source))
+    if rel_path.startswith(".."):
+        return None
+    return "/" + rel_path.replace(os.sep, "/")
+
+
+def _remove_stale_chunks(manifest, keep):
+    """Deletes the chunk files listed in a previous manifest that this run did not write."""
+    try:
+        with open(manifest, encoding="utf-8") as f:
+            previous = json.load(f)["chunks"]
+    except (OSError, ValueError, KeyError):
+        return
+    directory = os.path.dirname(manifest)
+    for chunk in previous:
+        path = os.path.join(directory, chunk["file"])
+        if path not in keep and os.path.exists(path):
+            os.remove(path)
+
+
+def generate_digest(
+    source,
+    output_file="digest.txt",
+    exclude_exts=None,
+    is_frontend=False,
+    workers=DIGEST_WORKERS,
+    cache_file=None,
+    use_cache=True,
+    max_tokens=None,
+    max_file_size=DIGEST_MAX_FILE_SIZE,
+    truncate=False,
+    git=False,
+    untracked=False,
+):
+    """
+    Writes a digest of the local directory `source` in gitingest's format without
+    running gitingest: the tree is walked in-process, files are read and decoded on a
+    thread pool, and sections are streamed to `output_file` in a deterministic order.
+    Sections of unchanged files come from a DigestCache (`cache_file`, by default next
+    to the output).
+    With `max_tokens`, the digest is split into numbered chunk files of at most that many
+    estimated tokens, each with its own tree, and a JSON manifest maps files to chunks.
+    Files over `max_file_size` bytes are skipped, or cut at that size with `truncate`.
+    With `git` (or `untracked`), candidate files come from the git index rather than a
+    walk of the whole directory; see git_tree.
+    Returns {"files", "rendered", "reused", "rehashed", "tokens", "chunks"}.
+    """
+    start = time.perf_counter()
+    exclusions, includes = build_patterns(exclude_exts, is_frontend)
+    cache_file = cache_file or f"{output_file}.cache"
+    cache = None
+    if use_cache:
+        try:
+            cache = DigestCache(
+                cache_file, config_hash(exclusions, includes, max_file_size, truncate)
+            )
+        except sqlite3.DatabaseError as e:
+            print(
+                f"⚠️  Ignoring unreadable digest cache {cache_file}: {e}",
+                file=sys.stderr,
+            )
+
+    # The digest, its chunks, manifest and cache never end up in the digest themselves.
+    manifest = manifest_file(output_file)
+    stem, ext = os.path.splitext(output_file)
+    own_files = [
+        _inside(source, path)
+        for path in (output_file, cache_file, manifest, f"{stem}-*{ext}")
+    ]
+    exclude = PatternMatcher(exclusions + [path for path in own_files if path])
+    include = PatternMatcher(includes) if includes else None
+    skipped = []
+    tree = None
+    if git or untracked:
+        try:
+            tree = git_tree(
+                source, exclude, include, max_file_size, truncate, skipped, untracked
+            )
+        except ValueError as e:
+            print(f"⚠️  {e}; walking the directory instead.", file=sys.stderr)
+    if tree is None:
+        tree = scan_tree(source, exclude, include, max_file_size, truncate, skipped)
+    files = list(iter_files(tree))
+    for node in files:
+        if node["type"] == "symlink":
+            node["target"] = os.readlink(os.path.join(source, node["path"]))
+    if max_tokens:
+        chunks = plan_chunks(tree, max_tokens, max_file_size)
+        outputs = chunk_files(output_file, len(chunks))
+    else:
+        chunks, outputs = [files], [output_file]
+    scanned = time.perf_counter()
+
+    known = cache.entries if cache else {}
+    stats = {"files": len(files), "rendered": 0, "reused": 0, "rehashed": 0}
+    listing = None
+    if (
+        cache is not None
+        and not max_tokens
+        and not any(cache.is_racy(node) for node in files)
+    ):
+        listing = hashlib.sha256(
+            "\n".join(
+                f"{node['path']}\0{node.get('size')}\0{node.get('mtime_ns')}\0{node.get('target')}"
+                for node in files
+            ).encode("utf-8", "surrogateescape")
+        ).hexdigest()
+        if cache.output_unchanged(output_file, listing):
+            cache.seen.update(node["path"] for node in files)
+            cache.close()
+            stats["reused"] = len(files)
+            print(
+                f"✅ {output_file} is up to date: {len(files)} files unchanged "
+                f"({time.perf_counter() - start:.2f}s)"
+            )
+            return stats
+
+    def unchanged(node):
+        entry = known.get(node["path"])
+        if (
+            node["type"] == "file"
+            and entry
+            and entry[:2] == (node["size"], node["mtime_ns"])
+        ):
+            return None, entry[2]
+        return None
+
+    chunk_entries, file_entries = [], {}
+    show_progress = sys.stderr.isatty()
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            results = ordered_map(
+                executor,
+                lambda node: render_file(
+                    source, node, known.get(node["path"]), max_file_size
+                ),
+                files,
+                window=workers * 4,
+                quick=unchanged if cache is not None else None,
+            )
+            for index, (chunk, chunk_file) in enumerate(zip(chunks, outputs), 1):
+                chunk_tree = (
+                    subtree(tree, {node["path"] for node in chunk})
+                    if max_tokens
+                    else tree
+                )
+                header = "Directory structure:\n" + "".join(iter_tree_lines(chunk_tree))
+                chunk_tokens = estimate_tokens(header)
+                with open(chunk_file, "w", encoding="utf-8") as out:
+                    out.write(header)
+                    for node in chunk:
+                        section, sha256 = next(results)
+                        if cache is not None and sha256 is not None:
+                            section = cache.resolve(node, section, sha256)
+                        out.write("\n")
+                        out.write(section)
+                        tokens = estimate_tokens(section)
+                        chunk_tokens += tokens
+                        file_entries[node["path"]] = {
+                            "chunk": index,
+                            "tokens": tokens,
+                            "truncated": node.get("size", 0) > max_file_size,
+                        }
+                        if show_progress and len(file_entries) % 500 == 0:
+                            progress = f"  {len(file_entries)}/{len(files)} files"
+                            print(progress, end="\r", file=sys.stderr)
+                chunk_entries.append(
+                    {
+                        "file": os.path.basename(chunk_file),
+                        "files": len(chunk),
+                        "tokens": chunk_tokens,
+                    }
+                )
+        if listing is not None:
+            cache.record_output(output_file, listing)
+    finally:
+        if cache is not None:
+            cache.close()
+            stats.update(cache.stats)
+        else:
+            stats["rendered"] = len(files)
+    stats["tokens"] = sum(chunk["tokens"] for chunk in chunk_entries)
+    stats["chunks"] = len(chunk_entries)
+
+    if max_tokens:
+        _remove_stale_chunks(manifest, set(outputs))
+        with open(manifest, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "source": os.path.abspath(source),
+                    "max_tokens": max_tokens,
+                    "chars_per_token": DIGEST_CHARS_PER_TOKEN,
+                    "tokens": stats["tokens"],
+                    "chunks": chunk_entries,
+                    "files": file_entries,
+                    "skipped": skipped,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        written = f"{len(outputs)} chunks ({outputs[0]} ... {outputs[-1]}, manifest {manifest})"
+    else:
+        written = output_file
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ Digest written to {written}: {len(files)} files, ~{stats['tokens']:,} tokens, "
+        f"{stats['rendered']} rendered, {stats['reused'] + stats['rehashed']} from cache, "
+        f"{len(skipped)} over {max_file_size:,} bytes skipped "
+        f"(scan {scanned - start:.2f}s, total {elapsed:.2f}s)"
+    )
+    return stats
+
+
+# --- gitingest Subprocess ---
+
+
+def generate_digest_cli(
+    source, output_file="digest.txt", exclude_exts=None, is_frontend=False
+):
+    cmd = ["gitingest", source, "-o", output_file]
+    exclusions, include_patterns = build_patterns(exclude_exts, is_frontend)
+
+    if include_patterns:
         cmd += ["-i", ",".join(include_patterns)]
 
     if exclusions:
@@ -357,14 +1549,39 @@ def generate_digest_cli(
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print(
-            "Usage: python make_ingest.py <path_or_url> [output_file] [--frontend] [excluded_exts...]"
+            "Usage: python make_ingest.py <path_or_url> [output_file] [--frontend] "
+            "[--engine=native|gitingest] [--workers=N] [--cache=FILE] [--no-cache] "
+            "[--max-tokens=N] [--max-file-size=BYTES] [--truncate] [--git] [--untracked] "
+            "[excluded_exts...]\n"
+            "       python make_ingest.py --explain <relative_path>... [--frontend] "
+            "[excluded_exts...]\n"
+            "(paths starting with a dot are given as ./.name, not to be read as extensions)"
         )
         sys.exit(1)
 
+    if sys.argv[1] == "--explain":
+        args = [arg for arg in sys.argv[2:] if arg != "--frontend"]
+        exts = [arg for arg in args if arg.startswith(".") and not arg.startswith("./")]
+        explain(
+            [arg for arg in args if arg not in exts],
+            exclude_exts=exts,
+            is_frontend="--frontend" in sys.argv,
+        )
+        sys.exit(0)
+
     source = sys.argv[1]
     output_file = "digest.txt"
     exclude_exts = []
     is_frontend = False
+    engine = "native"
+    workers = DIGEST_WORKERS
+    cache_file = None
+    use_cache = True
+    max_tokens = None
+    max_file_size = DIGEST_MAX_FILE_SIZE
+    truncate = False
+    git = False
+    untracked = False
 
     # Process arguments
     args = sys.argv[2:]
@@ -372,6 +1589,24 @@ if __name__ == "__main__":
         arg = args.pop(0)
         if arg == "--frontend":
             is_frontend = True
+        elif arg.startswith("--engine="):
+            engine = arg.split("=", 1)[1]
+        elif arg.startswith("--workers="):
+            workers = int(arg.split("=", 1)[1])
+        elif arg.startswith("--cache="):
+            cache_file = arg.split("=", 1)[1]
+        elif arg == "--no-cache":
+            use_cache = False
+        elif arg.startswith("--max-tokens="):
+            max_tokens = int(arg.split("=", 1)[1])
+        elif arg.startswith("--max-file-size="):
+            max_file_size = int(arg.split("=", 1)[1])
+        elif arg == "--truncate":
+            truncate = True
+        elif arg == "--git":
+            git = True
+        elif arg == "--untracked":
+            untracked = True
         elif arg.startswith("."):
             exclude_exts.append(arg)
         else:
@@ -384,4 +1619,21 @@ if __name__ == "__main__":
         is_frontend = True
         print("Detected frontend directory, using frontend-specific processing...")
 
-    generate_digest_cli(source, output_file, exclude_exts, is_frontend)
+    # Remote repositories still need gitingest to clone them.
+    if engine == "gitingest" or not os.path.isdir(source):
+        generate_digest_cli(source, output_file, exclude_exts, is_frontend)
+    else:
+        generate_digest(
+            source,
+            output_file,
+            exclude_exts,
+            is_frontend,
+            workers,
+            cache_file,
+            use_cache,
+            max_tokens,
+            max_file_size,
+            truncate,
+            git,
+            untracked,
+        )
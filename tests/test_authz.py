@@ -0,0 +1,67 @@
+# tests/test_authz.py
+import pytest
+from httpx import AsyncClient
+
+from app.authz import AuthzEngine
+from app.main import app
+from app.security import get_current_user
+
+ADMIN_USER = {
+    "preferred_username": "super_admin",
+    "realm_access": {"roles": ["admin", "offline_access"]},
+}
+REGULAR_USER = {"preferred_username": "super_user", "realm_access": {"roles": []}}
+
+
+def test_permission_matrix_role_only_rules():
+    """
+    Role-only rules are resolved in the matrix; context rules are marked conditional.
+    """
+    engine = AuthzEngine()
+    admin = engine.get_permissions(ADMIN_USER)
+    user = engine.get_permissions(REGULAR_USER)
+
+    assert "/api/admin.*" in admin["allowed"]
+    assert "/api/admin.*" not in user["allowed"] + user["conditional"]
+    assert "/api/items.*" in user["allowed"]
+    # "ANY": ["admin", {claims...}] is decided by the admin role alone.
+    assert "/api/documents/{document_id}" in admin["allowed"]
+    assert "/api/documents/{document_id}" in user["conditional"]
+    # "ALL": ["regional-manager", {claims...}] can never pass without the role.
+    assert "/api/analytics/{region}" not in user["allowed"] + user["conditional"]
+
+
+def test_permission_matrix_rebuilt_only_on_policy_change():
+    """
+    Reloading unchanged policies keeps the precomputed matrix and its versions.
+    """
+    engine = AuthzEngine()
+    matrix = engine._permission_matrix
+    version = engine.get_permissions(ADMIN_USER)["version"]
+    engine.load_policies()
+    assert engine._permission_matrix is matrix
+    assert engine.get_permissions(ADMIN_USER)["version"] == version
+    # Roles unknown to the policy share the same cached entry.
+    assert engine.get_permissions({"realm_access": {"roles": ["other"]}}) is (
+        engine.get_permissions(REGULAR_USER)
+    )
+
+
+@pytest.mark.asyncio
+async def test_my_permissions_etag():
+    """
+    The permissions endpoint returns an ETag and honours If-None-Match.
+    """
+    app.dependency_overrides[get_current_user] = lambda: ADMIN_USER
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            response = await ac.get("/api/me/permissions")
+            assert response.status_code == 200
+            assert "/api/admin.*" in response.json()["allowed"]
+            etag = response.headers["etag"]
+            response = await ac.get(
+                "/api/me/permissions", headers={"If-None-Match": etag}
+            )
+        assert response.status_code == 304
+    finally:
+        app.dependency_overrides.clear()
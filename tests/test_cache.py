@@ -0,0 +1,94 @@
+# tests/test_cache.py
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.cache import EntityCacheRegistry, PostgresNotifyBackend, TTLCache
+from app.core.database import Base
+
+
+def test_ttl_cache_lru_and_expiry():
+    """
+    The least recently used entry is evicted first, and entries expire after their TTL.
+    """
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None and cache.get("a") == 1
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+    assert cache.stats["evictions"] == 2 and cache.stats["expired"] == 1
+
+    # A value loaded before an invalidation is not stored after it.
+    generation = cache.generation
+    cache.invalidate("a")
+    cache.set("a", "stale", generation=generation)
+    assert cache.get("a") is None
+
+
+def test_entity_cache_read_through_and_invalidation():
+    """
+    Rows and misses are cached, and committed writes invalidate them.
+    """
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    registry = EntityCacheRegistry()
+    item_cache = registry.register(models.Item, negative_ttl=60)
+    try:
+        with Session(engine) as db:
+            assert item_cache.get(db, 1) is None
+            assert item_cache.get(db, 1) is None  # negative hit
+            db.add(models.Item(name="First"))
+            db.commit()  # the insert invalidates the cached miss
+            assert item_cache.get(db, 1)["name"] == "First"
+            assert item_cache.get(db, 1)["version"] == 1
+
+            db.get(models.Item, 1).name = "Renamed"
+            db.commit()
+            assert item_cache.get(db, 1)["name"] == "Renamed"
+            assert item_cache.get(db, 1)["version"] == 2
+        stats = registry.stats()["items"]
+        assert (stats["hits"], stats["negative_hits"], stats["misses"]) == (2, 1, 3)
+    finally:
+        registry.close()
+        engine.dispose()
+
+
+def test_postgres_listener_dispatches_notifications():
+    """The LISTEN loop waits on the connection and skips the process's own notifications."""
+    backend = PostgresNotifyBackend()
+    read_fd, write_fd = os.pipe()
+
+    class Connection:
+        notifies = []
+        polls = 0
+
+        def fileno(self):
+            return read_fd
+
+        def poll(self):
+            self.polls += 1
+            if self.polls > 1:
+                raise ConnectionError("closed")
+            for origin, keys in ((backend.origin, [1]), ("other", [2, 3])):
+                payload = json.dumps([origin, "items", keys])
+                self.notifies.append(SimpleNamespace(payload=payload))
+
+    received = []
+    os.write(write_fd, b"x")
+    try:
+        with pytest.raises(ConnectionError):
+            backend._drain(
+                Connection(), lambda namespace, key: received.append((namespace, key))
+            )
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+    assert received == [("items", 2), ("items", 3)]
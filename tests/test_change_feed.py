@@ -0,0 +1,167 @@
+# tests/test_change_feed.py
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.core.cache import InvalidationBackend
+from app.core.change_feed import ChangeFeed, change_feed
+from app.core.database import Base
+from app.main import stream_item_changes
+from app.security import authz_engine
+
+ALICE = {"sub": "alice", "realm_access": {"roles": []}}
+BOB = {"sub": "bob", "realm_access": {"roles": []}}
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'feed.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def make_job(owner_id: str) -> models.Job:
+    now = datetime.now(timezone.utc)
+    return models.Job(
+        kind="report",
+        payload={},
+        owner_id=owner_id,
+        run_after=now,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+async def drain(subscriber) -> list:
+    changes = []
+    while True:
+        try:
+            changes.append(await asyncio.wait_for(subscriber.get(), 0.05))
+        except asyncio.TimeoutError:
+            return changes
+
+
+class RecordingBackend(InvalidationBackend):
+    shared = True
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, namespace: str, keys: list, connection=None):
+        self.published.append((namespace, [key["id"] for key in keys], connection))
+
+
+@pytest.mark.asyncio
+async def test_committed_changes_reach_authorized_subscribers(Session):
+    """
+    Only committed changes are published, and each subscriber only receives the rows
+    its user may GET: job status is restricted to the job's submitter.
+    """
+    feed = ChangeFeed()
+    filter_threads = set()
+
+    def authz_filter(user):
+        allow = feed.authz_filter(authz_engine, user)
+
+        def record_thread(change):
+            filter_threads.add(threading.get_ident())
+            return allow(change)
+
+        return record_thread
+
+    def write():
+        with Session() as db:
+            item = models.Item(name="Widget")
+            db.add_all([item, make_job("alice")])
+            db.commit()
+            item.name = "Gadget"
+            db.add(models.Item(name="Discarded"))
+            db.flush()
+            db.rollback()
+            item = db.get(models.Item, 1)
+            item.description = "Renamed"
+            db.commit()
+
+    try:
+        feed.register(models.Item, path="/api/items/{id}")
+        feed.register(models.Job, path="/api/jobs/{id}")
+        alice = feed.subscribe(authz_filter(ALICE))
+        bob = feed.subscribe(authz_filter(BOB))
+        await asyncio.to_thread(write)
+
+        alice_changes, bob_changes = await drain(alice), await drain(bob)
+        assert [(c["table"], c["op"], c["id"]) for c in alice_changes] == [
+            ("items", "insert", 1),
+            ("jobs", "insert", 1),
+            ("items", "update", 1),
+        ]
+        assert alice_changes[0]["data"] == {"id": 1, "name": "Widget", "version": 1}
+        assert alice_changes[2]["data"]["description"] == "Renamed"
+        assert [(c["table"], c["op"]) for c in bob_changes] == [
+            ("items", "insert"),
+            ("items", "update"),
+        ]
+        # Filtering runs on the subscribers' loop, not on the committing thread.
+        assert filter_threads == {threading.get_ident()}
+    finally:
+        feed.close()
+
+
+def test_changes_are_notified_in_the_writing_transaction(Session):
+    """With a shared backend, each flush publishes its changes on the session's connection."""
+    backend = RecordingBackend()
+    feed = ChangeFeed(backend)
+    try:
+        feed.register(models.Item, path="/api/items/{id}")
+        with Session() as db:
+            db.add_all([models.Item(name="Widget"), models.Item(name="Gadget")])
+            db.flush()
+            connection = db.connection()
+            assert backend.published == [("items", [1, 2], connection)]
+            db.commit()
+        assert len(backend.published) == 1
+    finally:
+        feed.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_evicted():
+    feed = ChangeFeed()
+    try:
+        slow = feed.subscribe(queue_size=2)
+        fast = feed.subscribe(queue_size=10)
+        for n in range(3):
+            feed.dispatch({"table": "items", "op": "update", "id": n, "data": None})
+            await fast.queue.get()
+
+        events = [event async for event in feed.stream(slow)]
+        assert events[-1].startswith("event: evicted")
+        assert len(events) == 2 and feed.evictions == 1
+        assert feed.stats()["subscribers"] == 1
+    finally:
+        feed.close()
+
+
+@pytest.mark.asyncio
+async def test_item_changes_endpoint_streams_server_sent_events(Session):
+    response = await stream_item_changes(ALICE)
+    events = response.body_iterator
+    try:
+        assert response.media_type == "text/event-stream"
+        assert await events.__anext__() == "retry: 3000\n\n"
+        with Session() as db:
+            db.add(models.Item(name="Live"))
+            db.commit()
+        event, data = (await events.__anext__()).strip().split("\n")
+        assert event == "event: insert"
+        assert json.loads(data.removeprefix("data: "))["data"]["name"] == "Live"
+    finally:
+        await events.aclose()
+    assert change_feed.stats()["subscribers"] == 0
@@ -0,0 +1,123 @@
+# tests/test_compression.py
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from httpx import AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app.core.compression import CompressionMiddleware, negotiate_encoding
+from app.core.responses import etag_matches
+
+CHUNKS = [f"line {i}\n".encode() * 50 for i in range(5)]
+
+
+async def stream(request):
+    async def chunks():
+        for chunk in CHUNKS:
+            yield chunk
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+compressed_app = CompressionMiddleware(
+    Starlette(
+        routes=[
+            Route("/small", lambda r: PlainTextResponse("tiny")),
+            Route("/large", lambda r: PlainTextResponse("x" * 5000)),
+            Route("/png", lambda r: Response(b"x" * 5000, media_type="image/png")),
+            Route("/stream", stream),
+        ]
+    ),
+    minimum_size=500,
+    encodings="gzip",
+)
+
+
+def test_negotiate_encoding():
+    """
+    The highest q-value wins, ties follow server preference, and q=0 refuses a coding.
+    """
+    preference = ["zstd", "br", "gzip"]
+    assert negotiate_encoding("gzip, br", preference) == "br"
+    assert negotiate_encoding("gzip;q=1.0, br;q=0.5", preference) == "gzip"
+    assert negotiate_encoding("br;q=0, *", preference) == "zstd"
+    assert negotiate_encoding("identity", preference) is None
+    assert negotiate_encoding("", preference) is None
+
+
+@pytest.mark.asyncio
+async def test_compression_threshold_and_streaming():
+    """
+    Small and already-compressed bodies pass through; large and streamed bodies are
+    gzipped, with streamed chunks flushed individually.
+    """
+    headers = {"Accept-Encoding": "gzip"}
+    async with AsyncClient(app=compressed_app, base_url="http://test") as ac:
+        small = await ac.get("/small", headers=headers)
+        png = await ac.get("/png", headers=headers)
+        large = await ac.get("/large", headers=headers)
+
+    # Drive the stream through the ASGI interface to see each chunk as it is sent.
+    messages = []
+
+    async def receive():
+        await asyncio.Event().wait()  # the client never disconnects
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/stream",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    await compressed_app(scope, receive, send)
+    start_headers = dict(messages[0]["headers"])
+    raw_chunks = [m["body"] for m in messages[1:]]
+
+    assert "content-encoding" not in small.headers and small.text == "tiny"
+    assert "content-encoding" not in png.headers
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.headers["vary"] == "Accept-Encoding"
+    assert int(large.headers["content-length"]) < 5000
+    assert large.text == "x" * 5000
+
+    assert start_headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in start_headers
+    assert len(raw_chunks) > len(CHUNKS) / 2
+    # Each chunk is decodable on arrival, before the stream ends.
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    assert decoder.decompress(raw_chunks[0]) == CHUNKS[0]
+    assert gzip.decompress(b"".join(raw_chunks)) == b"".join(CHUNKS)
+
+
+@pytest.mark.asyncio
+async def test_compressed_representation_gets_its_own_etag():
+    """A gzipped body carries a coding-specific ETag that still validates the resource."""
+    etag = '"0123456789abcdef"'
+    app = CompressionMiddleware(
+        Starlette(
+            routes=[
+                Route(
+                    "/doc",
+                    lambda r: PlainTextResponse("x" * 5000, headers={"ETag": etag}),
+                )
+            ]
+        ),
+        minimum_size=500,
+        encodings="gzip",
+    )
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        compressed = await ac.get("/doc", headers={"Accept-Encoding": "gzip"})
+        identity = await ac.get("/doc", headers={"Accept-Encoding": "identity"})
+    assert identity.headers["etag"] == etag
+    assert compressed.headers["etag"] == '"0123456789abcdef-gzip"'
+    assert etag_matches(compressed.headers["etag"], etag)
+    assert etag_matches(f'W/{compressed.headers["etag"]}, "other"', etag)
+    assert not etag_matches('"0123456789abcdef-other"', etag)
@@ -0,0 +1,54 @@
+# tests/test_geoip.py
+from ipaddress import ip_network
+
+from app.core.geoip import CountryRangeTable, GeoIPResolver
+
+
+def test_range_table_lookups():
+    """
+    The range table merges adjacent ranges and resolves IPv4, IPv6 and mapped addresses.
+    """
+    table = CountryRangeTable(
+        [
+            (ip_network("8.8.0.0/17"), {"country": {"iso_code": "US"}}),
+            (ip_network("8.8.128.0/17"), {"country": {"iso_code": "US"}}),
+            (ip_network("1.0.0.0/24"), {"country": {"iso_code": "AU"}}),
+            (ip_network("2001:db8::/32"), {"country": {"iso_code": "NL"}}),
+            (ip_network("9.0.0.0/8"), {"continent": {"code": "EU"}}),
+        ]
+    )
+    assert len(table) == 3
+    assert table.lookup("8.8.8.8") == "US"
+    assert table.lookup("::ffff:1.0.0.1") == "AU"
+    assert table.lookup("2001:db8::1") == "NL"
+    assert table.lookup("9.9.9.9") is None
+    assert table.lookup("not-an-ip") is None
+    assert table.lookup_many(["2001:db8::1", "8.8.255.255", "bad", "1.0.0.7"]) == [
+        "NL",
+        "US",
+        None,
+        "AU",
+    ]
+
+
+def test_resolver_without_database():
+    """
+    A missing database is opened lazily and reported as unavailable, not raised.
+    """
+    resolver = GeoIPResolver(db_path="/nonexistent/GeoLite2-Country.mmdb")
+    assert resolver.available is False
+    assert resolver.country_code("8.8.8.8") is None
+    assert resolver.country_codes(["8.8.8.8", "1.1.1.1"]) == [None, None]
+
+
+def test_resolver_with_corrupt_database(tmp_path, caplog):
+    """A truncated database is reported once and treated as unavailable."""
+    path = tmp_path / "GeoLite2-Country.mmdb"
+    path.write_bytes(b"\x00" * 64)
+    for use_range_table in (False, True):
+        resolver = GeoIPResolver(db_path=str(path), use_range_table=use_range_table)
+        caplog.clear()
+        assert resolver.available is False
+        assert resolver.country_code("8.8.8.8") is None
+        assert resolver.available is False
+        assert len([r for r in caplog.records if r.levelname == "ERROR"]) == 1
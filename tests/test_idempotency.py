@@ -0,0 +1,198 @@
+# tests/test_idempotency.py
+import asyncio
+import logging
+import time
+
+import pytest
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.responses import JSONResponse
+
+from app import models
+from app.core import idempotency
+from app.core.database import Base, get_db
+from app.core.idempotency import (
+    DatabaseIdempotencyStore,
+    IdempotencyMiddleware,
+    IdempotencyStore,
+    MemoryIdempotencyStore,
+)
+from app.main import app
+from app.security import get_current_user
+
+USER = {
+    "sub": "user-1",
+    "preferred_username": "super_user",
+    "realm_access": {"roles": []},
+}
+
+
+@pytest.mark.asyncio
+async def test_retried_post_creates_one_item():
+    """A retry with the same key replays the stored response; a changed body is rejected."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: USER
+    headers = {"Idempotency-Key": "import-42", "Authorization": "Bearer token"}
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            first = await ac.post(
+                "/api/items/", json={"name": "Widget"}, headers=headers
+            )
+            retry = await ac.post(
+                "/api/items/", json={"name": "Widget"}, headers=headers
+            )
+            changed = await ac.post(
+                "/api/items/", json={"name": "Gadget"}, headers=headers
+            )
+            other = await ac.post(
+                "/api/items/",
+                json={"name": "Widget"},
+                headers={**headers, "Authorization": "x"},
+            )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert first.status_code == retry.status_code == 200
+    assert (
+        retry.json() == first.json() and retry.headers["etag"] == first.headers["etag"]
+    )
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert changed.status_code == 422
+    # Keys are scoped to the credentials: another client's key does not collide.
+    assert other.status_code == 200 and other.json()["id"] != first.json()["id"]
+    with Session() as db:
+        assert db.query(models.Item).count() == 2
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_refused_credentials_are_not_replayed():
+    """A 401 (e.g. a failed token introspection) releases the key for the next attempt."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    attempts = []
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    def authenticate():
+        attempts.append(True)
+        if len(attempts) == 1:
+            raise HTTPException(401, "Token introspection failed: timed out")
+        return USER
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = authenticate
+    headers = {"Idempotency-Key": "import-43", "Authorization": "Bearer token"}
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            refused = await ac.post(
+                "/api/items/", json={"name": "Widget"}, headers=headers
+            )
+            retry = await ac.post(
+                "/api/items/", json={"name": "Widget"}, headers=headers
+            )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert refused.status_code == 401
+    assert retry.status_code == 200 and "idempotent-replayed" not in retry.headers
+    with Session() as db:
+        assert db.query(models.Item).count() == 1
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_the_first_request():
+    calls = []
+    release = asyncio.Event()
+
+    async def handler(scope, receive, send):
+        calls.append(scope["path"])
+        await release.wait()
+        status_code = 503 if scope["path"] == "/fail" else 201
+        await JSONResponse({"call": len(calls)}, status_code=status_code)(
+            scope, receive, send
+        )
+
+    middleware = IdempotencyMiddleware(
+        handler, store=MemoryIdempotencyStore(), wait_timeout=5
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=middleware), base_url="http://test"
+    ) as ac:
+        post = lambda path: ac.post(
+            path, json={}, headers={"Idempotency-Key": path}
+        )  # noqa: E731
+        pending = [asyncio.create_task(post("/create")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        responses = await asyncio.gather(*pending)
+        # Server errors are not stored, so the retry runs the request again.
+        failed = [await post("/fail"), await post("/fail")]
+
+    assert calls == ["/create", "/fail", "/fail"]
+    assert [r.status_code for r in responses] == [201, 201, 201]
+    assert {r.json()["call"] for r in responses} == {1}
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 2
+    assert [r.status_code for r in failed] == [503, 503] and middleware.replayed == 2
+
+
+def test_database_store_claims_expires_and_purges(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'keys.db'}")
+    Base.metadata.create_all(engine)
+    store = DatabaseIdempotencyStore(
+        sessionmaker(bind=engine), ttl=60, lock_timeout=0.2
+    )
+
+    assert store.begin("k1", "fp") is None
+    assert store.begin("k1", "fp")["status_code"] is None  # in progress elsewhere
+    store.complete("k1", 201, [["content-type", "application/json"]], b"{}")
+    assert store.begin("k1", "fp") == {
+        "fingerprint": "fp",
+        "status_code": 201,
+        "headers": [["content-type", "application/json"]],
+        "body": b"{}",
+    }
+
+    # A released key, or one whose lease ran out, can be claimed again.
+    assert store.begin("k2", "fp") is None
+    store.release("k2")
+    assert store.begin("k2", "fp") is None
+    time.sleep(0.3)
+    assert store.begin("k2", "other") is None
+    time.sleep(0.3)
+    assert store.purge() == 1
+    with sessionmaker(bind=engine)() as db:
+        assert [row.key for row in db.query(models.IdempotencyKey)] == ["k1"]
+    engine.dispose()
+
+
+def test_memory_store_with_several_workers_is_reported(monkeypatch, caplog):
+    with pytest.raises(TypeError):
+        IdempotencyStore()  # the storage methods are abstract
+    monkeypatch.setattr(idempotency, "WEB_CONCURRENCY", 4)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_BACKEND", "memory")
+    middleware = IdempotencyMiddleware(None)
+    with caplog.at_level(logging.WARNING, logger="app.core.idempotency"):
+        store = middleware._get_store()
+    assert isinstance(store, MemoryIdempotencyStore)
+    assert "IDEMPOTENCY_BACKEND=memory with 4 workers" in caplog.text
@@ -0,0 +1,338 @@
+# tests/test_items.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.core.cache import entity_caches
+from app.core.database import Base, get_db
+from app.main import app
+from app.security import authz_engine, get_current_user
+from app.services.search import InMemoryItemSearch
+
+USER = {"preferred_username": "super_user", "realm_access": {"roles": []}}
+
+
+@pytest.fixture
+def db_session():
+    """An in-memory SQLite database wired into the app, with an authenticated user."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: USER
+    db = Session()
+    try:
+        yield db
+    finally:
+        db.close()
+        app.dependency_overrides.clear()
+        entity_caches.clear()
+        engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_list_items_column_path(db_session):
+    """
+    The list endpoint encodes column tuples with the same shape as schemas.Item.
+    """
+    db_session.add_all(
+        [models.Item(name="First", description="ünïcode"), models.Item(name="Second")]
+    )
+    db_session.commit()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/api/items/", params={"limit": 1, "skip": 1})
+        assert response.json() == [{"name": "Second", "description": None, "id": 2}]
+        response = await ac.get("/api/items/1")
+    assert response.json() == {"name": "First", "description": "ünïcode", "id": 1}
+
+
+@pytest.mark.asyncio
+async def test_item_etags(db_session):
+    """
+    Item and list responses carry strong ETags that yield 304s until the item changes.
+    """
+    db_session.add(models.Item(name="First"))
+    db_session.commit()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        item = await ac.get("/api/items/1")
+        page = await ac.get("/api/items/")
+        item_etag, page_etag = item.headers["etag"], page.headers["etag"]
+        assert not item_etag.startswith("W/")
+
+        response = await ac.get("/api/items/1", headers={"If-None-Match": item_etag})
+        assert response.status_code == 304 and response.headers["etag"] == item_etag
+        response = await ac.get("/api/items/", headers={"If-None-Match": page_etag})
+        assert response.status_code == 304
+        response = await ac.get("/api/items/2", headers={"If-None-Match": item_etag})
+        assert response.status_code == 404
+
+        updated = await ac.put("/api/items/1")
+        assert updated.json()["item"]["name"] == "Updated: First"
+        assert updated.headers["etag"] != item_etag
+        response = await ac.get("/api/items/1", headers={"If-None-Match": item_etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] == updated.headers["etag"]
+        response = await ac.get("/api/items/", headers={"If-None-Match": page_etag})
+        assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_conditional_requests_on_compressed_responses(db_session):
+    """
+    A 304 repeats the validator the client revalidates with: the coded ETag of a
+    compressed page, the plain one of a body too small to compress.
+    """
+    db_session.add_all(
+        [models.Item(name=f"Item {n}", description="x" * 40) for n in range(50)]
+    )
+    db_session.commit()
+    gzip = {"Accept-Encoding": "gzip"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        page = await ac.get("/api/items/", headers=gzip)
+        item = await ac.get("/api/items/1", headers=gzip)
+        assert page.headers["content-encoding"] == "gzip"
+        assert "content-encoding" not in item.headers
+        revalidated = [
+            await ac.get(
+                path, headers={**gzip, "If-None-Match": response.headers["etag"]}
+            )
+            for path, response in (("/api/items/", page), ("/api/items/1", item))
+        ]
+    assert page.headers["etag"].endswith('-gzip"')
+    for response, fresh in zip(revalidated, (page, item)):
+        assert response.status_code == 304
+        assert response.headers["etag"] == fresh.headers["etag"]
+        assert "accept-encoding" in response.headers["vary"].lower()
+
+
+@pytest.mark.asyncio
+async def test_item_etags_with_per_process_cache(db_session, monkeypatch):
+    """
+    When other workers cannot invalidate this process's cache, a matching If-None-Match
+    is confirmed against the database instead of trusting the cached version.
+    """
+    db_session.add(models.Item(name="First"))
+    db_session.commit()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        etag = (await ac.get("/api/items/1")).headers["etag"]
+        # A bulk UPDATE stands in for a write made by another worker process.
+        db_session.execute(
+            update(models.Item).values(
+                name="Elsewhere", version=models.Item.version + 1
+            )
+        )
+        db_session.commit()
+        stale = await ac.get("/api/items/1", headers={"If-None-Match": etag})
+        monkeypatch.setattr(entity_caches, "coherent", False)
+        fresh = await ac.get("/api/items/1", headers={"If-None-Match": etag})
+        cached = await ac.get("/api/items/1")
+    assert stale.status_code == 304  # a shared cache would have been invalidated
+    assert fresh.status_code == 200 and fresh.json()["name"] == "Elsewhere"
+    assert (
+        fresh.headers["etag"] != etag
+        and cached.headers["etag"] == fresh.headers["etag"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_items_batch(db_session):
+    """
+    The multi-get endpoint returns items in request order and marks unknown IDs.
+    """
+    db_session.add_all([models.Item(name="First"), models.Item(name="Second")])
+    db_session.commit()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        await ac.get("/api/items/1")  # cached; only IDs 2 and 3 are queried
+        response = await ac.get("/api/items/batch", params={"ids": [2, 3, 1, 2]})
+    body = response.json()
+    assert [item and item["name"] for item in body["items"]] == [
+        "Second",
+        None,
+        "First",
+        "Second",
+    ]
+    assert body["missing"] == [3]
+
+
+@pytest.mark.asyncio
+async def test_sparse_fieldsets(db_session):
+    """
+    fields= narrows list and item responses; unknown fields are rejected.
+    """
+    db_session.add(models.Item(name="First", description="long text"))
+    db_session.commit()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        page = await ac.get("/api/items/", params={"fields": "name,id"})
+        item = await ac.get("/api/items/1", params={"fields": "name"})
+        full = await ac.get("/api/items/1")
+        bad = await ac.get("/api/items/", params={"fields": "id,secret"})
+    assert page.json() == [{"name": "First", "id": 1}]
+    assert item.json() == {"name": "First"}
+    assert item.headers["etag"] != full.headers["etag"]
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_items(db_session):
+    """
+    Search matches term prefixes in name and description, ranks name matches first,
+    and pages through all hits with the cursor.
+    """
+    db_session.add_all(
+        [
+            models.Item(name="Red apple", description="Fruit"),
+            models.Item(name="Green pear", description="Goes well with apples"),
+            models.Item(name="Apple pie", description="Dessert"),
+            models.Item(name="Banana"),
+        ]
+    )
+    db_session.commit()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        first = (
+            await ac.get("/api/items/search", params={"q": "APP", "limit": 2})
+        ).json()
+        second = (
+            await ac.get(
+                "/api/items/search",
+                params={"q": "app", "limit": 2, "cursor": first["next_cursor"]},
+            )
+        ).json()
+        both = (await ac.get("/api/items/search", params={"q": "apple pie"})).json()
+    assert [hit["id"] for hit in first["items"]] == [1, 3]
+    assert [hit["id"] for hit in second["items"]] == [2]
+    assert second["next_cursor"] is None
+    assert [hit["id"] for hit in both["items"]] == [3]
+
+
+def test_search_index_follows_committed_changes(db_session):
+    """The in-memory index is rebuilt only after a commit changes items, not per search."""
+    search = InMemoryItemSearch()
+    statements = []
+    engine = db_session.get_bind()
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    names = lambda: [
+        hit["name"] for hit in search.search(db_session, "apple", 10)
+    ]  # noqa: E731
+    try:
+        db_session.add(models.Item(name="Apple"))
+        db_session.commit()
+        assert names() == ["Apple"]
+        statements.clear()
+        assert names() == ["Apple"] and statements == []
+
+        db_session.add(models.Item(name="Apple pie"))
+        db_session.flush()
+        db_session.rollback()
+        statements.clear()
+        assert names() == ["Apple"] and statements == []
+
+        db_session.get(models.Item, 1).name = "Apple tart"
+        db_session.commit()
+        assert names() == ["Apple tart"]
+        db_session.execute(update(models.Item).values(name="Pear"))
+        db_session.commit()
+        assert names() == []
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+        search.close()
+
+
+def test_search_index_per_engine(db_session):
+    """Alternating between the primary and a replica builds each index once per commit."""
+    search = InMemoryItemSearch()
+    replica_engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(replica_engine)
+    replica = sessionmaker(bind=replica_engine, info={"replica": True})()
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    engines = (db_session.get_bind(), replica_engine)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", listener)
+    try:
+        for db in (db_session, replica):
+            db.add(models.Item(name="Apple"))
+            db.commit()
+        statements.clear()
+        for _ in range(3):
+            for db in (db_session, replica):
+                assert [hit["name"] for hit in search.search(db, "apple", 10)] == [
+                    "Apple"
+                ]
+        assert len(statements) == 2
+
+        db_session.get(models.Item, 1).name = "Apple tart"
+        db_session.commit()
+        statements.clear()
+        assert search.search(db_session, "tart", 10)[0]["name"] == "Apple tart"
+        assert search.search(replica, "apple", 10)[0]["name"] == "Apple"
+        assert len(statements) == 2
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", listener)
+        replica.close()
+        replica_engine.dispose()
+        search.close()
+
+
+@pytest.mark.asyncio
+async def test_conflicting_item_updates(tmp_path, monkeypatch):
+    """
+    A stale If-Match gets a 412, and an update that loses a race with a concurrent
+    one gets a 409 instead of a server error.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'items.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(models.Item(name="First"))
+        db.commit()
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    def update_concurrently(request, user, context=None):
+        # Another writer commits between the endpoint's read and its UPDATE.
+        if context is None:
+            return True
+        with Session() as other:
+            other.get(models.Item, 1).description = "changed elsewhere"
+            other.commit()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: USER
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            etag = (await ac.get("/api/items/1")).headers["etag"]
+            updated = await ac.put("/api/items/1", headers={"If-Match": etag})
+            assert updated.status_code == 200
+            stale = await ac.put("/api/items/1", headers={"If-Match": etag})
+            assert stale.status_code == 412
+            assert stale.headers["etag"] == updated.headers["etag"]
+
+            monkeypatch.setattr(authz_engine, "check", update_concurrently)
+            conflict = await ac.put("/api/items/1")
+            assert conflict.status_code == 409
+    finally:
+        app.dependency_overrides.clear()
+        entity_caches.clear()
+        engine.dispose()
+    with Session() as db:
+        item = db.get(models.Item, 1)
+        assert (item.name, item.description) == ("Updated: First", "changed elsewhere")
@@ -0,0 +1,224 @@
+# tests/test_jobs.py
+import asyncio
+import threading
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import lifecycle, models
+from app.core.database import Base, get_db
+from app.main import app
+from app.security import get_current_user
+from app.services import jobs
+
+USER = {
+    "sub": "user-1",
+    "preferred_username": "super_user",
+    "realm_access": {"roles": []},
+}
+
+
+@pytest.fixture
+def Session(tmp_path, monkeypatch):
+    """A file-backed SQLite database (shared by worker threads) and an empty handler registry."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(jobs, "HANDLERS", {})
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_claim_order_batching_and_retries(Session, monkeypatch):
+    """
+    Jobs are claimed by priority, then age; a batching handler claims its queued jobs
+    together; failures are retried after a backoff until attempts run out.
+    """
+    jobs.job_handler("single", max_attempts=2)(lambda payload, report: payload)
+    jobs.job_handler("small", batch_size=3)(lambda payloads, report: payloads)
+    monkeypatch.setattr(jobs, "retry_delay", lambda attempt: 0.0)
+
+    with Session() as db:
+        low = jobs.enqueue(db, "single", {"n": 1})
+        high = jobs.enqueue(db, "single", {"n": 2}, priority=5)
+        small = [jobs.enqueue(db, "small", {"n": n}, priority=1).id for n in range(4)]
+        later = jobs.enqueue(db, "single", {"n": 3}, priority=9, delay=60)
+
+        assert [job.id for job in jobs.claim_jobs(db, "w1")] == [high.id]
+        assert [job.id for job in jobs.claim_jobs(db, "w1")] == small[:3]
+        assert [job.id for job in jobs.claim_jobs(db, "w2")] == [small[3]]
+        assert [job.id for job in jobs.claim_jobs(db, "w2")] == [low.id]
+        assert jobs.claim_jobs(db, "w2") == []  # `later` is not due yet
+
+        jobs.fail_jobs(db, "w2", [low.id], "boom")
+        db.refresh(low)
+        assert (low.status, low.attempts, low.error) == ("queued", 1, "boom")
+        assert [job.id for job in jobs.claim_jobs(db, "w1")] == [low.id]
+        jobs.fail_jobs(db, "w1", [low.id], "boom again")
+        db.refresh(low)
+        assert (low.status, low.attempts) == ("failed", 2)
+        assert db.get(models.Job, later.id).status == "queued"
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_jobs_and_reports_status(Session):
+    """Jobs submitted over HTTP run on the worker pool; only the submitter can read them."""
+    seen = []
+
+    @jobs.job_handler("count")
+    def count(payload, report_progress):
+        report_progress(0.5)
+        return {"total": sum(payload["values"])}
+
+    @jobs.job_handler("invalid")
+    def invalid(payload, report_progress):
+        seen.append(payload)
+        raise jobs.PermanentJobError("bad input")
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: USER
+    worker = jobs.JobWorker(concurrency=2, poll_interval=0.05, session_factory=Session)
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            response = await ac.post("/api/jobs", json={"kind": "unknown"})
+            assert response.status_code == 400
+            ok = await ac.post(
+                "/api/jobs", json={"kind": "count", "payload": {"values": [1, 2]}}
+            )
+            assert ok.status_code == 202 and ok.json()["status"] == "queued"
+            bad = await ac.post("/api/jobs", json={"kind": "invalid"})
+
+            worker.start()
+            for _ in range(200):
+                polled = [
+                    (await ac.get(f"/api/jobs/{r.json()['id']}")).json()
+                    for r in (ok, bad)
+                ]
+                if {job["status"] for job in polled} <= {"succeeded", "failed"}:
+                    break
+                await asyncio.sleep(0.05)
+
+            ok = (await ac.get(f"/api/jobs/{ok.json()['id']}")).json()
+            assert (ok["status"], ok["progress"], ok["result"]) == (
+                "succeeded",
+                1.0,
+                {"total": 3},
+            )
+            bad = (await ac.get(f"/api/jobs/{bad.json()['id']}")).json()
+            # Permanent errors are not retried.
+            assert (
+                bad["status"] == "failed"
+                and "bad input" in bad["error"]
+                and len(seen) == 1
+            )
+
+            app.dependency_overrides[get_current_user] = lambda: {
+                **USER,
+                "sub": "other",
+            }
+            assert (await ac.get(f"/api/jobs/{ok['id']}")).status_code == 403
+    finally:
+        worker.stop()
+        app.dependency_overrides.clear()
+
+
+def test_leases_are_renewed_and_only_held_jobs_are_updated(Session, monkeypatch):
+    """
+    The worker renews the leases of long-running jobs that never report progress, and a
+    worker whose lease expired can no longer overwrite the job's new run.
+    """
+    release = threading.Event()
+    jobs.job_handler("slow")(lambda payload, report: release.wait(5))
+    monkeypatch.setattr(jobs, "retry_delay", lambda attempt: 0.0)
+    with Session() as db:
+        slow = jobs.enqueue(db, "slow", {})
+    worker = jobs.JobWorker(
+        poll_interval=0.02, session_factory=Session, heartbeat_interval=0.05
+    )
+    worker.start()
+    try:
+        time.sleep(0.5)
+        with Session() as db:
+            assert jobs.requeue_abandoned(db, lease=0.25) == 0
+            assert db.get(models.Job, slow.id).status == "running"
+    finally:
+        release.set()
+        worker.stop()
+
+    with Session() as db:
+        job = jobs.enqueue(db, "slow", {})
+        jobs.claim_jobs(db, "w1")
+        assert jobs.requeue_abandoned(db, lease=0) == 1
+        assert [claimed.id for claimed in jobs.claim_jobs(db, "w2")] == [job.id]
+        jobs.set_progress(db, "w1", [job.id], 0.5)
+        jobs.finish_jobs(db, "w1", [job.id], [{"stale": True}])
+        jobs.fail_jobs(db, "w1", [job.id], "stale")
+        db.refresh(job)
+        assert (job.status, job.locked_by, job.progress) == ("running", "w2", 0)
+        assert job.error == "Abandoned by its worker (lease expired)"
+        jobs.finish_jobs(db, "w2", [job.id], [{"done": True}])
+        db.refresh(job)
+        assert (job.status, job.result) == ("succeeded", {"done": True})
+
+
+@pytest.mark.asyncio
+async def test_jobs_without_an_owner_are_admin_only(Session):
+    """A job or token without a subject never matches the ownership rule."""
+    jobs.job_handler("count")(lambda payload, report_progress: None)
+    with Session() as db:
+        job = jobs.enqueue(db, "count", {})
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            for user in (
+                {key: value for key, value in USER.items() if key != "sub"},
+                USER,
+            ):
+                app.dependency_overrides[get_current_user] = lambda: user
+                assert (await ac.get(f"/api/jobs/{job.id}")).status_code == 403
+            app.dependency_overrides[get_current_user] = lambda: {
+                **USER,
+                "realm_access": {"roles": ["admin"]},
+            }
+            assert (await ac.get(f"/api/jobs/{job.id}")).status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_handler_modules_are_loaded_by_the_app(Session, tmp_path, monkeypatch):
+    """The web process imports JOB_HANDLER_MODULES at startup to validate submitted kinds."""
+    (tmp_path / "report_jobs.py").write_text(
+        "from app.services.jobs import job_handler\n\n\n"
+        "@job_handler('report')\n"
+        "def report(payload, report_progress):\n"
+        "    return payload\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(jobs, "JOB_HANDLER_MODULES", ["report_jobs"])
+    monkeypatch.setattr(lifecycle, "setup_logging", lambda: None)
+
+    def override_get_db():
+        with Session() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: USER
+    try:
+        async with lifecycle.lifespan(app):
+            async with AsyncClient(app=app, base_url="http://test") as ac:
+                response = await ac.post("/api/jobs", json={"kind": "report"})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 202 and response.json()["kind"] == "report"
@@ -0,0 +1,183 @@
+# tests/test_logging.py
+import asyncio
+import io
+import logging
+import sys
+import threading
+import time
+
+from app.core.logging_config import (
+    AccessLogSampler,
+    AsyncQueueHandler,
+    HealthCheckFilter,
+    MessageRateLimitFilter,
+)
+
+
+def _access_record(path: str, status: int = 200) -> logging.LogRecord:
+    return logging.makeLogRecord(
+        {
+            "name": "uvicorn.access",
+            "msg": '%s - "%s %s HTTP/%s" %d',
+            "args": ("127.0.0.1:5000", "GET", path, "1.1", status),
+        }
+    )
+
+
+def test_health_check_filter():
+    """
+    Health check access logs are dropped, including ones with a query string.
+    """
+    health_filter = HealthCheckFilter()
+    assert health_filter.filter(_access_record("/api/health")) is False
+    assert health_filter.filter(_access_record("/api/health?probe=1")) is False
+    assert health_filter.filter(_access_record("/api/items/")) is True
+
+
+def test_async_handler_writes_in_background():
+    """
+    Records are formatted and written by the writer thread, and drained on close.
+    """
+    stream = io.StringIO()
+    handler = AsyncQueueHandler(stream=stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    logger = logging.getLogger("tests.async_handler")
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for i in range(100):
+            logger.warning("message %d", i)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    lines = stream.getvalue().splitlines()
+    assert lines[0] == "WARNING message 0"
+    assert len(lines) == 100
+    assert handler.stats()["written"] == 100
+
+
+def test_async_handler_drops_when_full():
+    """
+    With the drop policy, records beyond the queue capacity are counted and reported.
+    """
+    writing, release = threading.Event(), threading.Event()
+
+    class BlockingStream(io.StringIO):
+        def write(self, s):
+            writing.set()
+            release.wait(5)
+            return super().write(s)
+
+    stream = BlockingStream()
+    handler = AsyncQueueHandler(stream=stream, maxsize=1, policy="drop")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.handle(logging.makeLogRecord({"msg": "first"}))
+    # Wait until the writer has taken the first record and is stuck writing it.
+    assert writing.wait(5)
+    handler.handle(logging.makeLogRecord({"msg": "second"}))
+    handler.handle(logging.makeLogRecord({"msg": "third"}))
+    assert handler.stats()["dropped"] == 1
+
+    release.set()
+    handler.close()
+    output = stream.getvalue()
+    assert "first" in output and "second" in output and "third" not in output
+    assert "dropped 1 records" in output
+
+
+def test_access_log_sampler():
+    """
+    Sampled routes drop successful requests but always keep errors; rate-limited
+    routes report how many lines were suppressed.
+    """
+    sampler = AccessLogSampler(
+        routes={
+            "/api/items.*": {"sample_rate": 0.0},
+            "/api/test": {"rate_limit": 1},
+        }
+    )
+    assert sampler.filter(_access_record("/api/items/")) is False
+    assert sampler.filter(_access_record("/api/items/", status=500)) is True
+    assert sampler.filter(_access_record("/api/admin/dashboard")) is True
+
+    assert sampler.filter(_access_record("/api/test")) is True
+    assert sampler.filter(_access_record("/api/test")) is False
+    sampler.routes[1]["bucket"].tokens = 1
+    record = _access_record("/api/test")
+    assert sampler.filter(record) is True
+    assert record.suppressed == 1 and "[suppressed=1]" in record.getMessage()
+
+
+def test_message_rate_limit():
+    """
+    Repeated messages from one call site are limited; errors always pass.
+    """
+    rate_limit = MessageRateLimitFilter(rate=0.001, burst=2)
+    records = [
+        logging.makeLogRecord(
+            {
+                "msg": "repeated",
+                "pathname": "x.py",
+                "lineno": 1,
+                "levelno": logging.INFO,
+            }
+        )
+        for _ in range(5)
+    ]
+    assert [rate_limit.filter(r) for r in records] == [True, True, False, False, False]
+    error = logging.makeLogRecord(
+        {"msg": "boom", "pathname": "x.py", "lineno": 1, "levelno": logging.ERROR}
+    )
+    assert rate_limit.filter(error) is True
+
+
+def test_async_handler_renders_messages_on_the_calling_thread():
+    """
+    Args and tracebacks are merged when the record is logged, not when it is written,
+    and a full queue with the block policy neither holds other threads nor the event loop.
+    """
+    writing, release = threading.Event(), threading.Event()
+
+    class BlockingStream(io.StringIO):
+        def write(self, s):
+            writing.set()
+            release.wait(5)
+            return super().write(s)
+
+    stream = BlockingStream()
+    handler = AsyncQueueHandler(
+        stream=stream, maxsize=1, policy="block", block_timeout=2
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    items = ["before"]
+    handler.handle(logging.makeLogRecord({"msg": "first %s", "args": (items,)}))
+    items[0] = "after"
+    assert writing.wait(5)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        handler.handle(
+            logging.makeLogRecord({"msg": "failed", "exc_info": sys.exc_info()})
+        )
+
+    # The queue is full: a thread blocked on it does not stall a logger on the event loop.
+    blocked = threading.Thread(
+        target=handler.handle, args=(logging.makeLogRecord({"msg": "blocked"}),)
+    )
+    blocked.start()
+
+    async def log_from_event_loop():
+        started = time.monotonic()
+        handler.handle(logging.makeLogRecord({"msg": "from the event loop"}))
+        return time.monotonic() - started
+
+    assert asyncio.run(log_from_event_loop()) < 1
+    release.set()
+    blocked.join(5)
+    handler.close()
+
+    output = stream.getvalue()
+    assert "first ['before']" in output
+    assert "ValueError: boom" in output and "blocked" in output
+    assert "from the event loop" not in output
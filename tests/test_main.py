@@ -2,6 +2,7 @@
 import pytest
 from httpx import AsyncClient
 
+from app.lifecycle import prewarm
 from app.main import app
 
 # Mark all tests in this file as async
@@ -27,6 +28,14 @@ async def test_unauthorized_access():
     assert response.status_code == 401
 
 
+async def test_prewarm_tolerates_failures():
+    """
+    Pre-warming runs the selected tasks and skips unknown or failing ones.
+    """
+    timings = await prewarm(["policies", "unknown"])
+    assert set(timings) == {"policies", "unknown"}
+
+
 # Additional tests would include:
 # - Database integration tests
 # - Authorization engine tests
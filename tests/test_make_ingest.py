@@ -0,0 +1,305 @@
+# tests/test_make_ingest.py
+import json
+import os
+import subprocess
+
+import make_ingest
+
+
+def make_tree(root, files):
+    for path, content in files.items():
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(content)
+
+
+def test_pattern_matcher_follows_gitignore_semantics():
+    """
+    Patterns without a slash match at any depth, anchored patterns only from the root,
+    and a matching directory covers everything below it.
+    """
+    matcher = make_ingest.PatternMatcher(
+        ["node_modules", "scripts/", "*/chroma_db", "*.pyc", "job_*.json"]
+    )
+    found = matcher.first_match("a/b/node_modules", is_dir=True)
+    assert found == ("a/b/node_modules", "node_modules")
+    assert matcher.first_match("node_modules/x/index.js") == (
+        "node_modules",
+        "node_modules",
+    )
+    assert matcher.match("scripts", is_dir=True) == "scripts/"
+    assert matcher.match("scripts") is None  # directory-only rule, file path
+    assert matcher.match("svc/chroma_db", is_dir=True) == "/*/chroma_db"
+    assert matcher.match("a/svc/chroma_db", is_dir=True) is None
+    assert matcher.match("pkg/m.cpython-311.pyc") == "*.pyc"
+    assert matcher.match("jobs/job_12.json") == "job_*.json"
+    assert matcher.first_match("pkg/m.py") is None
+
+
+def test_patterns_are_normalised_and_deduplicated():
+    """Redundant patterns are folded into the broader rule that covers them."""
+    rules = make_ingest.normalise_patterns(
+        [
+            "sample_data",
+            "sample_data/*",
+            "sample_data/invoices/**",
+            "**/__pycache__/**",
+            "*/__pycache__/*",
+            "*.pdf",
+            "REGEN_*.pdf",
+            "frontend/.next/*",
+            ".next",
+            "frontend/public",
+        ]
+    )
+    assert rules == {
+        "sample_data": ["sample_data", "sample_data/*", "sample_data/invoices/**"],
+        "__pycache__/": ["**/__pycache__/**", "*/__pycache__/*"],
+        "*.pdf": ["*.pdf", "REGEN_*.pdf"],
+        ".next": ["frontend/.next/*", ".next"],
+        "/frontend/public": ["frontend/public"],
+    }
+
+
+def test_generate_digest_order_and_content(tmp_path):
+    """
+    The digest lists the tree and then each file in gitingest's order, with excluded
+    directories pruned and binary or empty files replaced by placeholders.
+    """
+    source = tmp_path / "repo"
+    make_tree(
+        source,
+        {
+            "src/b.py": b"print('b')\r\n",
+            "src/a.py": b"print('a')\n",
+            "README.md": b"# Readme\n",
+            "empty.txt": b"",
+            "blob.dat": b"\xff\xfe\x00binary",
+            "node_modules/pkg/index.js": b"module.exports = 1\n",
+            "app.log": b"excluded by *.log\n",
+        },
+    )
+    output = tmp_path / "digest.txt"
+    stats = make_ingest.generate_digest(
+        str(source), str(output), exclude_exts=[".dat"], workers=2, use_cache=False
+    )
+    assert stats["files"] == 4
+
+    digest = output.read_text(encoding="utf-8")
+    tree, _, body = digest.partition("\n\n")
+    assert tree.splitlines() == [
+        "Directory structure:",
+        "└── repo/",
+        "    ├── README.md",
+        "    ├── empty.txt",
+        "    └── src/",
+        "        ├── a.py",
+        "        └── b.py",
+    ]
+    headers = [line for line in body.splitlines() if line.startswith("FILE: ")]
+    assert headers == [
+        "FILE: README.md",
+        "FILE: empty.txt",
+        "FILE: src/a.py",
+        "FILE: src/b.py",
+    ]
+    assert "[Empty file]" in body
+    assert "print('b')\n" in body and "\r" not in body
+    assert "node_modules" not in digest
+
+    make_tree(source, {"blob.bin2": b"\xff\xfe\x00binary"})
+    make_ingest.generate_digest(str(source), str(output), workers=1, use_cache=False)
+    assert (
+        "FILE: blob.bin2\n" + make_ingest.SEPARATOR + "\n[Binary file]"
+        in output.read_text()
+    )
+
+
+def test_digest_cache_reuses_unchanged_sections(tmp_path, monkeypatch):
+    """
+    Repeat runs reuse cached sections: by size and mtime, by content hash for files that
+    were only touched, and without rewriting the output when nothing changed at all.
+    """
+    source = tmp_path / "repo"
+    make_tree(source, {f"src/m{i}.py": f"value = {i}\n".encode() for i in range(5)})
+    # Older than the racy window, so size and mtime can be trusted.
+    for path in (source / "src").iterdir():
+        os.utime(path, ns=(10**18, 10**18))
+    output, cache_file = tmp_path / "digest.txt", tmp_path / "digest.cache"
+
+    def run():
+        return make_ingest.generate_digest(
+            str(source), str(output), cache_file=str(cache_file)
+        )
+
+    assert run()["rendered"] == 5
+    expected = output.read_text()
+    assert run() == {"files": 5, "rendered": 0, "reused": 5, "rehashed": 0}
+
+    os.utime(source / "src/m1.py", ns=(10**18 + 10**9, 10**18 + 10**9))
+    (source / "src/m2.py").write_text("value = 'changed'\n")
+    (source / "src/m4.py").unlink()
+    stats = run()
+    assert (stats["reused"], stats["rehashed"], stats["rendered"]) == (2, 1, 1)
+    digest = output.read_text()
+    assert "value = 'changed'" in digest and "m4.py" not in digest
+
+    # A different exclusion config starts from an empty cache, and so does switching back.
+    changed_config = make_ingest.generate_digest(
+        str(source), str(output), exclude_exts=[".md"], cache_file=str(cache_file)
+    )
+    assert changed_config["rendered"] == 4
+    (source / "src/m2.py").write_text("value = 2\n")
+    (source / "src/m4.py").write_text("value = 4\n")
+    assert run()["rendered"] == 5
+    assert output.read_text() == expected
+
+    # The unchanged output is not kept when the config it was rendered with changed.
+    for path in (source / "src").iterdir():
+        os.utime(path, ns=(10**18, 10**18))
+    run()
+    assert run() == {"files": 5, "rendered": 0, "reused": 5, "rehashed": 0}
+    truncated = make_ingest.generate_digest(
+        str(source),
+        str(output),
+        max_file_size=5,
+        truncate=True,
+        cache_file=str(cache_file),
+    )
+    assert truncated["rendered"] == 5 and output.read_text() != expected
+    assert run()["rendered"] == 5
+    monkeypatch.setattr(make_ingest, "ENCODINGS", ["utf-8"])
+    assert run()["rendered"] == 5
+    assert output.read_text() == expected
+
+
+def test_chunked_digest_keeps_directories_together(tmp_path):
+    """
+    With a token budget the digest is split into numbered chunks listed in a manifest;
+    directories that fit in a chunk are never split, and oversized files are truncated.
+    """
+    source = tmp_path / "repo"
+    files = {f"pkg{p}/m{i}.py": b"x = 1\n" * 100 for p in range(3) for i in range(4)}
+    files["big/huge.txt"] = "é".encode() * 5000
+    make_tree(source, files)
+    output = tmp_path / "out" / "digest.txt"
+    output.parent.mkdir()
+
+    stats = make_ingest.generate_digest(
+        str(source), str(output), max_tokens=1000, max_file_size=1001, truncate=True
+    )
+    manifest = json.loads((tmp_path / "out" / "digest.manifest.json").read_text())
+    assert stats["chunks"] == len(manifest["chunks"]) == 4
+    assert all(chunk["tokens"] <= 1000 for chunk in manifest["chunks"])
+    for package in ("pkg0", "pkg1", "pkg2"):
+        entries = [
+            entry
+            for path, entry in manifest["files"].items()
+            if path.startswith(package)
+        ]
+        assert len({entry["chunk"] for entry in entries}) == 1
+    assert manifest["files"]["big/huge.txt"]["truncated"]
+
+    chunk = (tmp_path / "out" / "digest-001.txt").read_text(encoding="utf-8")
+    assert chunk.startswith("Directory structure:\n└── repo/\n    └── big/\n")
+    # The character cut in half at the limit is dropped rather than mis-decoded.
+    assert "é" * 500 + "\n[... truncated: first 1,001 of 10,000 bytes]" in chunk
+
+    # A smaller number of chunks replaces the previous ones.
+    make_ingest.generate_digest(str(source), str(output), max_tokens=100_000)
+    assert sorted(p.name for p in output.parent.glob("digest-*.txt")) == [
+        "digest-001.txt"
+    ]
+
+
+def test_git_mode_lists_tracked_and_unignored_files(tmp_path):
+    """
+    Git mode takes candidates from the index, adding untracked files only on request and
+    never ones that .gitignore (including nested files and "!" rules) ignores.
+    """
+    source = tmp_path / "repo"
+    make_tree(
+        source,
+        {
+            "README.md": b"# Readme\n",
+            "src/app.py": b"app = 1\n",
+            "src/.gitignore": b"*.scratch\n!keep.scratch\n",
+            ".gitignore": b"target/\n",
+        },
+    )
+
+    def git(*args):
+        return subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+            cwd=source,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    git("init", "-q")
+    git("add", "-A")
+    git("commit", "-qm", "initial")
+    make_tree(
+        source,
+        {
+            "target/out.txt": b"build output\n",
+            "src/tmp.scratch": b"ignored\n",
+            "src/keep.scratch": b"re-included\n",
+            "notes.txt": b"untracked\n",
+        },
+    )
+    (source / "README.md").unlink()
+
+    tracked = make_ingest.read_git_index(str(source / ".git"))
+    assert sorted(tracked) == git("ls-files", "--cached").split()
+
+    output = tmp_path / "digest.txt"
+    make_ingest.generate_digest(str(source), str(output), git=True, use_cache=False)
+    headers = [
+        line for line in output.read_text().splitlines() if line.startswith("FILE: ")
+    ]
+    assert headers == ["FILE: src/app.py"]  # .gitignore files are excluded by default
+
+    make_ingest.generate_digest(
+        str(source), str(output), untracked=True, use_cache=False
+    )
+    headers = [
+        line for line in output.read_text().splitlines() if line.startswith("FILE: ")
+    ]
+    expected = git("ls-files", "--cached", "--others", "--exclude-standard").split()
+    # README.md was deleted from the work tree; .gitignore files are excluded by default.
+    expected = [
+        path for path in expected if path != "README.md" and ".gitignore" not in path
+    ]
+    assert sorted(expected) == ["notes.txt", "src/app.py", "src/keep.scratch"]
+    assert sorted(header[6:] for header in headers) == sorted(expected)
+
+
+def test_git_mode_checks_the_type_of_index_entries(tmp_path):
+    """Index entries deleted from the work tree or replaced by another type are skipped."""
+    source = tmp_path / "repo"
+    make_tree(source, {"app.py": b"app = 1\n", "data.txt": b"data\n"})
+    for name in ("link.py", "gone.py", "retyped.py"):
+        os.symlink("app.py", source / name)
+    for args in (("init", "-q"), ("add", "-A"), ("commit", "-qm", "initial")):
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+            cwd=source,
+            check=True,
+            capture_output=True,
+        )
+    (source / "gone.py").unlink()
+    (source / "retyped.py").unlink()
+    (source / "retyped.py").write_text("now a file\n")
+    (source / "data.txt").unlink()
+    os.symlink("app.py", source / "data.txt")
+
+    output = tmp_path / "digest.txt"
+    make_ingest.generate_digest(str(source), str(output), git=True, use_cache=False)
+    headers = [
+        line
+        for line in output.read_text().splitlines()
+        if line.startswith(("FILE: ", "SYMLINK: "))
+    ]
+    assert headers == ["FILE: app.py", "SYMLINK: link.py -> app.py"]
@@ -0,0 +1,116 @@
+# tests/test_query_stats.py
+import logging
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core import query_stats as query_stats_module
+from app.core.database import Base
+from app.core.query_stats import (
+    ExplainCapturer,
+    QueryStats,
+    check_session_queries,
+    fingerprint,
+    instrument_engine,
+)
+
+
+def test_fingerprint_normalisation():
+    """
+    Statements differing only in literals, placeholders and IN-list length share a fingerprint.
+    """
+    assert fingerprint("SELECT * FROM items WHERE id IN (1, 2,3)") == (
+        "SELECT * FROM items WHERE id IN (?+)"
+    )
+    assert fingerprint("SELECT *\n FROM items WHERE id IN (%(p1)s, %(p2)s)") == (
+        "SELECT * FROM items WHERE id IN (?+)"
+    )
+    assert fingerprint("SELECT name FROM items WHERE name = 'x''y' LIMIT 10") == (
+        "SELECT name FROM items WHERE name = ? LIMIT ?"
+    )
+    assert fingerprint("SELECT rank::numeric FROM t WHERE a = :a") == (
+        "SELECT rank::numeric FROM t WHERE a = ?"
+    )
+
+
+def test_query_stats_histogram():
+    """
+    Executions are aggregated per fingerprint into counts and latency buckets.
+    """
+    stats = QueryStats(max_fingerprints=1)
+    stats.record("SELECT ?", 0.5)
+    stats.record("SELECT ?", 30)
+    stats.record("SELECT other", 1)
+    by_key = {entry["fingerprint"]: entry for entry in stats.snapshot()}
+    assert by_key["SELECT ?"]["count"] == 2
+    assert by_key["SELECT ?"]["histogram"]["le_1ms"] == 1
+    assert by_key["SELECT ?"]["histogram"]["le_50ms"] == 1
+    assert by_key["<other>"]["count"] == 1
+
+
+def test_slow_queries_and_session_budget(monkeypatch, caplog):
+    """
+    Slow statements are logged, and sessions over the query budget are reported.
+    """
+    monkeypatch.setattr(query_stats_module, "DB_SLOW_QUERY_MS", 0)
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    Base.metadata.create_all(engine)
+    with caplog.at_level(logging.WARNING, logger="app.core.query_stats"):
+        with Session(engine) as db:
+            for item_id in range(3):
+                db.execute(select(models.Item).where(models.Item.id == item_id))
+            assert check_session_queries(db, limit=2) == 3
+    engine.dispose()
+    assert "Slow query" in caplog.text
+    assert (
+        "Session issued 3 queries (limit 2); most repeated: 3x 'SELECT" in caplog.text
+    )
+
+
+def test_failed_statements_leave_no_timing_state(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(
+        query_stats_module.query_stats, "record", lambda *args: recorded.append(args)
+    )
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+        conn.execute(text("SELECT 1"))
+        # Start times of failed statements used to pile up on the pooled connection.
+        assert conn.info.get("query_start_time", []) == []
+    engine.dispose()
+    assert [key for key, _ in recorded] == ["SELECT ?"]
+
+
+def test_explain_analyze_skips_locking_selects():
+    executed = []
+
+    class Cursor:
+        def execute(self, statement, parameters):
+            executed.append(statement)
+
+        def fetchall(self):
+            return [("Seq Scan on jobs",)]
+
+    engine = SimpleNamespace(
+        raw_connection=lambda: SimpleNamespace(
+            cursor=Cursor, rollback=lambda: None, close=lambda: None
+        )
+    )
+    capturer = ExplainCapturer(mode="analyze")
+    capturer.explain(engine, "SELECT id FROM items", None)
+    capturer.explain(engine, "SELECT id FROM jobs FOR UPDATE SKIP LOCKED", None)
+    capturer.explain(engine, "SELECT nextval('items_id_seq')", None)
+    assert [statement.split(")")[0] for statement in executed] == [
+        "EXPLAIN (ANALYZE, BUFFERS",
+        "EXPLAIN (COSTS",
+        "EXPLAIN (COSTS",
+    ]
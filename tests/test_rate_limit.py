@@ -0,0 +1,141 @@
+# tests/test_rate_limit.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from app import security
+from app.core.rate_limit import (
+    LoadSheddingMiddleware,
+    MemoryRateLimitBackend,
+    RateLimiter,
+    client_ip,
+)
+from app.main import app
+from app.security import get_current_user
+
+
+def make_request(ip: str = "10.0.0.1") -> Request:
+    return Request(
+        {"type": "http", "method": "GET", "path": "/", "headers": [], "client": (ip, 1)}
+    )
+
+
+def test_rate_limits_per_caller_and_route():
+    """
+    Each caller has its own bucket per route pattern; a rule's own "rate_limit" takes
+    precedence over the defaults, and anonymous callers are counted per IP.
+    """
+    limiter = RateLimiter(MemoryRateLimitBackend(), default=(1, 2), anonymous=(1, 1))
+    alice, bob = {"sub": "alice"}, {"sub": "bob"}
+    items = ("/api/items.*", {"ALL": []}, False)
+    jobs = ("/api/jobs", {"ALL": [], "rate_limit": {"rate": 0.5, "burst": 1}}, False)
+
+    limiter.check(make_request(), alice, items)
+    limiter.check(make_request(), alice, items)
+    with pytest.raises(HTTPException) as exc:
+        limiter.check(make_request(), alice, items)
+    assert exc.value.status_code == 429 and exc.value.headers["Retry-After"] == "1"
+    limiter.check(make_request(), bob, items)
+
+    limiter.check(make_request(), alice, jobs)
+    with pytest.raises(HTTPException) as exc:
+        limiter.check(make_request(), alice, jobs)
+    assert exc.value.headers["Retry-After"] == "2"
+
+    limiter.check(make_request("10.0.0.1"), None, None)
+    limiter.check(make_request("10.0.0.2"), None, None)
+    with pytest.raises(HTTPException):
+        limiter.check(make_request("10.0.0.1"), None, None)
+
+
+@pytest.mark.asyncio
+async def test_client_ip_ignores_spoofed_forwarded_headers():
+    """
+    A forged X-Forwarded-For entry does not change the client IP; behind a trusted proxy
+    the right-most hop the proxy did not add itself is used.
+    """
+
+    async def echo_ip(scope, receive, send):
+        await PlainTextResponse(client_ip(Request(scope)))(scope, receive, send)
+
+    spoofed = {"X-Forwarded-For": "198.51.100.1, 203.0.113.7"}
+    direct = ASGITransport(app=echo_ip, client=("192.0.2.10", 1234))
+    async with AsyncClient(transport=direct, base_url="http://test") as ac:
+        assert (await ac.get("/", headers=spoofed)).text == "192.0.2.10"
+
+    proxied = ProxyHeadersMiddleware(echo_ip, trusted_hosts="192.0.2.10")
+    transport = ASGITransport(app=proxied, client=("192.0.2.10", 1234))
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        assert (await ac.get("/", headers=spoofed)).text == "203.0.113.7"
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_applied_by_verify_access(monkeypatch):
+    monkeypatch.setattr(
+        security, "rate_limiter", RateLimiter(MemoryRateLimitBackend(), default=(1, 2))
+    )
+    app.dependency_overrides[get_current_user] = lambda: {"sub": "alice"}
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            statuses = [(await ac.get("/api/test")).status_code for _ in range(3)]
+            limited = await ac.get("/api/test")
+    finally:
+        app.dependency_overrides.clear()
+    assert statuses == [200, 200, 429]
+    assert limited.status_code == 429 and "retry-after" in limited.headers
+
+
+@pytest.mark.asyncio
+async def test_peer_limit_is_checked_before_authentication(monkeypatch):
+    """Once a client IP's bucket is empty, its tokens are no longer validated."""
+    monkeypatch.setattr(
+        security,
+        "rate_limiter",
+        RateLimiter(MemoryRateLimitBackend(), default=(1, 5), anonymous=(1, 2)),
+    )
+    validated = []
+
+    def authenticate():
+        validated.append(True)
+        return {"sub": f"user-{len(validated)}"}
+
+    app.dependency_overrides[get_current_user] = authenticate
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            statuses = [(await ac.get("/api/test")).status_code for _ in range(3)]
+    finally:
+        app.dependency_overrides.clear()
+    assert statuses == [200, 200, 429] and len(validated) == 2
+
+
+@pytest.mark.asyncio
+async def test_load_shedding_rejects_requests_beyond_capacity():
+    """Beyond max_in_flight, requests get an immediate 503 and exempt paths still pass."""
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        if scope["path"] == "/slow":
+            await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    middleware = LoadSheddingMiddleware(
+        slow_app, max_in_flight=1, retry_after=2, exempt_paths=frozenset({"/health"})
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=middleware), base_url="http://test"
+    ) as ac:
+        first = asyncio.create_task(ac.get("/slow"))
+        await asyncio.sleep(0.05)
+        shed = await ac.get("/fast")
+        health = await ac.get("/health")
+        release.set()
+        assert (await first).status_code == 200
+        after = await ac.get("/fast")
+    assert shed.status_code == 503 and shed.headers["retry-after"] == "2"
+    assert health.status_code == 200 and after.status_code == 200
+    assert middleware.shed == 1
@@ -0,0 +1,137 @@
+# tests/test_replicas.py
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.core import database
+from app.core.cache import entity_caches
+from app.main import app
+from app.security import get_current_user
+
+USER = {
+    "sub": "user-1",
+    "preferred_username": "super_user",
+    "realm_access": {"roles": []},
+}
+
+
+def make_database(path, *names):
+    engine = create_engine(f"sqlite:///{path}")
+    database.Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(models.Item(name=name) for name in names)
+        db.commit()
+    return engine
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """A primary and two "replicas": separate SQLite files with different rows."""
+    primary = make_database(tmp_path / "primary.db", "primary")
+    for name in ("a", "b"):
+        make_database(tmp_path / f"{name}.db", f"replica {name}").dispose()
+    router = database.ReplicaRouter(
+        [f"sqlite:///{tmp_path / 'a.db'}", f"sqlite:///{tmp_path / 'b.db'}"],
+        health_interval=0,
+    )
+    monkeypatch.setattr(database, "_engine", primary)
+    monkeypatch.setattr(database, "replica_router", router)
+    monkeypatch.setattr(
+        database, "read_your_writes", database.ReadYourWrites(window=60)
+    )
+    database.SessionLocal.configure(bind=primary)
+    app.dependency_overrides[get_current_user] = lambda: USER
+    yield router
+    app.dependency_overrides.clear()
+    entity_caches.clear()
+    router.dispose()
+    primary.dispose()
+    database.SessionLocal.configure(bind=None)
+
+
+async def names(ac, **kwargs):
+    response = await ac.get("/api/items/", **kwargs)
+    return [item["name"] for item in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_reads_are_spread_over_healthy_replicas(replicated, tmp_path):
+    """
+    Reads alternate between the replicas; a replica failing its health check is skipped
+    until it passes again, and without healthy replicas reads use the primary.
+    """
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert [await names(ac) for _ in range(3)] == [
+            ["replica a"],
+            ["replica b"],
+            ["replica a"],
+        ]
+
+        replica_b = replicated.replicas[1]
+        replica_b.url = f"sqlite:///{tmp_path / 'missing' / 'b.db'}"
+        replica_b.engine = None
+        replicated.check_all()
+        assert [await names(ac) for _ in range(2)] == [["replica a"], ["replica a"]]
+
+        replicated.eject(replicated.replicas[0], "down for maintenance")
+        assert await names(ac) == ["primary"]
+        assert [entry["healthy"] for entry in replicated.stats()] == [False, False]
+
+        replicated.check_all()
+        assert await names(ac) == ["replica a"]
+
+
+@pytest.mark.asyncio
+async def test_least_connections_and_read_your_writes(replicated):
+    """
+    The least-connections strategy avoids the busy replica, and a client that wrote
+    keeps reading from the primary, by cookie or in this process by its credentials.
+    """
+    replicated.strategy = "least_connections"
+    busy = replicated.replicas[0].get_engine().connect()
+    try:
+        assert {replicated.choose() for _ in range(4)} == {replicated.replicas[1]}
+    finally:
+        busy.close()
+
+    headers = {"Authorization": "Bearer token-1"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post("/api/items/", json={"name": "mine"}, headers=headers)
+        assert database.ReadYourWrites.COOKIE in response.cookies
+        assert await names(ac) == ["primary", "mine"]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        # A fresh client without the cookie: pinned by its credentials, others are not.
+        assert await names(ac, headers=headers) == ["primary", "mine"]
+        assert (await names(ac))[0].startswith("replica")
+
+
+@pytest.mark.asyncio
+async def test_lagging_replica_does_not_fill_the_item_cache(replicated):
+    """
+    Rows read from a replica that has not caught up are not cached, so a client that
+    just wrote (and reads from the primary) never gets them from the cache.
+    """
+    headers = {"Authorization": "Bearer token-1"}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert (await ac.get("/api/items/1")).json()["name"].startswith("replica")
+        updated = await ac.put("/api/items/1", headers=headers)
+        created = await ac.post("/api/items/", json={"name": "new"}, headers=headers)
+        assert updated.status_code == created.status_code == 200
+        ac.cookies.clear()
+
+        # Other clients read the lagging replicas, which lack both writes.
+        assert (await ac.get("/api/items/1")).json()["name"].startswith("replica")
+        assert (await ac.get("/api/items/2")).status_code == 404
+        batch = await ac.get("/api/items/batch", params={"ids": [1, 2]})
+        assert batch.json()["missing"] == [2]
+
+        mine = [
+            (await ac.get(f"/api/items/{n}", headers=headers)).json() for n in (1, 2)
+        ]
+        batch = (
+            await ac.get("/api/items/batch", params={"ids": [1, 2]}, headers=headers)
+        ).json()
+    assert [item["name"] for item in mine] == ["Updated: primary", "new"]
+    assert [item["name"] for item in batch["items"]] == ["Updated: primary", "new"]
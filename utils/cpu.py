@@ -0,0 +1,66 @@
+# utils/cpu.py
+"""
+CPU detection helpers used to size the Gunicorn worker pool.
+Takes container (cgroup) CPU quotas and the process's CPU affinity into account,
+which os.cpu_count() alone does not.
+"""
+
+import math
+import os
+
+
+def _cgroup_cpu_limit() -> float | None:
+    """
+    Returns the CPU quota imposed by the container runtime, in CPUs,
+    or None if there is no limit (or it cannot be read).
+    """
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1: a quota of -1 means unlimited
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def effective_cpu_count() -> int:
+    """
+    Returns the number of CPUs this process can actually use: the smaller of the
+    CPUs it is allowed to run on and the container's CPU quota (rounded up).
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        cpus = os.cpu_count() or 1
+
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+    return max(1, cpus)
+
+
+def recommended_workers(
+    workers_per_core: float = 1.0, max_workers: int | None = None
+) -> int:
+    """
+    Returns a worker count for async (Uvicorn) workers: one event loop per usable
+    CPU by default, optionally capped at max_workers.
+    """
+    workers = max(1, int(effective_cpu_count() * workers_per_core))
+    if max_workers:
+        workers = min(workers, max_workers)
+    return workers
@@ -0,0 +1,67 @@
+# utils/workers.py
+"""
+Gunicorn worker class for serving the FastAPI app with Uvicorn.
+Uvicorn's default "auto" setting already runs uvloop and httptools when they are
+installed (see packages/requirements.txt). UVICORN_LOOP and UVICORN_HTTP override
+that choice, e.g. to compare against the stock asyncio loop and h11 parser; an
+override whose package is not installed falls back to "auto".
+"""
+
+import importlib.util
+import logging
+import os
+
+from uvicorn.workers import UvicornWorker
+
+log = logging.getLogger(__name__)
+
+# "auto" (the default) lets Uvicorn pick; any other value is passed to Uvicorn as is.
+UVICORN_LOOP = os.getenv("UVICORN_LOOP", "auto")
+UVICORN_HTTP = os.getenv("UVICORN_HTTP", "auto")
+
+# Settings that need an optional package.
+_REQUIRED_MODULES = {"uvloop": "uvloop", "httptools": "httptools"}
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _setting(name: str, choice: str) -> str:
+    module = _REQUIRED_MODULES.get(choice)
+    if module is not None and not _installed(module):
+        log.warning(f"{name}={choice} but {module} is not installed; using 'auto'.")
+        return "auto"
+    return choice
+
+
+def select_loop(choice: str = UVICORN_LOOP) -> str:
+    """Returns `choice` as Uvicorn's loop setting, or "auto" if it is not installed."""
+    return _setting("UVICORN_LOOP", choice)
+
+
+def select_http(choice: str = UVICORN_HTTP) -> str:
+    """Returns `choice` as Uvicorn's http setting, or "auto" if it is not installed."""
+    return _setting("UVICORN_HTTP", choice)
+
+
+class UvicornFastWorker(UvicornWorker):
+    """
+    A UvicornWorker whose event loop and HTTP parser can be overridden from the
+    environment. Keep-alive timeout and listen backlog come from Gunicorn's
+    `keepalive` and `backlog` settings (see gunicorn/*.py).
+    """
+
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "loop": select_loop(),
+        "http": select_http(),
+    }
+
+    def init_process(self):
+        self.log.info(
+            f"Using event loop '{self.CONFIG_KWARGS['loop']}' and HTTP parser "
+            f"'{self.CONFIG_KWARGS['http']}' "
+            f"(keep-alive {self.cfg.keepalive}s, backlog {self.cfg.backlog})"
+        )
+        super().init_process()